@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+
+def _jsonable(value):
+    """DeepFace 结果中含有 numpy 数值 / 数组，转为 JSON 可保存的类型。"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def deepface_version():
+    try:
+        import deepface
+        return getattr(deepface, "__version__", "unknown")
+    except ImportError:
+        return "unknown"
+
+
+class AnalysisCache:
+    """
+    图片分析结果的本地持久缓存（SQLite 单文件）。
+
+    键由图片内容哈希（sha256）、DeepFace 版本、模型 / 检测器名称和请求的 actions 组成，
+    图片内容不变时直接返回上次的属性分析结果或特征向量，只有新图片（或内容改变的图片）才调用模型。
+    文件路径、大小和修改时间对应的哈希也会记录下来，重复运行时未改动的文件不必重新读取计算哈希。
+
+    max_bytes: 缓存结果的总大小上限（字节），超出后按最近使用时间淘汰最旧的条目。
+
+        cache = AnalysisCache("outputs/deepface_cache.sqlite")
+        analysis = cache.get_or_compute(cache.analysis_key(path, actions), lambda: DeepFace.analyze(...))
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = deepface_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+        """)
+
+    # ---------------- 键 ----------------
+
+    def content_hash(self, img_path):
+        """图片内容的 sha256；路径、大小、修改时间都未变时直接使用记录的哈希。"""
+        path = os.path.abspath(img_path)
+        stat = os.stat(path)
+        row = self.conn.execute("SELECT size, mtime, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        sha = digest.hexdigest()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO files (path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                              (path, stat.st_size, stat.st_mtime, sha))
+        return sha
+
+    def analysis_key(self, img_path, actions, detector_backend="opencv"):
+        return "|".join(["analyze", self.content_hash(img_path), f"deepface={self.version}", detector_backend,
+                         ",".join(sorted(actions))])
+
+    def embedding_key(self, img_path, model_name="VGG-Face", detector_backend="opencv"):
+        # 结果为图片中所有人脸的特征向量列表（与 DeepFace.verify 一样比较全部人脸）
+        return "|".join(["represent_faces", self.content_hash(img_path), f"deepface={self.version}", model_name,
+                         detector_backend])
+
+    # ---------------- 读写 ----------------
+
+    def get(self, key):
+        row = self.conn.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        with self.conn:
+            self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        payload = json.dumps(value, default=_jsonable, ensure_ascii=False)
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (key, payload, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now))
+        self._evict()
+
+    def get_or_compute(self, key, compute):
+        """命中时返回缓存结果，否则调用 compute() 计算并保存（结果为 None 时不保存）。"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def _evict(self):
+        """总大小超过 max_bytes 时，按最近使用时间从旧到新删除条目。"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        removed, keys = 0, []
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+            keys.append(key)
+            removed += size
+            if removed >= excess:
+                break
+        with self.conn:
+            self.conn.executemany("DELETE FROM results WHERE key = ?", [(k,) for k in keys])
+        self.evictions += len(keys)
+
+    def stats(self):
+        entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries,
+                "bytes": total, "hit_rate": round(self.hits / lookups, 4) if lookups else None}
+
+    def close(self):
+        self.conn.close()
@@ -1,5 +1,21 @@
 from deepface import DeepFace
 import os
+import sys
+import numpy as np
+
+try:
+    from .analysis_cache import AnalysisCache
+except ImportError:
+    # 直接运行脚本或按文件路径加载时没有父包：从本文件所在目录导入
+    _script_dir = os.path.dirname(os.path.abspath(__file__))
+    if _script_dir not in sys.path:
+        sys.path.append(_script_dir)
+    from analysis_cache import AnalysisCache
+
+ACTIONS = ['age', 'gender', 'race', 'emotion']
+MODEL_NAME = "VGG-Face"          # DeepFace.verify 的默认识别模型
+DETECTOR_BACKEND = "opencv"      # DeepFace 的默认人脸检测器
+DISTANCE_METRIC = "cosine"
 
 
 # ================================
@@ -34,32 +50,78 @@ def process_detected_image(img_path):
 # 分析模块
 # ================================
 
-def analyze_image(img_path):
+def _analyze(img_path):
+    analysis = DeepFace.analyze(img_path=img_path,
+                                actions=ACTIONS,
+                                detector_backend=DETECTOR_BACKEND,
+                                enforce_detection=False)
+    # 若返回结果为列表，则取第一个元素
+    if isinstance(analysis, list):
+        analysis = analysis[0]
+    return analysis
+
+
+def analyze_image(img_path, cache=None):
     """
     对单张图像进行属性分析（年龄、性别、种族、情绪），
     返回分析结果字典，若失败返回 None。
+    传入 cache（AnalysisCache）时，内容未变的图片直接读取上次的分析结果。
     """
     try:
-        analysis = DeepFace.analyze(img_path=img_path,
-                                    actions=['age', 'gender', 'race', 'emotion'],
-                                    enforce_detection=False)
-        # 若返回结果为列表，则取第一个元素
-        if isinstance(analysis, list):
-            analysis = analysis[0]
-        return analysis
+        if cache is None:
+            return _analyze(img_path)
+        key = cache.analysis_key(img_path, ACTIONS, DETECTOR_BACKEND)
+        return cache.get_or_compute(key, lambda: _analyze(img_path))
     except Exception as e:
         print(f"图像分析失败 ({img_path}):", e)
         return None
 
 
-def verify_identity(ref_img_path, img_path):
+def _verification_threshold():
+    """DeepFace 对当前模型 / 距离度量使用的判定阈值（不同版本的函数位置不同）。"""
+    try:
+        from deepface.modules.verification import find_threshold
+    except ImportError:
+        from deepface.commons.distance import findThreshold as find_threshold
+    return find_threshold(MODEL_NAME, DISTANCE_METRIC)
+
+
+def image_embeddings(img_path, cache=None):
+    """
+    图片中每张人脸的特征向量列表（与 DeepFace.verify 使用相同的模型和检测器），
+    传入 cache 时特征向量会被保存，同一张图片只计算一次。
+    """
+    def compute():
+        faces = DeepFace.represent(img_path=img_path,
+                                   model_name=MODEL_NAME,
+                                   detector_backend=DETECTOR_BACKEND,
+                                   enforce_detection=False)
+        return [list(face["embedding"]) for face in faces]
+
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(cache.embedding_key(img_path, MODEL_NAME, DETECTOR_BACKEND), compute)
+
+
+def verify_identity(ref_img_path, img_path, cache=None):
     """
     对比参考图片和待检测图片，判断是否为同一人，
     返回 True 表示验证通过，否则返回 False。
+    传入 cache 时用缓存的特征向量计算余弦距离，参考图片和未变的图片不再重复提取特征；
+    与 DeepFace.verify 相同，两张图片中有多张人脸时取所有人脸两两之间的最小距离与阈值比较。
     """
     try:
-        verification = DeepFace.verify(ref_img_path, img_path, enforce_detection=False)
-        return verification.get("verified", False)
+        if cache is None:
+            verification = DeepFace.verify(ref_img_path, img_path, enforce_detection=False)
+            return verification.get("verified", False)
+        ref = np.asarray(image_embeddings(ref_img_path, cache), dtype=np.float64)
+        emb = np.asarray(image_embeddings(img_path, cache), dtype=np.float64)
+        if ref.size == 0 or emb.size == 0:
+            return False
+        ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+        distance = 1 - (ref @ emb.T).max()
+        return bool(distance <= _verification_threshold())
     except Exception as e:
         print(f"身份验证失败 ({img_path}):", e)
         return False
@@ -83,12 +145,14 @@ def main():
         rel_path("pic", "3.jpg"),
         rel_path("pic", "4.jpg")
     ]
+    # 分析结果和特征向量的持久缓存：重复运行时只有新图片（或内容改变的图片）才会调用模型
+    cache = AnalysisCache(rel_path("..", "outputs", "deepface_cache.sqlite"))
 
     # 处理参考图片
     ref_img = process_reference_image(ref_img_path)
     # 分析参考图片属性并打印
     print("正在分析参考图片的图像属性...")
-    ref_analysis = analyze_image(ref_img)
+    ref_analysis = analyze_image(ref_img, cache)
     if ref_analysis:
         age = ref_analysis.get("age", "未知")
         gender = ref_analysis.get("gender", "未知")
@@ -110,7 +174,7 @@ def main():
 
         # 分析图像属性
         print("正在分析待检测图像属性...")
-        analysis = analyze_image(img)
+        analysis = analyze_image(img, cache)
         if analysis:
             age = analysis.get("age", "未知")
             gender = analysis.get("gender", "未知")
@@ -126,12 +190,16 @@ def main():
 
         # 身份验证（参考图片 vs 当前待检测图片）
         print("🔍 正在验证身份...")
-        if verify_identity(ref_img, img):
+        if verify_identity(ref_img, img, cache):
             print("✅ 身份验证结果：验证通过！")
         else:
             print("❌ 身份验证结果：验证未通过。")
         print("-" * 40)
 
+    stats = cache.stats()
+    print(f"🗃️ 缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次，共 {stats['entries']} 条记录")
+    cache.close()
+
     print(f"\n🎉 分析完成，已展示。程序退出。\n")
 
 
@@ -1,36 +1,145 @@
 import cv2
 import os
+import sys
+import json
 import time
+import argparse
 import tempfile
+import threading
 
 from deepface import DeepFace
 from feat import Detector
-from PIL import Image
 
+# 复用 scripts/emotion_analysis 中的人脸结果缓存
+try:
+    from scripts.emotion_analysis.face_cache import FaceResultCache, crop_fingerprint
+except ImportError:
+    # 在 deepface 目录下直接运行时找不到 scripts 包：把仓库根目录追加到 sys.path 末尾，
+    # 不放在最前面，避免仓库中的 deepface 目录遮蔽已安装的 deepface 包
+    _repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if _repo_root not in sys.path:
+        sys.path.append(_repo_root)
+    from scripts.emotion_analysis.face_cache import FaceResultCache, crop_fingerprint
+
+
+# 尚未分析出结果时显示的默认值
+EMPTY_RESULT = {
+    "dominant_emotion": "Unknown",
+    "pyfeat_emotion": "None",
+    "facebox": None,
+    "au_values": {},
+}
+
+
+class FrameSource:
+    """
+    单个视频源（摄像头序号或视频文件）：独立的采集线程持续读帧，只保留最新一帧，
+    推理线程取走最新帧分析后，把结果写回该视频源。
+    """
+
+    def __init__(self, source_id, source, width, height):
+        self.source_id = source_id
+        self.source = source
+        self.width = width
+        self.height = height
+        self.is_file = isinstance(source, str)
+
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"无法打开视频源 {source}")
+        # 视频文件按原始帧率读取，模拟实时画面
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self.seq = 0            # 已采集的帧序号
+        self.result = dict(EMPTY_RESULT)
+        self.result_seq = 0     # 最新结果对应的帧序号
+        self.capture_fps = 0.0
+        self.ended = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._capture_loop, name=f"capture-{source_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _capture_loop(self):
+        prev_time = time.time()
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            # 调整图像大小（加快检测速度，也保证同一批次内尺寸一致）
+            frame = cv2.resize(frame, (self.width, self.height))
+            curr_time = time.time()
+            if (curr_time - prev_time) > 0:
+                self.capture_fps = 1.0 / (curr_time - prev_time)
+            prev_time = curr_time
+            with self._lock:
+                self._frame = frame
+                self.seq += 1
+            if self.frame_interval:
+                time.sleep(self.frame_interval)
+        self.ended.set()
+
+    def latest(self):
+        """返回 (帧序号, 最新帧副本)；尚无画面时帧为 None。"""
+        with self._lock:
+            if self._frame is None:
+                return self.seq, None
+            return self.seq, self._frame.copy()
+
+    def set_result(self, seq, result):
+        with self._lock:
+            self.result = result
+            self.result_seq = seq
+
+    def get_result(self):
+        with self._lock:
+            return self.result_seq, self.result
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+        self.cap.release()
 
 
 class RealTimeEmotionDetector:
     """
     实时情绪检测器：
-    1. 打开摄像头实时捕捉画面
-    2. 使用 DeepFace 检测主情绪
-    3. 使用 Py-Feat 分析表情和 AU
-    4. 在窗口中实时显示结果，按 'q' 键退出
+    1. 打开一个或多个视频源（摄像头或视频文件），每个视频源一个采集线程
+    2. 共享的推理线程把各视频源的最新帧组成一个批次
+    3. 使用 DeepFace 检测主情绪，使用 Py-Feat 分析表情和 AU（批量检测）
+    4. 结果回传到各视频源：窗口中实时显示（每个视频源一个窗口，按 'q' 键退出），
+       或无界面模式下写入每个视频源的 JSONL 文件
     """
 
-    def __init__(self, camera_index=0, width=640, height=480, skip_frames=5):
+    def __init__(self, camera_index=0, width=640, height=480, skip_frames=5, sources=None,
+                 headless=False, output_dir="outputs/realtime", face_cache=False, face_cache_max_age=30):
         """
-        :param camera_index: 要打开的摄像头序号（默认0）
+        :param camera_index: 要打开的摄像头序号（默认0），未指定 sources 时使用
         :param width: 处理图像的宽度
         :param height: 处理图像的高度
-        :param skip_frames: 每多少帧检测一次，减轻 CPU 负载
+        :param skip_frames: 每个视频源每采集多少帧检测一次，减轻 CPU 负载
+        :param sources: 多个视频源（摄像头序号或视频文件路径），共用同一个检测器
+        :param headless: 不显示窗口，把每次的分析结果写入 output_dir 下各视频源的 JSONL 文件
+        :param output_dir: 无界面模式的结果目录
+        :param face_cache: 某个视频源的人脸裁剪与该视频源之前分析过的几乎相同时，直接复用上次的结果，跳过 DeepFace 与 Py-Feat；
+                           每个视频源一个缓存，不会把其他摄像头的结果（包括人脸框）用到本视频源
+        :param face_cache_max_age: 缓存结果最多被复用多少个分析帧（按视频源各自计数），之后强制重新分析
         """
         self.camera_index = camera_index
+        self.sources = list(sources) if sources else [camera_index]
         self.width = width
         self.height = height
         self.skip_frames = skip_frames
+        self.headless = headless
+        self.output_dir = output_dir
 
-        # 初始化 Py-Feat 检测器（设为CPU模式）
+        # 初始化 Py-Feat 检测器（设为CPU模式），所有视频源共用一份
         self.feat_detector = Detector(
             face_model="retinaface",
             landmark_model="mobilenet",
@@ -39,181 +148,316 @@ class RealTimeEmotionDetector:
             device='cpu'
         )
 
-    def analyze_frame(self, frame):
-        """对单帧进行 DeepFace + Py-Feat 分析，并返回相关信息。"""
-        # 1) DeepFace：主情绪
-        try:
-            deepface_res = DeepFace.analyze(
-                frame,
-                actions=['emotion'],
-                enforce_detection=False
-            )
-            dominant_emotion = deepface_res[0]['dominant_emotion']
-        except:
-            dominant_emotion = 'Unknown'
+        self.face_cache = face_cache
+        self.face_cache_max_age = face_cache_max_age
+        self._face_caches = {}   # 视频源 -> FaceResultCache
+        self._stream_clock = {}  # 视频源 -> 已分析帧数（缓存条目的时钟）
+        self._last_facebox = {}  # 视频源 -> 上一次模型分析得到的人脸框
 
-        # 2) Py-Feat：保存到临时文件后检测
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(image_rgb)
+        self._stop = threading.Event()
+        self.batches = 0
+        self.analysed = 0
 
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-            temp_path = tmp.name
-            pil_image.save(temp_path)
+    def analyze_frame(self, frame):
+        """对单帧进行 DeepFace + Py-Feat 分析，并返回相关信息。"""
+        result = self.analyze_batch([frame])[0]
+        return result["dominant_emotion"], result["pyfeat_emotion"], result["facebox"], result["au_values"]
 
-        facebox = None
-        au_values = {}
-        pyfeat_emotion = 'None'
+    def analyze_batch(self, frames, streams=None):
+        """
+        对一批帧（来自不同视频源）进行分析，返回与 frames 顺序一致的结果字典列表。
+        开启人脸结果缓存且给出 streams（各帧所属的视频源）时，人脸裁剪与该视频源缓存相近的帧直接复用缓存结果，
+        其余帧交给模型分析。缓存与时钟（已分析帧数）都按视频源分开。
+        """
+        if not self.face_cache or streams is None:
+            return self._analyze_models(frames)
+
+        results, todo, clocks = [None] * len(frames), [], []
+        for i, (frame, stream) in enumerate(zip(frames, streams)):
+            if stream not in self._face_caches:
+                self._face_caches[stream] = FaceResultCache(max_age=self.face_cache_max_age)
+            self._stream_clock[stream] = self._stream_clock.get(stream, 0) + 1
+            clocks.append(self._stream_clock[stream])
+            facebox = self._last_facebox.get(stream)
+            if facebox is not None:
+                cached = self._face_caches[stream].lookup(crop_fingerprint(frame, facebox), clocks[i])
+                if cached is not None:
+                    results[i] = dict(cached)
+                    continue
+            todo.append(i)
+
+        if todo:
+            for i, result in zip(todo, self._analyze_models([frames[i] for i in todo])):
+                results[i] = result
+                self._last_facebox[streams[i]] = result["facebox"]
+                if result["facebox"] is not None:
+                    self._face_caches[streams[i]].store(crop_fingerprint(frames[i], result["facebox"]), result,
+                                                        clocks[i])
+        return results
+
+    def face_cache_stats(self):
+        """各视频源人脸结果缓存的统计之和。"""
+        totals = {"hits": 0, "misses": 0, "stale": 0}
+        for cache in self._face_caches.values():
+            stats = cache.stats()
+            for key in totals:
+                totals[key] += stats[key]
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = round(totals["hits"] / lookups, 4) if lookups else None
+        return totals
+
+    def _analyze_models(self, frames):
+        """
+        用 DeepFace 与 Py-Feat 分析一批帧：Py-Feat 一次批量检测整批帧；DeepFace 逐帧分析，模型只加载一次。
+        """
+        results = [dict(EMPTY_RESULT) for _ in frames]
 
-        try:
-            feat_res = self.feat_detector.detect_image([temp_path])
-            if not feat_res.empty:
+        # 1) DeepFace：主情绪
+        for result, frame in zip(results, frames):
+            try:
+                deepface_res = DeepFace.analyze(
+                    frame,
+                    actions=['emotion'],
+                    enforce_detection=False
+                )
+                result["dominant_emotion"] = deepface_res[0]['dominant_emotion']
+            except Exception:
+                result["dominant_emotion"] = 'Unknown'
+
+        # 2) Py-Feat：保存到临时文件后批量检测
+        with tempfile.TemporaryDirectory(prefix="realtime_") as tmp_dir:
+            paths = []
+            for i, frame in enumerate(frames):
+                path = os.path.join(tmp_dir, f"frame_{i}.jpg")
+                cv2.imwrite(path, frame)
+                paths.append(path)
+
+            try:
+                feat_res = self.feat_detector.detect_image(paths, batch_size=len(paths))
+            except Exception as e:
+                print(f"Py-Feat 检测失败：{e}")
+                return results
+
+            for result, path in zip(results, paths):
+                rows = feat_res[feat_res['input'] == path] if 'input' in feat_res.columns else feat_res
+                if rows.empty:
+                    continue
                 # 提取 Py-Feat 表情
-                if 'emotion' in feat_res.columns:
-                    pyfeat_emotion = str(feat_res['emotion'].values[0])
-                else:
-                    pyfeat_emotion = 'None'
+                if 'emotion' in rows.columns:
+                    result["pyfeat_emotion"] = str(rows['emotion'].values[0])
 
                 # 提取 Py-Feat 的人脸框（如果有）
-                if 'facebox' in feat_res.columns:
-                    facebox = feat_res['facebox'].values[0]  # 形如 [x_min, y_min, w, h]
+                if 'facebox' in rows.columns:
+                    result["facebox"] = rows['facebox'].values[0]  # 形如 [x_min, y_min, w, h]
+                elif 'FaceRectX' in rows.columns:
+                    # 新版 Py-Feat 以 FaceRectX / FaceRectY / FaceRectWidth / FaceRectHeight 四列给出人脸框
+                    result["facebox"] = [float(rows[c].values[0]) for c in
+                                         ('FaceRectX', 'FaceRectY', 'FaceRectWidth', 'FaceRectHeight')]
 
-                # 提取所有 AU 列（如 AU01, AU02, AU12 等）
-                au_cols = [col for col in feat_res.columns if col.startswith('AU')]
-                # 生成 { "AU01": 0.2, "AU02": 0.0, ... }
-                au_values = {col: float(feat_res[col].values[0]) for col in au_cols}
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+                # 提取所有 AU 列（如 AU01, AU02, AU12 等），生成 { "AU01": 0.2, "AU02": 0.0, ... }
+                au_cols = [col for col in rows.columns if col.startswith('AU')]
+                result["au_values"] = {col: float(rows[col].values[0]) for col in au_cols}
 
-        return dominant_emotion, pyfeat_emotion, facebox, au_values
+        return results
 
-    def run(self):
+    def _inference_loop(self, sources, writers):
         """
-        启动摄像头并实时显示检测结果。
-        按 'q' 键退出。
+        共享推理线程：收集自上次分析以来已前进 skip_frames 帧的视频源的最新帧，
+        组成一个批次分析（动态批大小 = 有新画面的视频源数），再把结果写回各视频源。
         """
-        cap = cv2.VideoCapture(self.camera_index)
-        if not cap.isOpened():
-            print(f"无法打开摄像头 {self.camera_index}")
-            return
-
-        frame_count = 0
-        # 用于计算 FPS
-        prev_time = time.time()
-        fps = 0.0
-
-        # 先给一些默认值，防止前几帧还没分析时出错
-        dominant_emotion = 'Unknown'
-        pyfeat_emotion = 'None'
-        facebox = None
-        au_values = {}
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # 调整图像大小（可选，加快检测速度）
-            frame_resized = cv2.resize(frame, (self.width, self.height))
-
-            # 计算帧率
-            curr_time = time.time()
-            # 避免除零
-            if (curr_time - prev_time) > 0:
-                fps = 1.0 / (curr_time - prev_time)
-            prev_time = curr_time
-
-            # 并不是每帧都分析，减少CPU负载
-            if frame_count % self.skip_frames == 0:
-                (dominant_emotion,
-                 pyfeat_emotion,
-                 facebox,
-                 au_values) = self.analyze_frame(frame_resized)
-
-            # 如果 Py-Feat 返回了人脸框，就在图像上画出
-            if facebox is not None:
-                # facebox = [x_min, y_min, w, h]
-                x_min, y_min, w, h = facebox
-                x_max = x_min + w
-                y_max = y_min + h
-                cv2.rectangle(
-                    frame_resized,
-                    (int(x_min), int(y_min)),
-                    (int(x_max), int(y_max)),
-                    (0, 255, 0),
-                    2
-                )
-
-            # 显示 DeepFace & Py-Feat 主情绪
-            cv2.putText(
-                frame_resized,
-                f"DeepFace: {dominant_emotion}",
-                (20, 40),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
+        last_seq = {src.source_id: -self.skip_frames for src in sources}
+        while not self._stop.is_set():
+            batch = []
+            for src in sources:
+                seq, frame = src.latest()
+                if frame is not None and seq - last_seq[src.source_id] >= self.skip_frames:
+                    batch.append((src, seq, frame))
+            if not batch:
+                if all(src.ended.is_set() for src in sources):
+                    break
+                time.sleep(0.005)
+                continue
+
+            results = self.analyze_batch([frame for _, _, frame in batch],
+                                         streams=[src.source_id for src, _, _ in batch])
+            self.batches += 1
+            self.analysed += len(batch)
+            for (src, seq, _), result in zip(batch, results):
+                last_seq[src.source_id] = seq
+                src.set_result(seq, result)
+                if src.source_id in writers:
+                    record = {"source": str(src.source), "frame": seq, "time": round(time.time(), 3), **result}
+                    writers[src.source_id].write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    writers[src.source_id].flush()
+
+    def draw_overlay(self, frame, result, fps):
+        """在画面上绘制人脸框、DeepFace / Py-Feat 主情绪、FPS 和 AU 数值。"""
+        facebox = result["facebox"]
+        # 如果 Py-Feat 返回了人脸框，就在图像上画出
+        if facebox is not None:
+            # facebox = [x_min, y_min, w, h]
+            x_min, y_min, w, h = facebox
+            x_max = x_min + w
+            y_max = y_min + h
+            cv2.rectangle(
+                frame,
+                (int(x_min), int(y_min)),
+                (int(x_max), int(y_max)),
                 (0, 255, 0),
                 2
             )
-            cv2.putText(
-                frame_resized,
-                f"Py-Feat: {pyfeat_emotion}",
-                (20, 70),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (255, 0, 0),
-                2
-            )
 
-            # 显示 FPS
+        # 显示 DeepFace & Py-Feat 主情绪
+        cv2.putText(
+            frame,
+            f"DeepFace: {result['dominant_emotion']}",
+            (20, 40),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.8,
+            (0, 255, 0),
+            2
+        )
+        cv2.putText(
+            frame,
+            f"Py-Feat: {result['pyfeat_emotion']}",
+            (20, 70),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.8,
+            (255, 0, 0),
+            2
+        )
+
+        # 显示 FPS
+        cv2.putText(
+            frame,
+            f"FPS: {fps:.2f}",
+            (self.width - 120, 30),  # 右上角
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.7,
+            (0, 0, 255),
+            2
+        )
+
+        # 显示 AU 数值
+        # 这里简单示例一下，按行往下显示
+        # 如果 AU 太多，可以筛选或只显示最高激活的几个
+        start_y = 110
+        for i, (au_name, au_val) in enumerate(result["au_values"].items()):
+            text = f"{au_name}: {au_val:.2f}"
             cv2.putText(
-                frame_resized,
-                f"FPS: {fps:.2f}",
-                (self.width - 120, 30),  # 右上角
+                frame,
+                text,
+                (20, start_y + i * 20),
                 cv2.FONT_HERSHEY_SIMPLEX,
-                0.7,
-                (0, 0, 255),
-                2
+                0.5,
+                (0, 255, 255),
+                1
             )
+        return frame
 
-            # 显示 AU 数值
-            # 这里简单示例一下，按行往下显示
-            # 如果 AU 太多，可以筛选或只显示最高激活的几个
-            start_y = 110
-            for i, (au_name, au_val) in enumerate(au_values.items()):
-                text = f"{au_name}: {au_val:.2f}"
-                cv2.putText(
-                    frame_resized,
-                    text,
-                    (20, start_y + i * 20),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 255, 255),
-                    1
-                )
+    def run(self, duration=None):
+        """
+        启动所有视频源并实时显示检测结果（无界面模式下写入 JSONL）。
+        按 'q' 键（或 Ctrl+C）退出；duration 秒后、或所有视频文件播放完毕时自动结束。
+        """
+        sources = []
+        for i, source in enumerate(self.sources):
+            try:
+                sources.append(FrameSource(i, source, self.width, self.height).start())
+            except IOError as e:
+                print(e)
+        if not sources:
+            return
 
-            # 显示结果
-            cv2.imshow("Real-Time Emotion Detection", frame_resized)
+        writers = {}
+        if self.headless:
+            os.makedirs(self.output_dir, exist_ok=True)
+            for src in sources:
+                name = os.path.splitext(os.path.basename(src.source))[0] if src.is_file else f"camera{src.source}"
+                path = os.path.join(self.output_dir, f"{src.source_id}_{name}.jsonl")
+                writers[src.source_id] = open(path, "w", encoding="utf-8")
+                print(f"视频源 {src.source} 的结果写入 {path}")
 
-            frame_count += 1
+        self._stop.clear()
+        worker = threading.Thread(target=self._inference_loop, args=(sources, writers), name="inference", daemon=True)
+        worker.start()
+        start_time = time.time()
 
-            # 按 'q' 键退出
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-
-        cap.release()
-        cv2.destroyAllWindows()
+        try:
+            while worker.is_alive():
+                if duration is not None and time.time() - start_time >= duration:
+                    break
+                if self.headless:
+                    time.sleep(0.05)
+                    continue
+
+                for src in sources:
+                    seq, frame = src.latest()
+                    if frame is None:
+                        continue
+                    _, result = src.get_result()
+                    cv2.imshow(f"Real-Time Emotion Detection [{src.source}]",
+                               self.draw_overlay(frame, result, src.capture_fps))
+
+                # 按 'q' 键退出
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            worker.join(timeout=5)
+            for src in sources:
+                src.stop()
+            for f in writers.values():
+                f.close()
+            if not self.headless:
+                cv2.destroyAllWindows()
+            elapsed = time.time() - start_time
+            print(f"共分析 {self.analysed} 帧，{self.batches} 个批次"
+                  f"（平均批大小 {self.analysed / max(1, self.batches):.2f}），耗时 {elapsed:.1f} 秒")
+            if self.face_cache:
+                stats = self.face_cache_stats()
+                print(f"人脸结果缓存：命中 {stats['hits']} 次，未命中 {stats['misses']} 次"
+                      f"（过期 {stats['stale']} 次），命中率 {stats['hit_rate']}")
+
+
+def parse_source(value):
+    """数字视为摄像头序号，其余视为视频文件路径"""
+    return int(value) if value.isdigit() else value
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="实时情绪检测（支持多个摄像头 / 视频文件共用一个检测器）")
+    parser.add_argument("sources", nargs="*", default=["0"], help="视频源：摄像头序号或视频文件路径，可填多个（默认 0）")
+    parser.add_argument("--width", type=int, default=640, help="处理图像的宽度（默认 640）")
+    parser.add_argument("--height", type=int, default=480, help="处理图像的高度（默认 480）")
+    parser.add_argument("--skip_frames", type=int, default=5, help="每个视频源每多少帧分析一次（默认 5）")
+    parser.add_argument("--headless", action="store_true", help="不显示窗口，结果写入 --output_dir 下各视频源的 JSONL 文件")
+    parser.add_argument("--output_dir", default="outputs/realtime", help="无界面模式的结果目录")
+    parser.add_argument("--duration", type=float, default=None, help="运行多少秒后自动退出（默认一直运行）")
+    parser.add_argument("--face_cache", action="store_true", help="人脸裁剪几乎未变时复用上次的分析结果，跳过模型推理")
+    parser.add_argument("--face_cache_max_age", type=int, default=30, help="缓存结果最多被复用多少个分析帧（按视频源各自计数，默认 30）")
+    args = parser.parse_args()
+
     # 运行示例
     detector = RealTimeEmotionDetector(
-        camera_index=0,  # 默认为电脑自带摄像头
-        width=640,
-        height=480,
-        skip_frames=5  # 每 5 帧分析一次
+        width=args.width,
+        height=args.height,
+        skip_frames=args.skip_frames,  # 默认每 5 帧分析一次
+        sources=[parse_source(s) for s in args.sources],  # 默认为电脑自带摄像头
+        headless=args.headless,
+        output_dir=args.output_dir,
+        face_cache=args.face_cache,
+        face_cache_max_age=args.face_cache_max_age
     )
-    detector.run()
+    detector.run(duration=args.duration)
 
 #cd "D:\basic software\pycharm\code\pythonProject1\facial-analysis\deepface"
 #python realtime.py
+#多个视频源（摄像头 0、1 和一个视频文件），共用一个检测器：
+#python realtime.py 0 1 ../videos/test.mp4
+#无界面模式：
+#python realtime.py 0 1 --headless --output_dir ../outputs/realtime
+#画面基本静止时复用人脸结果缓存，跳过大部分模型推理：
+#python realtime.py 0 --face_cache --face_cache_max_age 30
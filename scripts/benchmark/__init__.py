@@ -0,0 +1 @@
+# 离线基准测试：合成视频 + 桩检测器，无需 GPU、网络和模型权重即可测量各阶段吞吐量。
@@ -0,0 +1,149 @@
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 头部布局（int64）：[0] 最新写入的序号，[1] 结束标记，之后依次为每个槽位的序号、帧号、已处理序号
+_HEAD, _CLOSED, _FIELDS = 0, 1, 2
+
+
+class SharedFrameRing:
+    """
+    基于 multiprocessing.shared_memory 的帧环形缓冲区：预分配 slots 个固定尺寸的帧槽位，
+    生产者（解码 / 采集进程）把帧直接写入槽位，消费者（推理进程）按序号零拷贝读取，
+    进程间只需传递序号（整数），不再 pickle 整帧。目前只用于 frame_transfer 基准，检测流程未使用。
+
+    只支持单个生产者：write() 不加锁地由头部的最新序号推出下一个序号与槽位，
+    多个进程同时写入会取得相同的序号并写进同一槽位。消费者可以有多个（各自处理不同的序号）。
+
+    每个槽位记录序号与帧号：写入前序号置为 -1，写完再写入新序号，读取时序号不符说明槽位已被覆盖。
+    消费者处理完后调用 release(seq)，生产者在 block=True 时会等待槽位的上一帧被处理完再覆盖，
+    block=False 时直接覆盖最旧的帧（适合只关心最新画面的实时场景）。
+
+        ring = SharedFrameRing.create(slots=8, shape=(1080, 1920, 3))
+        seq = ring.write(frame, frame_number=10)   # 生产者
+        number, view = ring.read(seq)              # 消费者（view 为共享内存上的视图）
+        ring.release(seq)
+
+    对象可直接作为参数传给子进程（pickle 时只传共享内存名称与形状，子进程中自动重新映射）。
+    """
+
+    def __init__(self, name, slots, shape, dtype=np.uint8, create=False):
+        self.slots = int(slots)
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        header_bytes = (_FIELDS + 3 * self.slots) * 8
+        self._owner = create
+
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=header_bytes + self.frame_bytes * self.slots)
+        else:
+            self.shm = _attach(name)
+        self.name = self.shm.name
+
+        self._header = np.ndarray(_FIELDS + 3 * self.slots, dtype=np.int64, buffer=self.shm.buf)
+        self._slot_seq = self._header[_FIELDS:_FIELDS + self.slots]
+        self._slot_frame = self._header[_FIELDS + self.slots:_FIELDS + 2 * self.slots]
+        self._slot_done = self._header[_FIELDS + 2 * self.slots:]
+        self._frames = np.ndarray((self.slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self._header[:] = -1
+            self._header[_CLOSED] = 0
+
+    @classmethod
+    def create(cls, slots, shape, dtype=np.uint8, name=None):
+        """创建新的环形缓冲区（调用方负责最后 close() 与 unlink()）。"""
+        return cls(name, slots, shape, dtype, create=True)
+
+    def __reduce__(self):
+        return (self.__class__, (self.name, self.slots, self.shape, self.dtype.str, False))
+
+    # ---------------- 生产者 ----------------
+
+    def write(self, frame, frame_number=-1, block=True, timeout=None):
+        """
+        写入一帧并返回其序号。block=True 时若槽位中的上一帧尚未 release，则等待（timeout 秒后抛出 TimeoutError）。
+        只能由唯一的生产者调用（见类说明）。
+        """
+        frame = np.asarray(frame)
+        if frame.shape != self.shape:
+            raise ValueError(f"帧尺寸 {frame.shape} 与缓冲区槽位尺寸 {self.shape} 不一致")
+        seq = int(self._header[_HEAD]) + 1
+        slot = seq % self.slots
+        previous = seq - self.slots
+        if block and previous >= 0:
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            while self._slot_done[slot] < previous:
+                if deadline is not None and time.perf_counter() > deadline:
+                    raise TimeoutError(f"等待槽位 {slot} 释放超时")
+                time.sleep(0.0002)
+
+        self._slot_seq[slot] = -1
+        self._frames[slot][...] = frame
+        self._slot_frame[slot] = frame_number
+        self._slot_seq[slot] = seq
+        self._header[_HEAD] = seq
+        return seq
+
+    def close_writer(self):
+        """标记生产结束，消费者可据此退出。"""
+        self._header[_CLOSED] = 1
+
+    @property
+    def closed(self):
+        return bool(self._header[_CLOSED])
+
+    # ---------------- 消费者 ----------------
+
+    def read(self, seq, copy=False):
+        """
+        按序号读取帧，返回 (帧号, 图像)；槽位已被覆盖时返回 None。
+        copy=False 时图像是共享内存上的视图，在 release 之前有效。
+        """
+        slot = seq % self.slots
+        if self._slot_seq[slot] != seq:
+            return None
+        frame = self._frames[slot].copy() if copy else self._frames[slot]
+        return int(self._slot_frame[slot]), frame
+
+    def read_latest(self, copy=True):
+        """读取最新写入的帧，返回 (序号, 帧号, 图像)；尚无帧时返回 None。"""
+        seq = int(self._header[_HEAD])
+        if seq < 0:
+            return None
+        item = self.read(seq, copy=copy)
+        # 复制期间被覆盖时丢弃
+        if item is None or (copy and not self.valid(seq)):
+            return None
+        return (seq,) + item
+
+    def valid(self, seq):
+        """槽位中仍是该序号的帧（未被覆盖）"""
+        return self._slot_seq[seq % self.slots] == seq
+
+    def release(self, seq):
+        """消费者处理完该帧，允许生产者覆盖其槽位。"""
+        self._slot_done[seq % self.slots] = seq
+
+    # ---------------- 资源管理 ----------------
+
+    def close(self):
+        # 先释放 numpy 视图，否则共享内存无法关闭
+        self._header = self._slot_seq = self._slot_frame = self._slot_done = self._frames = None
+        self.shm.close()
+
+    def unlink(self):
+        if self._owner:
+            self.shm.unlink()
+
+
+def _attach(name):
+    """
+    映射已有的共享内存。子进程与创建者共用同一个 resource_tracker，重复登记不会导致提前删除；
+    共享内存由创建者 unlink。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
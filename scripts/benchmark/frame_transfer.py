@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import logging
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+from .frame_ring import SharedFrameRing
+
+
+def parse_arguments(argv=None):
+    """解析帧传输基准参数"""
+    parser = argparse.ArgumentParser(description="进程间帧传输基准：multiprocessing.Queue（pickle 整帧）对比共享内存环形缓冲区")
+    parser.add_argument("--width", type=int, default=1920, help="帧宽度（默认 1920）")
+    parser.add_argument("--height", type=int, default=1080, help="帧高度（默认 1080）")
+    parser.add_argument("--frames", type=int, default=300, help="传输帧数（默认 300）")
+    parser.add_argument("--consumers", type=int, default=2, help="消费者进程数（默认 2）")
+    parser.add_argument("--slots", type=int, default=8, help="环形缓冲区槽位数 / Queue 容量（默认 8）")
+    parser.add_argument("--output_json", default="outputs/benchmark/frame_transfer.json", help="结果 JSON 路径")
+    return parser.parse_args(argv)
+
+
+def make_frames(width, height, count=4):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def touch(frame, frame_number):
+    """模拟消费者读取像素：取一个像素并校验生产者写入的帧号标记"""
+    return int(frame[0, 0, 0]) == frame_number % 251
+
+
+def queue_producer(q, width, height, frames, consumers):
+    pool = make_frames(width, height)
+    for i in range(frames):
+        frame = pool[i % len(pool)]
+        frame[0, 0, 0] = i % 251
+        # Queue 在后台线程中 pickle，必须传独立的帧（真实解码器每帧也是新数组）
+        q.put((i, frame.copy(), time.perf_counter()))
+    for _ in range(consumers):
+        q.put(None)
+
+
+def queue_consumer(q, results):
+    count, errors, latency = 0, 0, 0.0
+    while True:
+        item = q.get()
+        if item is None:
+            break
+        number, frame, sent = item
+        errors += not touch(frame, number)
+        latency += time.perf_counter() - sent
+        count += 1
+    results.put((count, errors, latency))
+
+
+def ring_producer(ring, q, width, height, frames, consumers):
+    pool = make_frames(width, height)
+    for i in range(frames):
+        frame = pool[i % len(pool)]
+        frame[0, 0, 0] = i % 251
+        seq = ring.write(frame, frame_number=i)
+        q.put((seq, time.perf_counter()))
+    ring.close_writer()
+    for _ in range(consumers):
+        q.put(None)
+
+
+def ring_consumer(ring, q, results):
+    count, errors, latency = 0, 0, 0.0
+    while True:
+        item = q.get()
+        if item is None:
+            break
+        seq, sent = item
+        read = ring.read(seq)
+        if read is None:
+            errors += 1
+            continue
+        number, frame = read
+        errors += not touch(frame, number)
+        ring.release(seq)
+        latency += time.perf_counter() - sent
+        count += 1
+    results.put((count, errors, latency))
+    ring.close()
+
+
+def run_mode(mode, args, ctx):
+    q = ctx.Queue(maxsize=args.slots)
+    results = ctx.Queue()
+    ring = None
+    if mode == "queue":
+        consumers = [ctx.Process(target=queue_consumer, args=(q, results)) for _ in range(args.consumers)]
+        producer = ctx.Process(target=queue_producer, args=(q, args.width, args.height, args.frames, args.consumers))
+    else:
+        ring = SharedFrameRing.create(slots=args.slots, shape=(args.height, args.width, 3))
+        consumers = [ctx.Process(target=ring_consumer, args=(ring, q, results)) for _ in range(args.consumers)]
+        producer = ctx.Process(target=ring_producer, args=(ring, q, args.width, args.height, args.frames, args.consumers))
+
+    for p in consumers:
+        p.start()
+    start = time.perf_counter()
+    producer.start()
+    totals = [results.get() for _ in consumers]
+    wall = time.perf_counter() - start
+    producer.join()
+    for p in consumers:
+        p.join()
+    if ring is not None:
+        ring.close()
+        ring.unlink()
+
+    count = sum(t[0] for t in totals)
+    mb = args.width * args.height * 3 / 1024 / 1024
+    return {
+        "mode": mode,
+        "frames": count,
+        "errors": sum(t[1] for t in totals),
+        "wall_s": round(wall, 3),
+        "frames_per_s": round(count / wall, 1) if wall > 0 else None,
+        "mb_per_s": round(count * mb / wall, 1) if wall > 0 else None,
+        "mean_latency_ms": round(sum(t[2] for t in totals) / count * 1000, 2) if count else None,
+    }
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_arguments(argv)
+    ctx = mp.get_context("spawn")
+    report = {"config": vars(args).copy(), "runs": []}
+    for mode in ("queue", "shared_memory"):
+        run = run_mode(mode, args, ctx)
+        report["runs"].append(run)
+        logging.info(f"⏱ {mode}：{run}")
+    queue_run, ring_run = report["runs"]
+    if queue_run["wall_s"] and ring_run["wall_s"]:
+        report["speedup"] = round(queue_run["wall_s"] / ring_run["wall_s"], 2)
+
+    output_dir = os.path.dirname(args.output_json)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report["runs"], ensure_ascii=False, indent=2))
+    print(f"共享内存相对 Queue 的加速比：{report.get('speedup')}")
+
+
+if __name__ == "__main__":
+    main()
+
+# 在项目根目录运行：
+# python -m scripts.benchmark.frame_transfer --width 1920 --height 1080 --frames 300 --consumers 2
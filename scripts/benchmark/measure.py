@@ -0,0 +1,80 @@
+import sys
+import time
+import threading
+
+from scripts.emotion_analysis.profiling import current_rss
+
+
+def max_rss():
+    """进程生命周期内的常驻内存峰值（字节），作为无法采样时的退路。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMeter:
+    """
+    测量一个阶段的墙钟时间、CPU 时间和常驻内存峰值。
+
+    阶段运行期间由后台线程按 interval 采样 RSS，得到该阶段内的峰值；
+    无法采样时退回为进程级峰值（ru_maxrss）。
+
+        with StageMeter("detect", frames=300) as meter:
+            ...
+        meter.result()
+    """
+
+    def __init__(self, name, frames=None, interval=0.01):
+        self.name = name
+        self.frames = frames
+        self.interval = interval
+        self.rows = None
+        self._peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = current_rss()
+            if rss is not None:
+                self._peak = max(self._peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._rss_start = current_rss()
+        self._peak = self._rss_start or 0
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.process_time() - self._cpu_start
+        self._stop.set()
+        self._thread.join()
+        rss_end = current_rss()
+        if rss_end is not None:
+            self._peak = max(self._peak, rss_end)
+        if not self._peak:
+            self._peak = max_rss() or 0
+        return False
+
+    def result(self):
+        mb = 1024 * 1024
+        out = {
+            "wall_s": round(self.wall, 4),
+            "cpu_s": round(self.cpu, 4),
+            "peak_rss_mb": round(self._peak / mb, 1) if self._peak else None,
+        }
+        if self.frames:
+            out["frames"] = self.frames
+            out["frames_per_s"] = round(self.frames / self.wall, 2) if self.wall > 0 else None
+        if self.rows is not None:
+            out["rows"] = self.rows
+        return out
@@ -0,0 +1,93 @@
+import os
+import json
+import logging
+import argparse
+
+from scripts.emotion_analysis.profiling import enable_profiling, reset_profiling, profile_summary
+from .measure import StageMeter
+from .run_benchmark import environment_info
+from .resolution_sweep import compare_results
+from .synthetic_video import generate_synthetic_video
+
+
+def parse_arguments(argv=None):
+    """解析推理后端对比参数"""
+    parser = argparse.ArgumentParser(description="推理后端对比：PyTorch、ONNX Runtime 与 int8 量化的速度和精度（以 PyTorch 结果为基准）")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8",
+                        help="要测试的后端，逗号分隔；torch 作为精度基准，总是先运行")
+    parser.add_argument("--video", default=None, help="使用已有视频（建议使用真实人脸视频，合成视频中的卡通人脸可能检测不到）")
+    parser.add_argument("--width", type=int, default=1280, help="合成视频宽度（默认 1280）")
+    parser.add_argument("--height", type=int, default=720, help="合成视频高度（默认 720）")
+    parser.add_argument("--frames", type=int, default=120, help="合成视频总帧数（默认 120）")
+    parser.add_argument("--faces", type=int, default=1, help="每帧人脸数（默认 1）")
+    parser.add_argument("--process_sampling_rate", type=int, default=10, help="检测采样间隔（默认 10 帧）")
+    parser.add_argument("--features", default="all", help="需要的分析类别（同主程序 --features）")
+    parser.add_argument("--onnx_dir", default="outputs/onnx", help="导出的 ONNX 模型缓存目录")
+    parser.add_argument("--work_dir", default="outputs/benchmark", help="合成视频与中间结果目录")
+    parser.add_argument("--output_json", default="outputs/benchmark/onnx_parity.json", help="对比结果 JSON 路径")
+    return parser.parse_args(argv)
+
+
+def run_parity(args):
+    from scripts.emotion_analysis.detector_profiles import build_detector
+    from scripts.emotion_analysis.onnx_backend import onnx_report
+    from scripts.emotion_analysis.process_video import process_video
+
+    backends = [b for b in args.backends.split(",") if b.strip()]
+    backends = ["torch"] + [b for b in backends if b != "torch"]
+    enable_profiling()
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    if args.video:
+        video_path = args.video
+    else:
+        name = f"synthetic_{args.width}x{args.height}_{args.frames}f_{args.faces}faces.mp4"
+        video_path = generate_synthetic_video(os.path.join(args.work_dir, name), width=args.width, height=args.height,
+                                              frames=args.frames, faces=args.faces)
+
+    report = {"config": vars(args).copy(), "environment": environment_info(), "runs": []}
+    baseline = None
+    for backend in backends:
+        detector = build_detector(args.features, backend=backend, onnx_dir=args.onnx_dir)
+        results_path = os.path.join(args.work_dir, f"onnx_parity_{backend}.csv")
+        # 第一次运行包含 ONNX 导出与量化，只用于预热；计时取第二次运行
+        process_video(video_path, args.process_sampling_rate, results_path,
+                      multi_face=args.faces > 1, detector=detector, features=args.features)
+        reset_profiling()
+        with StageMeter(backend) as meter:
+            df = process_video(video_path, args.process_sampling_rate, results_path,
+                               multi_face=args.faces > 1, detector=detector, features=args.features)
+        meter.rows = len(df)
+        run = {"backend": backend, **meter.result()}
+        run["detect_s"] = profile_summary().get("process_video/detect", {}).get("wall_s")
+        run["modules"] = onnx_report(detector)
+        if baseline is None:
+            baseline = df
+            base_wall = meter.wall
+        else:
+            run["speedup"] = round(base_wall / meter.wall, 2) if meter.wall > 0 else None
+            run.update(compare_results(baseline, df))
+        report["runs"].append(run)
+        logging.info(f"⏱ {backend}：{run}")
+
+    output_dir = os.path.dirname(args.output_json)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f"对比结果已保存至：{args.output_json}")
+    return report
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_arguments(argv)
+    report = run_parity(args)
+    print(json.dumps(report["runs"], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# 在项目根目录运行（需要 Py-Feat、onnx 与 onnxruntime）：
+# python -m scripts.benchmark.onnx_parity --video videos/sample.mp4 --backends torch,onnx,onnx-int8
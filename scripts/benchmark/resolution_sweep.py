@@ -0,0 +1,142 @@
+import os
+import json
+import logging
+import argparse
+
+import numpy as np
+
+from scripts.emotion_analysis.profiling import enable_profiling, reset_profiling, profile_summary
+from .measure import StageMeter
+from .run_benchmark import environment_info, make_detector
+from .stub_detector import EMOTIONS
+from .synthetic_video import generate_synthetic_video
+
+
+def parse_arguments(argv=None):
+    """解析分辨率扫描参数"""
+    parser = argparse.ArgumentParser(description="检测分辨率扫描：不同 --max_side 下的速度与精度（以原始分辨率结果为基准）")
+    parser.add_argument("--max_sides", default="0,1920,1280,960,640,480",
+                        help="要测试的长边上限，逗号分隔；0 表示原始分辨率（作为精度基准，总是先运行）")
+    parser.add_argument("--width", type=int, default=3840, help="合成视频宽度（默认 3840）")
+    parser.add_argument("--height", type=int, default=2160, help="合成视频高度（默认 2160）")
+    parser.add_argument("--frames", type=int, default=120, help="合成视频总帧数（默认 120）")
+    parser.add_argument("--fps", type=float, default=30, help="合成视频帧率（默认 30）")
+    parser.add_argument("--faces", type=int, default=1, help="每帧人脸数（默认 1）")
+    parser.add_argument("--process_sampling_rate", type=int, default=10, help="检测采样间隔（默认 10 帧）")
+    parser.add_argument("--detector", choices=["stub", "real"], default="stub", help="stub：桩检测器（默认）；real：Py-Feat Detector")
+    parser.add_argument("--stub_latency", type=float, default=0.0, help="桩检测器每张人脸运行全部子模型时模拟的推理耗时（秒）")
+    parser.add_argument("--features", default="all", help="需要的分析类别（同主程序 --features）")
+    parser.add_argument("--video", default=None, help="使用已有视频而不是生成合成视频")
+    parser.add_argument("--work_dir", default="outputs/benchmark", help="合成视频与中间结果目录")
+    parser.add_argument("--output_json", default="outputs/benchmark/resolution_sweep.json", help="扫描结果 JSON 路径")
+    return parser.parse_args(argv)
+
+
+def box_iou(a, b):
+    """逐行计算两组人脸框 (x, y, w, h) 的 IoU"""
+    ax1, ay1 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx1, by1 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax1, bx1) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    ih = np.clip(np.minimum(ay1, by1) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = iw * ih
+    union = a[:, 2] * a[:, 3] + b[:, 2] * b[:, 3] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+def compare_results(base, test):
+    """
+    以原始分辨率结果为基准比较精度：按 (frame, face_id) 对齐后计算
+    人脸框 IoU、关键点误差（按人脸框对角线归一化）、情绪概率 MAE 与主情绪一致率。
+    """
+    merged = base.merge(test, on=["frame", "face_id"], suffixes=("_base", "_test"))
+    out = {"matched_faces": int(len(merged)), "base_faces": int(len(base)), "test_faces": int(len(test))}
+    if merged.empty:
+        return out
+
+    box_cols = ["FaceRectX", "FaceRectY", "FaceRectWidth", "FaceRectHeight"]
+    if all(f"{c}_base" in merged for c in box_cols):
+        a = merged[[f"{c}_base" for c in box_cols]].to_numpy(np.float64)
+        b = merged[[f"{c}_test" for c in box_cols]].to_numpy(np.float64)
+        out["box_iou_mean"] = round(float(np.nanmean(box_iou(a, b))), 4)
+
+        xs = [c[:-5] for c in merged.columns if c.startswith("x_") and c.endswith("_base")]
+        if xs:
+            ys = ["y_" + c[2:] for c in xs]
+            dx = merged[[f"{c}_base" for c in xs]].to_numpy(np.float64) - merged[[f"{c}_test" for c in xs]].to_numpy(np.float64)
+            dy = merged[[f"{c}_base" for c in ys]].to_numpy(np.float64) - merged[[f"{c}_test" for c in ys]].to_numpy(np.float64)
+            diag = np.hypot(a[:, 2], a[:, 3])[:, None]
+            out["landmark_nme"] = round(float(np.nanmean(np.hypot(dx, dy) / diag)), 4)
+
+    emotions = [e for e in EMOTIONS if f"{e}_base" in merged]
+    if emotions:
+        eb = merged[[f"{e}_base" for e in emotions]].to_numpy(np.float64)
+        et = merged[[f"{e}_test" for e in emotions]].to_numpy(np.float64)
+        out["emotion_mae"] = round(float(np.nanmean(np.abs(eb - et))), 4)
+        valid = ~(np.isnan(eb).all(axis=1) | np.isnan(et).all(axis=1))
+        if valid.any():
+            agree = np.nanargmax(eb[valid], axis=1) == np.nanargmax(et[valid], axis=1)
+            out["top_emotion_agreement"] = round(float(agree.mean()), 4)
+    return out
+
+
+def run_sweep(args):
+    from scripts.emotion_analysis.process_video import process_video
+
+    sides = [int(s) for s in args.max_sides.split(",") if s.strip()]
+    # 原始分辨率作为基准，必须第一个运行
+    sides = [0] + [s for s in sides if s != 0]
+    enable_profiling()
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    if args.video:
+        video_path = args.video
+    else:
+        name = f"synthetic_{args.width}x{args.height}_{args.frames}f_{args.faces}faces.mp4"
+        video_path = generate_synthetic_video(os.path.join(args.work_dir, name), width=args.width, height=args.height,
+                                              frames=args.frames, fps=args.fps, faces=args.faces)
+
+    detector = make_detector(args)
+    analysed = max(1, args.frames // args.process_sampling_rate)
+    report = {"config": vars(args).copy(), "environment": environment_info(), "runs": []}
+    baseline = None
+    for side in sides:
+        reset_profiling()
+        results_path = os.path.join(args.work_dir, f"sweep_{side or 'full'}.csv")
+        with StageMeter(f"max_side_{side or 'full'}", frames=args.frames) as meter:
+            df = process_video(video_path, args.process_sampling_rate, results_path,
+                               multi_face=args.faces > 1, detector=detector, max_side=side or None)
+        meter.rows = len(df)
+        run = {"max_side": side or None, **meter.result()}
+        run["analysed_frames_per_s"] = round(analysed / meter.wall, 2) if meter.wall > 0 else None
+        run["detect_s"] = profile_summary().get("process_video/detect", {}).get("wall_s")
+        if baseline is None:
+            baseline = df
+            base_wall = meter.wall
+        else:
+            run["speedup"] = round(base_wall / meter.wall, 2) if meter.wall > 0 else None
+            run.update(compare_results(baseline, df))
+        report["runs"].append(run)
+        logging.info(f"⏱ max_side={side or '原始'}：{run}")
+
+    output_dir = os.path.dirname(args.output_json)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f"扫描结果已保存至：{args.output_json}")
+    return report
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_arguments(argv)
+    report = run_sweep(args)
+    print(json.dumps(report["runs"], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# 在项目根目录运行：
+# python -m scripts.benchmark.resolution_sweep --width 3840 --height 2160 --max_sides 0,1920,1280,960,640
+# python -m scripts.benchmark.resolution_sweep --detector real --video videos/sample_4k.mp4 --max_sides 0,1280,960
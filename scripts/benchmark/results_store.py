@@ -0,0 +1,95 @@
+import os
+import json
+import logging
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scripts.emotion_analysis.compact_results import EMOTIONS
+from scripts.emotion_analysis.column_store import convert_to_column_store
+from scripts.emotion_analysis.results_io import load_results
+from .measure import StageMeter
+from .run_benchmark import environment_info
+
+# 与 main.CHART_COLUMNS 相同；不导入 main，子进程的内存峰值中不含绘图模块
+CHART_COLUMNS = ("frame", "face_id", "second", *EMOTIONS)
+MODES = ("csv", "csv_columns", "colstore")
+
+
+def parse_arguments(argv=None):
+    """解析结果存储基准参数"""
+    parser = argparse.ArgumentParser(description="结果存储基准：整表读取 CSV、按列读取 CSV 与列式内存映射存储的耗时和内存峰值")
+    parser.add_argument("--hours", type=float, default=1.0, help="模拟的录像时长（小时，默认 1；24 小时录像的 CSV 约数 GB）")
+    parser.add_argument("--fps", type=float, default=30, help="模拟的视频帧率（默认 30）")
+    parser.add_argument("--sampling_rate", type=int, default=10, help="模拟的检测采样间隔（默认 10 帧）")
+    parser.add_argument("--faces", type=int, default=3, help="人脸数（默认 3）")
+    parser.add_argument("--work_dir", default="outputs/benchmark/results_store", help="合成结果文件的目录")
+    parser.add_argument("--modes", type=str, default=",".join(MODES), help=f"要测量的读取方式，逗号分隔：{', '.join(MODES)}")
+    parser.add_argument("--output_json", default="outputs/benchmark/results_store.json", help="结果 JSON 路径")
+    return parser.parse_args(argv)
+
+
+def generate_results_csv(path, hours, fps, sampling_rate, faces, chunk_frames=20000):
+    """分块写出与 Py-Feat 多人脸输出同样宽的合成结果 CSV（情绪、AU、关键点、姿态、人脸框）。"""
+    if os.path.exists(path):
+        logging.info(f"复用已存在的合成结果：{path}")
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rng = np.random.default_rng(0)
+    extra = ([f"AU{i:02d}" for i in range(1, 21)] + [f"x_{i}" for i in range(68)] + [f"y_{i}" for i in range(68)]
+             + ["Pitch", "Roll", "Yaw", "FaceRectX", "FaceRectY", "FaceRectWidth", "FaceRectHeight", "FaceScore"])
+    frames = np.arange(sampling_rate, int(hours * 3600 * fps) + 1, sampling_rate)
+    for i, lo in enumerate(range(0, len(frames), chunk_frames)):
+        block = np.repeat(frames[lo:lo + chunk_frames], faces)
+        df = pd.DataFrame({"frame": block, "face_id": np.tile(np.arange(1, faces + 1), len(block) // faces)})
+        probs = rng.dirichlet(np.ones(len(EMOTIONS)), len(df)).astype(np.float32)
+        for j, emotion in enumerate(EMOTIONS):
+            df[emotion] = probs[:, j]
+        for col in extra:
+            df[col] = rng.random(len(df), dtype=np.float32)
+        df.to_csv(path, mode="a" if i else "w", header=not i, index=False)
+    return path
+
+
+def measure_load(mode, csv_path, store_path, fps):
+    """在独立进程中读取结果并做一次范围聚合（各人脸中间一小时的平均情绪），返回耗时与内存峰值。"""
+    with StageMeter(mode) as meter:
+        path = store_path if mode == "colstore" else csv_path
+        df = load_results(path, columns=None if mode == "csv" else CHART_COLUMNS)
+        mid = int(df["frame"].max()) // 2
+        window = df[(df["frame"] >= mid) & (df["frame"] <= mid + int(3600 * fps))]
+        window.groupby("face_id")[list(EMOTIONS)].mean()
+        meter.rows = len(df)
+    return meter.result()
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    tag = f"{args.hours:g}h_{args.faces}faces_s{args.sampling_rate}"
+    csv_path = generate_results_csv(os.path.join(args.work_dir, f"results_{tag}.csv"), args.hours, args.fps,
+                                    args.sampling_rate, args.faces)
+    store_path = os.path.join(args.work_dir, f"results_{tag}.colstore")
+    with StageMeter("convert") as meter:
+        convert_to_column_store(csv_path, store_path)
+
+    results = {"environment": environment_info(), "csv_mb": round(os.path.getsize(csv_path) / 2 ** 20, 1),
+               "convert": meter.result(), "modes": {}}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        # 每种读取方式使用全新的进程，内存峰值互不影响
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+            results["modes"][mode] = pool.submit(measure_load, mode, csv_path, store_path, args.fps).result()
+        logging.info(f"{mode}: {results['modes'][mode]}")
+
+    os.makedirs(os.path.dirname(args.output_json) or ".", exist_ok=True)
+    with open(args.output_json, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    logging.info(f"结果已保存至：{args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+
+import matplotlib
+matplotlib.use("Agg")  # 基准测试不弹窗
+
+from scripts.emotion_analysis.profiling import enable_profiling, reset_profiling, profile_summary
+from .measure import StageMeter
+from .stub_detector import StubDetector
+from .synthetic_video import generate_synthetic_video
+
+PLOT_STAGES = ["line", "pie", "bar", "heatmap", "radar", "dynamic", "clusters"]
+
+
+def parse_arguments(argv=None):
+    """解析基准测试命令行参数"""
+    parser = argparse.ArgumentParser(description="离线基准测试：合成视频 + 桩检测器（或真实 Py-Feat 检测器）")
+    parser.add_argument("--width", type=int, default=1280, help="合成视频宽度（默认 1280）")
+    parser.add_argument("--height", type=int, default=720, help="合成视频高度（默认 720）")
+    parser.add_argument("--frames", type=int, default=300, help="合成视频总帧数（默认 300）")
+    parser.add_argument("--fps", type=float, default=30, help="合成视频帧率（默认 30）")
+    parser.add_argument("--faces", type=int, default=1, help="每帧人脸数（默认 1，大于 1 时启用多人脸模式）")
+    parser.add_argument("--process_sampling_rate", type=int, default=10, help="检测采样间隔（默认 10 帧）")
+    parser.add_argument("--detector", choices=["stub", "real"], default="stub", help="stub：确定性桩检测器（默认）；real：Py-Feat Detector")
+    parser.add_argument("--stub_latency", type=float, default=0.0, help="桩检测器每张人脸运行全部子模型时模拟的推理耗时（秒）")
+    parser.add_argument("--features", default="all", help="需要的分析类别（同主程序 --features），如 emotion 与 all 对比提速")
+    parser.add_argument("--keep", default="all", help="结果中保留的列分组（同主程序 --keep）")
+    parser.add_argument("--decoder", default="auto", choices=["auto", "pyav", "opencv"], help="视频解码后端（同主程序 --decoder）")
+    parser.add_argument("--stages", default="detect,plot,report", help="要测量的阶段，逗号分隔：detect,plot,report")
+    parser.add_argument("--video", default=None, help="使用已有视频而不是生成合成视频")
+    parser.add_argument("--work_dir", default="outputs/benchmark", help="合成视频与中间结果目录")
+    parser.add_argument("--output_json", default="outputs/benchmark/benchmark.json", help="基准结果 JSON 路径")
+    return parser.parse_args(argv)
+
+
+def environment_info():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    for module in ("numpy", "pandas", "cv2", "matplotlib", "plotly", "sklearn", "reportlab", "feat", "torch"):
+        mod = sys.modules.get(module)
+        if mod is None:
+            try:
+                mod = __import__(module)
+            except ImportError:
+                continue
+        info[f"{module}_version"] = getattr(mod, "__version__", "unknown")
+    return info
+
+
+def make_detector(args):
+    if args.detector == "real":
+        from scripts.emotion_analysis.detector_profiles import build_detector
+        return build_detector(args.features)
+    return StubDetector(faces=args.faces, latency=args.stub_latency, features=args.features)
+
+
+def run_plot_stages(df, fps, frames, out_dir, stages):
+    """逐个运行绘图函数并分别计时"""
+    from scripts.emotion_analysis.plot_emotion_line import plot_emotion_line
+    from scripts.emotion_analysis.plot_emotion_pie import plot_emotion_pie
+    from scripts.emotion_analysis.plot_emotion_bar import plot_emotion_bar
+    from scripts.emotion_analysis.plot_emotion_heatmap import plot_emotion_heatmap
+    from scripts.emotion_analysis.plot_emotion_radar import plot_emotion_radar
+    from scripts.emotion_analysis.plot_emotion_dynamic import plot_emotion_dynamic
+    from scripts.emotion_analysis.plot_emotion_clusters import plot_emotion_clusters
+
+    plots = {
+        "line": lambda: plot_emotion_line(df=df, fps=fps, save_path=os.path.join(out_dir, "emotion_line.png")),
+        "pie": lambda: plot_emotion_pie(df=df, save_path=os.path.join(out_dir, "emotion_pie.png")),
+        "bar": lambda: plot_emotion_bar(df=df, save_path=os.path.join(out_dir, "emotion_bar.png")),
+        "heatmap": lambda: plot_emotion_heatmap(df=df, fps=fps, save_path=os.path.join(out_dir, "emotion_heatmap.png")),
+        "radar": lambda: plot_emotion_radar(df=df, fps=fps, save_path=os.path.join(out_dir, "emotion_radar.png")),
+        "dynamic": lambda: plot_emotion_dynamic(df=df, fps=fps, save_path=os.path.join(out_dir, "emotion_dynamic.html")),
+        "clusters": lambda: plot_emotion_clusters(df=df, fps=fps, method="tsne", cluster_sampling_rate=None,
+                                                  save_path=os.path.join(out_dir, "emotion_clusters.png")),
+    }
+    results = {}
+    for name in stages:
+        with StageMeter(f"plot_{name}", frames=frames) as meter:
+            plots[name]()
+        meter.rows = len(df)
+        results[f"plot_{name}"] = meter.result()
+        logging.info(f"⏱ plot_{name}: {results[f'plot_{name}']}")
+    return results
+
+
+def run_benchmark(args):
+    from scripts.emotion_analysis.process_video import process_video
+    from scripts.emotion_analysis.generate_report import generate_report
+    from scripts.emotion_analysis.results_io import load_results
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    # 同时启用阶段计时，得到 decode / detect / render_figure 等子阶段的分解
+    enable_profiling()
+    reset_profiling()
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    if args.video:
+        video_path = args.video
+    else:
+        name = f"synthetic_{args.width}x{args.height}_{args.frames}f_{args.faces}faces.mp4"
+        video_path = generate_synthetic_video(os.path.join(args.work_dir, name), width=args.width, height=args.height,
+                                              frames=args.frames, fps=args.fps, faces=args.faces)
+
+    report = {
+        "config": vars(args).copy(),
+        "environment": environment_info(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": {},
+    }
+    results_path = os.path.join(args.work_dir, "benchmark_results.csv")
+
+    df = None
+    if "detect" in stages:
+        detector = make_detector(args)
+        with StageMeter("detect", frames=args.frames) as meter:
+            df = process_video(video_path, args.process_sampling_rate, results_path,
+                               multi_face=args.faces > 1, detector=detector, keep=args.keep,
+                               decoder=args.decoder)
+        meter.rows = len(df)
+        report["stages"]["detect"] = meter.result()
+        report["stages"]["detect"]["analysed_frames_per_s"] = round(
+            (args.frames // args.process_sampling_rate) / meter.wall, 2) if meter.wall > 0 else None
+        logging.info(f"⏱ detect: {report['stages']['detect']}")
+
+    if df is None and ("plot" in stages or "report" in stages):
+        df = load_results(results_path)
+
+    with tempfile.TemporaryDirectory(prefix="emotion_bench_") as out_dir:
+        if "plot" in stages:
+            report["stages"].update(run_plot_stages(df, args.fps, args.frames, out_dir, PLOT_STAGES))
+
+        if "report" in stages:
+            report_args = argparse.Namespace(start_frame=None, end_frame=None, method="tsne", perplexity=30.0,
+                                             n_neighbors=15, cluster_sampling_rate=None)
+            with StageMeter("report", frames=args.frames) as meter:
+                generate_report(df=df, args=report_args, output_path=os.path.join(out_dir, "report.pdf"))
+            meter.rows = len(df)
+            report["stages"]["report"] = meter.result()
+            logging.info(f"⏱ report: {report['stages']['report']}")
+
+    report["profile"] = profile_summary()
+
+    output_dir = os.path.dirname(args.output_json)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f"基准结果已保存至：{args.output_json}")
+    return report
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_arguments(argv)
+    report = run_benchmark(args)
+    print(json.dumps(report["stages"], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# 在项目根目录运行：
+# python -m scripts.benchmark.run_benchmark --width 1920 --height 1080 --frames 600 --faces 2
+# python -m scripts.benchmark.run_benchmark --detector real --stages detect
+# python -m scripts.benchmark.run_benchmark --detector real --stages detect --features emotion --output_json outputs/benchmark/emotion.json
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from scripts.emotion_analysis.inference_client import InferenceClient
+from scripts.emotion_analysis.inference_server import InferenceService, create_server
+from .stub_detector import StubDetector, stub_analyze
+from .synthetic_video import draw_frame
+
+
+def parse_arguments(argv=None):
+    """解析推理服务往返测试参数"""
+    parser = argparse.ArgumentParser(description="推理服务往返测试：本地启动服务（桩模型），并发客户端发送帧，比较不同微批次配置")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数（默认 8）")
+    parser.add_argument("--requests", type=int, default=20, help="每个客户端发送的帧数（默认 20）")
+    parser.add_argument("--width", type=int, default=640, help="帧宽度（默认 640）")
+    parser.add_argument("--height", type=int, default=360, help="帧高度（默认 360）")
+    parser.add_argument("--faces", type=int, default=1, help="每帧人脸数（默认 1）")
+    parser.add_argument("--call_overhead", type=float, default=0.02, help="桩检测器每次调用的固定耗时（秒，默认 0.02）")
+    parser.add_argument("--stub_latency", type=float, default=0.005, help="桩检测器每张人脸的耗时（秒，默认 0.005）")
+    parser.add_argument("--configs", default="1:0,8:20", help="要比较的微批次配置 max_batch:max_latency_ms，逗号分隔（默认 1:0,8:20）")
+    parser.add_argument("--transport", choices=["tcp", "unix"], default="tcp", help="传输方式（默认 tcp，端口自动分配）")
+    parser.add_argument("--output_json", default="outputs/benchmark/server_roundtrip.json", help="结果 JSON 路径")
+    return parser.parse_args(argv)
+
+
+def run_clients(client, frames, clients, requests):
+    """并发发送帧，返回每个请求的往返耗时（秒）"""
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+
+    def worker(cid):
+        for r in range(requests):
+            frame = frames[(cid + r) % len(frames)]
+            start = time.perf_counter()
+            try:
+                client.detect_frame(frame)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def run_roundtrip(args):
+    frames = [draw_frame(args.width, args.height, args.faces, i * 7, 30) for i in range(16)]
+    report = {"config": vars(args).copy(), "runs": []}
+
+    for config in args.configs.split(","):
+        max_batch, max_latency_ms = (float(v) for v in config.split(":"))
+        detector = StubDetector(faces=args.faces, latency=args.stub_latency, call_overhead=args.call_overhead)
+        service = InferenceService(detector=detector, analyzer=stub_analyze, max_batch=int(max_batch),
+                                   max_latency_ms=max_latency_ms).load()
+        with tempfile.TemporaryDirectory(prefix="emotion_server_") as tmp_dir:
+            unix_socket = os.path.join(tmp_dir, "server.sock") if args.transport == "unix" else None
+            server = create_server(service, port=0, unix_socket=unix_socket)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            if unix_socket:
+                client = InferenceClient(unix_socket=unix_socket)
+            else:
+                client = InferenceClient(f"http://127.0.0.1:{server.server_address[1]}")
+
+            # 先验证图像分析接口可用
+            client.analyze_image(frames[0], actions=["emotion", "age"])
+            start = time.perf_counter()
+            latencies, errors = run_clients(client, frames, args.clients, args.requests)
+            wall = time.perf_counter() - start
+            health = client.health()
+            server.shutdown()
+            server.server_close()
+        service.close()
+
+        lat_ms = np.array(latencies) * 1000
+        run = {
+            "max_batch": int(max_batch),
+            "max_latency_ms": max_latency_ms,
+            "requests": len(latencies),
+            "errors": len(errors),
+            "wall_s": round(wall, 3),
+            "requests_per_s": round(len(latencies) / wall, 1) if wall > 0 else None,
+            "latency_p50_ms": round(float(np.percentile(lat_ms, 50)), 1) if len(lat_ms) else None,
+            "latency_p95_ms": round(float(np.percentile(lat_ms, 95)), 1) if len(lat_ms) else None,
+            "frame_batches": health["frame_batches"],
+        }
+        report["runs"].append(run)
+        logging.info(f"⏱ max_batch={run['max_batch']} 延迟预算={max_latency_ms} ms：{run}")
+
+    output_dir = os.path.dirname(args.output_json)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f"结果已保存至：{args.output_json}")
+    return report
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_arguments(argv)
+    report = run_roundtrip(args)
+    print(json.dumps(report["runs"], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# 在项目根目录运行：
+# python -m scripts.benchmark.server_roundtrip --clients 8 --requests 20 --configs 1:0,4:10,8:20
+# python -m scripts.benchmark.server_roundtrip --transport unix
@@ -0,0 +1,130 @@
+import time
+import numpy as np
+import pandas as pd
+import cv2
+
+from scripts.emotion_analysis.detector_profiles import OPTIONAL_MODELS, REQUIRED_MODELS, enabled_models, parse_features
+from .synthetic_video import face_layout
+
+EMOTIONS = ["anger", "disgust", "fear", "happiness", "sadness", "surprise", "neutral"]
+AUS = ["AU01", "AU02", "AU04", "AU05", "AU06", "AU07", "AU09", "AU10", "AU11", "AU12",
+       "AU14", "AU15", "AU17", "AU20", "AU23", "AU24", "AU25", "AU26", "AU28", "AU43"]
+N_LANDMARKS = 68
+
+
+class StubDetector:
+    """
+    确定性的桩检测器，接口与 Py-Feat Detector 在本项目中用到的部分一致
+    （device 属性与 detect_image 方法），返回列结构与 Py-Feat 相同的 DataFrame：
+    人脸框、68 个关键点、头部姿态、AU 与 7 种情绪。
+
+    人脸位置取自合成视频的布局，情绪由人脸区域的像素统计量确定性地计算，
+    相同输入总是得到相同输出；latency 可模拟每张人脸的模型推理耗时。
+    features 与主程序 --features 相同：未启用的子模型不计耗时，对应列填 NaN。
+    传入路径列表时按批处理，结果的 input 列对应各自的图像路径（与 Py-Feat 一致）；
+    call_overhead 模拟每次调用模型的固定开销，用于衡量批处理的收益。
+    """
+
+    def __init__(self, faces=1, latency=0.0, features="all", call_overhead=0.0):
+        """
+        :param faces: 每帧“检测”到的人脸数，应与合成视频一致
+        :param latency: 每张人脸运行全部子模型时模拟的推理耗时（秒），默认 0；
+                        只启用部分子模型时按启用比例折算
+        :param features: 需要的分析类别（同 --features），默认 all
+        :param call_overhead: 每次 detect_image 调用的固定耗时（秒），与批大小无关，默认 0
+        """
+        self.faces = faces
+        self.latency = latency
+        self.call_overhead = call_overhead
+        self.device = "cpu"
+        self.models = enabled_models(parse_features(features))
+        all_models = len(REQUIRED_MODELS) + len(OPTIONAL_MODELS)
+        self.latency_per_face = latency * len(self.models) / all_models
+
+    @staticmethod
+    def _load(image):
+        if isinstance(image, str):
+            img = cv2.imread(image)
+            if img is None:
+                raise ValueError(f"无法读取图像：{image}")
+            return img
+        return np.asarray(image)
+
+    def _face_row(self, img, idx, cx, cy, rx, ry):
+        h, w = img.shape[:2]
+        x0, x1 = max(0, cx - rx), min(w, cx + rx)
+        y0, y1 = max(0, cy - ry), min(h, cy + ry)
+        crop = img[y0:y1, x0:x1].astype(np.float32) / 255.0
+        mouth = crop[crop.shape[0] // 2:, :]
+        stats = np.concatenate([crop.mean(axis=(0, 1)), mouth.std(axis=(0, 1))])
+
+        k = np.arange(len(EMOTIONS), dtype=np.float32)
+        logits = np.sin(stats.sum() * 17.0 + k * 1.3 + idx) * 2.0
+        emotions = np.exp(logits) / np.exp(logits).sum()
+
+        angles = np.linspace(0, 2 * np.pi, N_LANDMARKS, endpoint=False)
+        lx = cx + rx * 0.8 * np.cos(angles)
+        ly = cy + ry * 0.8 * np.sin(angles)
+
+        row = {
+            "FaceRectX": float(x0),
+            "FaceRectY": float(y0),
+            "FaceRectWidth": float(x1 - x0),
+            "FaceRectHeight": float(y1 - y0),
+            "FaceScore": 0.99,
+        }
+        row.update({f"x_{i}": float(v) for i, v in enumerate(lx)})
+        row.update({f"y_{i}": float(v) for i, v in enumerate(ly)})
+        pose = stats[:3] * 10 if "facepose_model" in self.models else np.full(3, np.nan)
+        row.update({"Pitch": float(pose[0]), "Roll": float(pose[1]), "Yaw": float(pose[2])})
+        au = (np.sin(stats.sum() * 7.0 + np.arange(len(AUS))) + 1) / 2
+        if "au_model" not in self.models:
+            au = np.full(len(AUS), np.nan)
+        row.update({name: float(v) for name, v in zip(AUS, au)})
+        if "emotion_model" not in self.models:
+            emotions = np.full(len(EMOTIONS), np.nan)
+        row.update({name: float(v) for name, v in zip(EMOTIONS, emotions)})
+        return row
+
+    def detect_image(self, inputs, return_multiple=False, **kwargs):
+        batch = list(inputs) if isinstance(inputs, (list, tuple)) else [inputs]
+        rows = []
+        for item in batch:
+            img = self._load(item)
+            h, w = img.shape[:2]
+            layout = face_layout(w, h, self.faces)
+            # 批量输入与 Py-Feat 一样返回全部人脸
+            if not return_multiple and not isinstance(inputs, (list, tuple)):
+                layout = layout[:1]
+            for i, face in enumerate(layout):
+                row = self._face_row(img, i, *face)
+                row["input"] = item if isinstance(item, str) else ""
+                rows.append(row)
+        if self.call_overhead:
+            time.sleep(self.call_overhead)
+        if self.latency_per_face:
+            time.sleep(self.latency_per_face * len(rows))
+        return pd.DataFrame(rows)
+
+
+def stub_analyze(image, actions):
+    """
+    确定性的 DeepFace.analyze 替身：返回与 DeepFace 结构相同的字段（按 actions），
+    数值由图像像素统计量计算。
+    """
+    img = np.asarray(image, dtype=np.float32) / 255.0
+    seed = float(img.mean()) if img.size else 0.0
+    result = {"region": {"x": 0, "y": 0, "w": int(img.shape[1]), "h": int(img.shape[0])}}
+    if "emotion" in actions:
+        names = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+        logits = np.sin(seed * 31.0 + np.arange(len(names)))
+        scores = np.exp(logits) / np.exp(logits).sum() * 100
+        result["emotion"] = {n: float(v) for n, v in zip(names, scores)}
+        result["dominant_emotion"] = names[int(scores.argmax())]
+    if "age" in actions:
+        result["age"] = int(20 + seed * 40)
+    if "gender" in actions:
+        result["dominant_gender"] = "Woman" if seed > 0.5 else "Man"
+    if "race" in actions:
+        result["dominant_race"] = "unknown"
+    return result
@@ -0,0 +1,70 @@
+import os
+import logging
+import numpy as np
+import cv2
+
+
+def face_layout(width, height, faces):
+    """
+    合成视频中各人脸的基准位置，返回 [(cx, cy, rx, ry), ...]。
+    人脸沿水平方向等间隔排列；桩检测器使用同一布局来“检测”人脸。
+    """
+    rx = max(8, int(width / (faces * 2 + 2) * 0.8))
+    ry = max(10, int(min(height * 0.3, rx * 1.3)))
+    cy = height // 2
+    return [(int(width * (i + 1) / (faces + 1)), cy, rx, ry) for i in range(faces)]
+
+
+def face_position(layout_item, frame_idx, fps):
+    """人脸随时间的缓慢漂移位置"""
+    cx, cy, rx, ry = layout_item
+    dx = int(rx * 0.15 * np.sin(frame_idx / fps * 0.7))
+    dy = int(ry * 0.10 * np.cos(frame_idx / fps * 0.5))
+    return cx + dx, cy + dy, rx, ry
+
+
+def draw_frame(width, height, faces, frame_idx, fps, rng_noise=None):
+    """绘制一帧：灰色背景上若干卡通人脸，嘴部弧度随时间变化，模拟表情变化。"""
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    if rng_noise is not None:
+        frame = cv2.add(frame, rng_noise)
+    for i, item in enumerate(face_layout(width, height, faces)):
+        cx, cy, rx, ry = face_position(item, frame_idx, fps)
+        cv2.ellipse(frame, (cx, cy), (rx, ry), 0, 0, 360, (150, 180, 220), -1)
+        eye_dx, eye_dy, eye_r = rx // 3, ry // 4, max(2, rx // 8)
+        cv2.circle(frame, (cx - eye_dx, cy - eye_dy), eye_r, (40, 40, 40), -1)
+        cv2.circle(frame, (cx + eye_dx, cy - eye_dy), eye_r, (40, 40, 40), -1)
+        # 嘴部：笑（下弧）与撇嘴（上弧）之间周期变化，每张人脸相位不同
+        smile = np.sin(frame_idx / fps * 1.3 + i * 1.7)
+        mouth_w, mouth_h = rx // 2, max(1, int(abs(smile) * ry // 5))
+        mouth_y = cy + ry // 2
+        start, end = (0, 180) if smile >= 0 else (180, 360)
+        cv2.ellipse(frame, (cx, mouth_y), (mouth_w, mouth_h), 0, start, end, (40, 40, 160), max(2, rx // 15))
+    return frame
+
+
+def generate_synthetic_video(path, width=1280, height=720, frames=300, fps=30, faces=1, seed=0):
+    """
+    生成合成测试视频（mp4v 编码），若同参数文件已存在则直接复用。
+    返回视频路径。
+    """
+    if os.path.exists(path):
+        logging.info(f"复用已存在的合成视频：{path}")
+        return path
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"无法创建合成视频：{path}")
+    rng = np.random.default_rng(seed)
+    # 固定的低幅噪声底图，避免编码器把画面压成纯色块，解码开销更接近真实视频
+    noise = rng.integers(0, 12, size=(height, width, 3), dtype=np.uint8)
+    try:
+        for idx in range(frames):
+            writer.write(draw_frame(width, height, faces, idx, fps, rng_noise=noise))
+    finally:
+        writer.release()
+    logging.info(f"合成视频已生成：{path}（{width}x{height}，{frames} 帧，{faces} 张人脸）")
+    return path
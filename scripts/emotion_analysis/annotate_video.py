@@ -0,0 +1,326 @@
+import os
+import time
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from .profiling import stage
+from .compact_results import EMOTIONS, KEEP_GROUPS
+from .frame_resize import PIXEL_COLUMNS
+from .video_decoder import open_decoder
+
+# 各阶段之间的队列长度（帧数）：解码、绘制、编码重叠运行，队列满时上游等待，内存占用有上限
+QUEUE_SIZE = 32
+# segments=0（自动）时每段的目标帧数，段数不超过 CPU 核数
+SEGMENT_FRAMES = 1800
+_DONE = object()
+
+
+def default_max_gap(df):
+    """默认的最大插值间隔：采样间隔中位数的 2 倍。"""
+    steps = np.diff(np.sort(df["frame"].unique()))
+    return int(np.median(steps)) * 2 if len(steps) else 1
+
+
+def interpolate_annotations(df, start=None, end=None, max_gap=None, top_aus=3):
+    """
+    把采样帧上的检测结果插值到每一帧，返回 {帧号: [(人脸框, 主情绪, 概率, [(AU, 数值), ...]), ...]}。
+
+    同一人脸相邻两个采样帧之间线性插值人脸框、情绪概率与 AU；两个采样帧相距超过 max_gap 帧时
+    视为人脸中途消失，不插值，只在各采样帧前后 max_gap // 2 帧内沿用最近的结果。
+    max_gap 默认取采样间隔中位数的 2 倍。只生成 [start, end] 范围内的帧。
+
+    多人脸结果中 face_id 只是每帧内的检测顺序，不同采样帧的同一编号未必是同一个人，
+    因此先用 identity_search.build_tracks 按人脸框 IoU 把各帧的人脸连成轨迹，再逐条轨迹插值。
+    """
+    if df is None or df.empty or not all(c in df for c in PIXEL_COLUMNS):
+        return {}
+    emotions = [c for c in EMOTIONS if c in df]
+    aus = [c for c in df.columns if KEEP_GROUPS["aus"](c)]
+    columns = list(PIXEL_COLUMNS) + emotions + aus
+
+    if max_gap is None:
+        max_gap = default_max_gap(df)
+    hold = max(max_gap // 2, 0)
+
+    if df["frame"].duplicated().any():
+        # 与 identity_search 相互引用，在函数内导入
+        from .identity_search import build_tracks
+
+        tracks = build_tracks(df, max_gap=max_gap)
+    else:
+        tracks = df["face_id"] if "face_id" in df else pd.Series(1, index=df.index)
+
+    annotations = {}
+    for track_id, face in df.groupby(tracks, sort=True):
+        if track_id < 0:
+            # 人脸框缺失的行不属于任何轨迹
+            continue
+        face = face.sort_values("frame").drop_duplicates("frame")
+        samples = face["frame"].to_numpy(np.int64)
+        values = face[columns].to_numpy(np.float64)
+        lo = max(int(samples[0]) - hold, start or 1)
+        hi = min(int(samples[-1]) + hold, end if end is not None else int(samples[-1]) + hold)
+        if hi < lo:
+            continue
+        targets = np.arange(lo, hi + 1)
+
+        # 每个目标帧前后最近的采样帧
+        right = np.clip(np.searchsorted(samples, targets, side="left"), 0, len(samples) - 1)
+        left = np.clip(right - (samples[right] > targets), 0, len(samples) - 1)
+        gap = samples[right] - samples[left]
+        inside = (samples[left] <= targets) & (targets <= samples[right]) & (gap <= max_gap)
+        weight = np.where(gap > 0, (targets - samples[left]) / np.where(gap > 0, gap, 1), 0.0)[:, None]
+        interpolated = values[left] * (1 - weight) + values[right] * weight
+
+        # 不能插值的帧：在 hold 帧以内沿用最近的采样结果
+        nearest = np.where(np.abs(targets - samples[left]) <= np.abs(samples[right] - targets), left, right)
+        held = np.abs(samples[nearest] - targets) <= hold
+        result = np.where(inside[:, None], interpolated, values[nearest])
+        valid = (inside | held) & np.isfinite(result[:, :4]).all(axis=1)
+
+        for frame_number, row in zip(targets[valid], result[valid]):
+            box = row[:4]
+            probs = row[4:4 + len(emotions)]
+            label, prob = "", float("nan")
+            if len(emotions) and np.isfinite(probs).any():
+                best = int(np.nanargmax(probs))
+                label, prob = emotions[best], float(probs[best])
+            au_values = row[4 + len(emotions):]
+            top = []
+            if len(aus) and top_aus and np.isfinite(au_values).any():
+                order = np.argsort(np.nan_to_num(au_values, nan=-np.inf))[::-1][:top_aus]
+                top = [(aus[i], float(au_values[i])) for i in order if np.isfinite(au_values[i])]
+            annotations.setdefault(int(frame_number), []).append((box, label, prob, top))
+    return annotations
+
+
+def draw_annotations(frame, faces):
+    """在画面上绘制人脸框、主情绪及概率，以及激活最高的几个 AU。"""
+    for box, label, prob, top in faces:
+        x, y, w, h = (int(round(v)) for v in box)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        if label:
+            cv2.putText(frame, f"{label} {prob:.2f}", (x, max(20, y - 8)), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.7, (0, 255, 0), 2)
+        for i, (name, value) in enumerate(top):
+            cv2.putText(frame, f"{name}: {value:.2f}", (x, y + h + 20 + i * 18), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, (0, 255, 255), 1)
+    return frame
+
+
+def _run_stage(name, func, inbox, outbox, errors):
+    """流水线中的一个线程：从 inbox 取帧、处理后放入 outbox；出错时记录异常并继续传递结束标记。"""
+    try:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            with stage(name):
+                item = func(item)
+            outbox.put(item)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        outbox.put(_DONE)
+
+
+def render_segment(video_path, df, output_path, start=None, end=None, decoder="auto", max_gap=None, top_aus=3,
+                   codec="mp4v"):
+    """
+    渲染 [start, end] 范围内的带标注视频：解码、绘制、编码三个线程通过有界队列重叠运行。
+    返回写出的帧数。
+    """
+    annotations = interpolate_annotations(df, start, end, max_gap=max_gap, top_aus=top_aus)
+    video = open_decoder(video_path, backend=decoder)
+    fps = video.fps or 30
+
+    decoded, drawn = queue.Queue(QUEUE_SIZE), queue.Queue(QUEUE_SIZE)
+    errors = []
+    stop = threading.Event()
+
+    def decode():
+        try:
+            frames = video.frames(1, start=start, end=end)
+            while not stop.is_set():
+                with stage("annotate_decode"):
+                    item = next(frames, None)
+                if item is None:
+                    break
+                decoded.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            decoded.put(_DONE)
+
+    def draw(item):
+        frame_number, frame = item
+        faces = annotations.get(frame_number)
+        if faces:
+            # 解码器返回的数组可能是只读视图，绘制前复制
+            frame = draw_annotations(np.array(frame, copy=True), faces)
+        return frame
+
+    threads = [threading.Thread(target=decode, name="annotate-decode", daemon=True),
+               threading.Thread(target=_run_stage, args=("annotate_draw", draw, decoded, drawn, errors),
+                                name="annotate-draw", daemon=True)]
+    for t in threads:
+        t.start()
+
+    writer, written = None, 0
+    try:
+        while True:
+            frame = drawn.get()
+            if frame is _DONE:
+                break
+            with stage("annotate_encode"):
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, (w, h))
+                    if not writer.isOpened():
+                        raise OSError(f"无法创建输出视频：{output_path}（编码器 {codec}）")
+                writer.write(frame)
+            written += 1
+    finally:
+        # 编码出错时通知解码线程停止，并清空队列，避免上游线程阻塞在 put 上
+        stop.set()
+        while any(t.is_alive() for t in threads):
+            for q in (decoded, drawn):
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+        for t in threads:
+            t.join()
+        video.close()
+        if writer is not None:
+            writer.release()
+    if errors:
+        raise errors[0]
+    return written
+
+
+def _segment_task(video_path, df, output_path, start, end, decoder, max_gap, top_aus, codec):
+    return output_path, render_segment(video_path, df, output_path, start, end, decoder, max_gap, top_aus, codec)
+
+
+def concat_segments(paths, output_path):
+    """用 PyAV 把各片段的压缩数据按顺序重新封装为一个视频（不重新编码）。"""
+    import av
+
+    with av.open(output_path, "w") as out:
+        out_stream, offset = None, 0
+        for path in paths:
+            with av.open(path) as inp:
+                in_stream = inp.streams.video[0]
+                if out_stream is None:
+                    # PyAV 14 起为 add_stream_from_template，旧版本为 add_stream(template=...)
+                    if hasattr(out, "add_stream_from_template"):
+                        out_stream = out.add_stream_from_template(in_stream)
+                    else:
+                        out_stream = out.add_stream(template=in_stream)
+                end = offset
+                for packet in inp.demux(in_stream):
+                    if packet.dts is None:
+                        continue
+                    packet.pts = packet.pts + offset if packet.pts is not None else None
+                    packet.dts += offset
+                    end = max(end, (packet.pts if packet.pts is not None else packet.dts) + (packet.duration or 0))
+                    packet.stream = out_stream
+                    out.mux(packet)
+                offset = end
+
+
+def _segment_bounds(total, segments, start=None, end=None):
+    """把 [start, end] 帧范围平均切成 segments 段（含两端）；最后一段的结束帧为 end（None 表示到结尾）。"""
+    first = start or 1
+    last = end if end is not None else total
+    size = max(1, -(-(last - first + 1) // segments))
+    bounds = []
+    for s in range(first, last + 1, size):
+        bounds.append((s, min(s + size - 1, last)))
+    if bounds and end is None:
+        bounds[-1] = (bounds[-1][0], None)
+    return bounds
+
+
+def export_annotated_video(video_path, df, output_path, segments=1, workers=None, decoder="auto", max_gap=None,
+                           top_aus=3, codec="mp4v", start_frame=None, end_frame=None):
+    """
+    根据检测结果导出带标注的视频（人脸框、主情绪、激活最高的 AU），采样帧之间插值。
+
+    segments > 1 时把视频切成若干段，由进程池（workers 个进程）并行渲染、编码，再无损拼接（需要 PyAV）；
+    segments=0 时按视频长度自动分段（约 SEGMENT_FRAMES 帧一段，不超过 CPU 核数）。
+    每段内部解码、绘制、编码三个阶段流水线重叠运行。返回写出帧数与耗时等统计信息。
+    检测结果缺少人脸框列（如 detect 时 --keep 不含 box）时抛出 ValueError，不会导出没有标注的视频。
+    """
+    if df is None or df.empty:
+        logging.warning("检测结果为空，导出的视频不含任何标注。")
+    elif not all(c in df for c in PIXEL_COLUMNS):
+        raise ValueError("检测结果中没有人脸框列（FaceRect*），无法绘制标注，请在 detect 时保留 box 分组（--keep 包含 box）。")
+
+    start_time = time.perf_counter()
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if segments != 1:
+        try:
+            import av  # noqa: F401
+        except ImportError:
+            if segments > 1:
+                logging.warning("未安装 PyAV，无法拼接分段，改为单段导出。")
+            segments = 1
+
+    total = 0
+    if segments != 1:
+        cap = cv2.VideoCapture(video_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if total <= 0:
+            logging.warning(f"无法获取视频帧数，改为单段导出：{video_path}")
+            segments = 1
+        elif segments == 0:
+            span = (end_frame or total) - (start_frame or 1) + 1
+            segments = max(1, min(os.cpu_count() or 1, span // SEGMENT_FRAMES))
+
+    if max_gap is None:
+        max_gap = default_max_gap(df) if df is not None and not df.empty else 1
+
+    if segments <= 1:
+        frames = render_segment(video_path, df, output_path, start_frame, end_frame, decoder, max_gap, top_aus, codec)
+    else:
+        bounds = _segment_bounds(total, segments, start_frame, end_frame)
+        tmp_dir = tempfile.mkdtemp(prefix="annotate_", dir=output_dir or None)
+        try:
+            ctx = mp.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers or min(len(bounds), os.cpu_count() or 1),
+                                     mp_context=ctx) as pool:
+                futures = []
+                for i, (s, e) in enumerate(bounds):
+                    # 每段只传入该段及前后 max_gap 帧内的采样结果（插值与沿用都不会超出这个范围）
+                    hi = e + max_gap if e is not None else df["frame"].max()
+                    rows = df[df["frame"].between(s - max_gap, hi)]
+                    futures.append(pool.submit(_segment_task, video_path, rows,
+                                               os.path.join(tmp_dir, f"segment_{i:04d}.mp4"), s, e, decoder,
+                                               max_gap, top_aus, codec))
+                results = [f.result() for f in futures]
+            with stage("annotate_concat"):
+                concat_segments([path for path, _ in results], output_path)
+            frames = sum(n for _, n in results)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start_time
+    stats = {"output_video": output_path, "frames": frames, "segments": max(1, segments),
+             "seconds": round(elapsed, 2), "frames_per_s": round(frames / elapsed, 1) if elapsed > 0 else None}
+    logging.info(f"带标注视频已保存到：{output_path}（{frames} 帧，{stats['frames_per_s']} 帧/秒）")
+    return stats
@@ -0,0 +1,210 @@
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from .compact_results import EMOTIONS
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm", ".mpg", ".mpeg", ".wmv", ".flv")
+BATCH_STAGES = ("detect", "plot", "report", "annotate")
+INDEX_FIELDS = ["video_path", "output_dir", "status", "error", "rows", "faces", "analysed_frames",
+                "dominant_emotion", "results", "report", "annotated_video", "elapsed_s", "worker_pid"]
+
+# 每个工作进程只加载一次检测器，由 init_worker 设置
+_DETECTOR = None
+
+
+def collect_videos(source):
+    """
+    收集待处理的视频列表：source 可以是目录（按扩展名递归查找视频文件），
+    也可以是清单文件（.csv 需包含 video_path 列；其他文本文件每行一个路径，# 开头为注释）。
+    清单中的相对路径以清单所在目录为基准。
+    """
+    if os.path.isdir(source):
+        videos = []
+        for root, _, files in os.walk(source):
+            videos.extend(os.path.join(root, f) for f in files if f.lower().endswith(VIDEO_EXTENSIONS))
+        return sorted(videos)
+
+    if not os.path.isfile(source):
+        raise FileNotFoundError(f"视频目录或清单文件不存在：{source}")
+
+    base = os.path.dirname(os.path.abspath(source))
+    if source.lower().endswith(".csv"):
+        manifest = pd.read_csv(source)
+        if "video_path" not in manifest.columns:
+            raise ValueError(f"清单文件缺少 video_path 列：{source}")
+        paths = manifest["video_path"].dropna().astype(str).tolist()
+    else:
+        with open(source, encoding="utf-8") as f:
+            paths = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return [p if os.path.isabs(p) else os.path.join(base, p) for p in paths]
+
+
+def assign_output_dirs(videos, output_root):
+    """为每个视频分配独立的输出目录（以文件名命名，重名时追加序号），避免并行任务互相覆盖。"""
+    used = {}
+    dirs = []
+    for video in videos:
+        stem = os.path.splitext(os.path.basename(video))[0] or "video"
+        count = used.get(stem, 0) + 1
+        used[stem] = count
+        dirs.append(os.path.join(output_root, stem if count == 1 else f"{stem}_{count}"))
+    return dirs
+
+
+def video_args(args, out_dir, video_path):
+    """基于批处理参数生成单个视频的参数，所有输出都写到该视频自己的目录。"""
+    per_video = argparse.Namespace(**vars(args))
+    per_video.video_path = video_path
+    per_video.output_csv = os.path.join(out_dir, f"facial_expression_analysis.{args.results_format}")
+    per_video.plot_dir = os.path.join(out_dir, "charts")
+    per_video.output_pdf = os.path.join(out_dir, "emotion_report.pdf")
+    per_video.output_video = os.path.join(out_dir, "annotated.mp4")
+    if args.workers > 1:
+        # 已按视频并行时不再在工作进程内分段并行
+        per_video.segments = 1
+    return per_video
+
+
+def default_detector_factory(features="all", backend="torch"):
+    """默认的检测器工厂：按 --features / --backend 创建 Py-Feat Detector。"""
+    from .detector_profiles import build_detector
+    return build_detector(features, backend=backend)
+
+
+def init_worker(detector_factory, factory_args):
+    """工作进程初始化：切换到无界面的绘图后端，并加载一次检测器供该进程处理的所有视频复用。"""
+    global _DETECTOR
+    import matplotlib
+    matplotlib.use("Agg")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.info(f"工作进程 {os.getpid()}：加载检测器...")
+    _DETECTOR = detector_factory(*factory_args)
+
+
+def process_one(video_path, out_dir, args):
+    """处理单个视频：检测，并按 args.stages 生成图表、报告与带标注视频；返回写入汇总索引的一行。"""
+    from .process_video import process_video
+    from .face_cache import face_cache_from_args
+    from .main import run_plot, run_report, run_annotate
+
+    start = time.perf_counter()
+    per_video = video_args(args, out_dir, video_path)
+    entry = {"video_path": video_path, "output_dir": out_dir, "status": "ok", "error": "",
+             "worker_pid": os.getpid()}
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        df = process_video(
+            video_path=video_path,
+            process_sampling_rate=args.process_sampling_rate,
+            output_csv=per_video.output_csv,
+            multi_face=args.multi_face,
+            detector=_DETECTOR,
+            keep=args.keep,
+            features=args.features,
+            max_side=args.max_side,
+            decoder=args.decoder,
+            decode_threads=args.decode_threads,
+            keyframes_only=args.keyframes_only,
+            backend=args.backend,
+            face_cache=face_cache_from_args(args),
+            incremental=args.incremental,
+            start_frame=args.start_frame,
+            end_frame=args.end_frame,
+            start_time=args.start_time,
+            end_time=args.end_time,
+        )
+        entry.update(rows=len(df), faces=int(df["face_id"].nunique()), analysed_frames=int(df["frame"].nunique()),
+                     results=per_video.output_csv)
+        emotions = [c for c in EMOTIONS if c in df]
+        if emotions:
+            entry["dominant_emotion"] = df[emotions].mean().idxmax()
+        if "plot" in args.stages:
+            run_plot(df, per_video)
+        if "report" in args.stages:
+            run_report(df, per_video)
+            entry["report"] = per_video.output_pdf
+        if "annotate" in args.stages:
+            run_annotate(df, per_video)
+            entry["annotated_video"] = per_video.output_video
+    except Exception as e:
+        # 无法打开视频、没有检测到人脸（VideoAnalysisError）或其他错误：只记录失败，不影响其他视频
+        entry["status"] = "failed"
+        entry["error"] = str(e) or type(e).__name__
+    if entry["status"] == "failed":
+        logging.error(f"❌ 处理 {video_path} 失败：{entry['error']}")
+    entry["elapsed_s"] = round(time.perf_counter() - start, 2)
+    return entry
+
+
+def write_index(entries, output_root):
+    """写出汇总索引（index.csv 与 index.json），按输入顺序排列。"""
+    os.makedirs(output_root, exist_ok=True)
+    csv_path = os.path.join(output_root, "index.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(entries)
+    with open(os.path.join(output_root, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+    logging.info(f"汇总索引已保存至：{csv_path}")
+    return csv_path
+
+
+def run_batch(args, detector_factory=default_detector_factory, factory_args=None):
+    """
+    批量处理多个视频：视频分发到进程池中执行，每个工作进程只加载一次检测器；
+    每个视频的结果、图表和报告写入 output_root 下的独立目录，最后写出汇总索引。
+
+    detector_factory 必须可被 pickle（模块级函数或 functools.partial），
+    在每个工作进程中以 factory_args 调用一次。
+    """
+    videos = collect_videos(args.inputs)
+    if not videos:
+        raise ValueError(f"未找到任何视频：{args.inputs}")
+    if factory_args is None:
+        factory_args = (args.features, args.backend)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()] if isinstance(args.stages, str) else list(args.stages)
+    unknown = set(stages) - set(BATCH_STAGES)
+    if unknown:
+        raise ValueError(f"未知的阶段：{sorted(unknown)}，可选：{', '.join(BATCH_STAGES)}")
+    args = argparse.Namespace(**vars(args))
+    args.stages = stages
+
+    out_dirs = assign_output_dirs(videos, args.output_root)
+    workers = max(1, min(args.workers, len(videos)))
+    logging.info(f"共 {len(videos)} 个视频，使用 {workers} 个工作进程")
+    entries = [None] * len(videos)
+
+    if workers == 1:
+        # 单进程时直接在当前进程中处理，同样只加载一次检测器
+        init_worker(detector_factory, factory_args)
+        for i, (video, out_dir) in enumerate(zip(videos, out_dirs)):
+            entries[i] = process_one(video, out_dir, args)
+            logging.info(f"[{i + 1}/{len(videos)}] {video}：{entries[i]['status']}")
+    else:
+        # spawn 启动方式避免 fork 后共享 PyTorch / OpenCV 线程状态
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                                 initargs=(detector_factory, factory_args)) as pool:
+            futures = {pool.submit(process_one, video, out_dir, args): i
+                       for i, (video, out_dir) in enumerate(zip(videos, out_dirs))}
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                try:
+                    entries[i] = future.result()
+                except Exception as e:
+                    # 工作进程异常退出（如内存不足被杀）
+                    entries[i] = {"video_path": videos[i], "output_dir": out_dirs[i], "status": "failed", "error": str(e)}
+                logging.info(f"[{done}/{len(videos)}] {videos[i]}：{entries[i]['status']}")
+
+    write_index(entries, args.output_root)
+    failed = sum(e["status"] != "ok" for e in entries)
+    return entries, failed
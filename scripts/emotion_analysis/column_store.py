@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import shutil
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .profiling import stage
+
+# 列式结果存储：一个目录，每列一个 .npy（可内存映射），行按 (face_id, frame) 排序，index.json 记录每张人脸的行区间
+STORE_SUFFIX = ".colstore"
+INDEX_FILE = "index.json"
+STORE_VERSION = 1
+# 由 CSV / Parquet 转换时每次读入的行数
+CONVERT_CHUNK_ROWS = 200_000
+
+
+def is_column_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, INDEX_FILE))
+
+
+def _column_dtypes(df, columns=None):
+    """列的存储类型（与 compact_results 一致）：frame 为 int32，face_id 为 int16，其余数值列为 float32；非数值列不保存。"""
+    dtypes, skipped = {}, []
+    for col in (df.columns if columns is None else columns):
+        if col == "frame":
+            dtypes[col] = "int32"
+        elif col == "face_id":
+            dtypes[col] = "int16"
+        elif pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            dtypes[col] = "float32"
+        else:
+            skipped.append(col)
+    if skipped:
+        logging.info(f"列式存储跳过非数值列：{', '.join(skipped)}")
+    return dtypes, skipped
+
+
+class ColumnStoreWriter:
+    """
+    分块写入列式结果存储，内存中只保留当前块。
+
+    append() 把每块按人脸拆开，逐列追加到临时分片文件；close() 按人脸编号顺序把分片拼成每列一个 .npy，
+    同一人脸内的行按帧号排序（分片本身已按帧号递增时直接复制）。每次只有一张人脸的一列在内存中。
+    后续块中首次出现的数值列会加入列表，之前已写入的行在该列上补 NaN。
+
+    目标路径已是列式存储、以 .colstore 结尾或含有上次中断留下的 _parts 时先整个删除；
+    其他非空目录不会被覆盖（抛出 ValueError），避免误删无关文件。
+    """
+
+    def __init__(self, path):
+        if os.path.isdir(path):
+            if is_column_store(path) or path.rstrip("/\\").endswith(STORE_SUFFIX) \
+                    or os.path.isdir(os.path.join(path, "_parts")):
+                shutil.rmtree(path)
+            elif os.listdir(path):
+                raise ValueError(f"{path} 是非空目录且不是列式结果存储，拒绝覆盖")
+        elif os.path.exists(path):
+            raise ValueError(f"{path} 已存在且不是目录，无法写入列式结果存储")
+        self.path = path
+        self.parts = os.path.join(path, "_parts")
+        os.makedirs(self.parts)
+        self.dtypes = None
+        self.skipped = set()
+        self.counts = {}
+
+    def _part(self, face_id, i):
+        return os.path.join(self.parts, f"{face_id}_{i}.bin")
+
+    def append(self, df):
+        if df.empty:
+            return
+        if "face_id" not in df:
+            df = df.assign(face_id=1)
+        if self.dtypes is None:
+            self.dtypes, skipped = _column_dtypes(df)
+            self.skipped.update(skipped)
+        else:
+            self._extend_schema(df)
+        for face_id, part in df.groupby("face_id", sort=False):
+            face_id = int(face_id)
+            self.counts[face_id] = self.counts.get(face_id, 0) + len(part)
+            for i, (col, dtype) in enumerate(self.dtypes.items()):
+                if col in part:
+                    values = part[col].to_numpy(dtype=dtype, na_value=np.nan) if dtype == "float32" \
+                        else part[col].to_numpy().astype(dtype)
+                else:
+                    values = np.full(len(part), np.nan, dtype=dtype)
+                with open(self._part(face_id, i), "ab") as f:
+                    values.tofile(f)
+
+    def _extend_schema(self, df):
+        """加入本块中首次出现的列；已写入的各人脸行在新列上补 NaN，使各列分片长度一致。"""
+        new = [col for col in df.columns if col not in self.dtypes and col not in self.skipped]
+        if not new:
+            return
+        added, skipped = _column_dtypes(df, new)
+        self.skipped.update(skipped)
+        for col, dtype in added.items():
+            i = len(self.dtypes)
+            self.dtypes[col] = dtype
+            for face_id, count in self.counts.items():
+                with open(self._part(face_id, i), "ab") as f:
+                    np.full(count, np.nan, dtype=dtype).tofile(f)
+        if added:
+            logging.info(f"列式存储新增列（之前的行补 NaN）：{', '.join(added)}")
+
+    def close(self):
+        dtypes = self.dtypes or {"frame": "int32", "face_id": "int16"}
+        faces = sorted(self.counts)
+        index = {"version": STORE_VERSION, "rows": int(sum(self.counts.values())), "faces": {},
+                 "columns": {col: {"file": f"c{i}.npy", "dtype": dtype} for i, (col, dtype) in enumerate(dtypes.items())}}
+
+        # 每张人脸的行区间，以及帧号不递增时的排序
+        orders, start = {}, 0
+        frame_i = list(dtypes).index("frame")
+        for face_id in faces:
+            frames = np.fromfile(self._part(face_id, frame_i), dtype="int32")
+            order = None if np.all(np.diff(frames) >= 0) else np.argsort(frames, kind="stable")
+            if order is not None:
+                frames = frames[order]
+            orders[face_id] = order
+            index["faces"][str(face_id)] = [start, start + len(frames), int(frames[0]), int(frames[-1])]
+            start += len(frames)
+
+        for i, (col, spec) in enumerate(index["columns"].items()):
+            out = np.lib.format.open_memmap(os.path.join(self.path, spec["file"]), mode="w+",
+                                            dtype=spec["dtype"], shape=(index["rows"],))
+            for face_id in faces:
+                lo, hi = index["faces"][str(face_id)][:2]
+                block = np.fromfile(self._part(face_id, i), dtype=spec["dtype"])
+                out[lo:hi] = block if orders[face_id] is None else block[orders[face_id]]
+            out.flush()
+            del out
+
+        with open(os.path.join(self.path, INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        shutil.rmtree(self.parts)
+        logging.info(f"列式结果已保存到：{self.path}（{index['rows']} 行，{len(faces)} 张人脸，{len(dtypes)} 列）")
+
+
+def write_column_store(df, path):
+    writer = ColumnStoreWriter(path)
+    writer.append(df)
+    writer.close()
+
+
+def _read_chunks(src, chunk_rows):
+    if src.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(src).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(src, chunksize=chunk_rows)
+
+
+def convert_to_column_store(src, dst, chunk_rows=CONVERT_CHUNK_ROWS):
+    """把 detect 输出的 CSV / Parquet 分块转换为列式存储，无需把整个结果文件读入内存。"""
+    writer = ColumnStoreWriter(dst)
+    with stage("column_store_convert"):
+        for chunk in _read_chunks(src, chunk_rows):
+            writer.append(chunk)
+        writer.close()
+    return dst
+
+
+class ColumnStore:
+    """
+    以内存映射方式读取列式结果存储。
+
+    read() 只打开用到的列，并按 index.json 中每张人脸的行区间和帧号（二分查找）切出需要的片段，
+    未触及的列和行不会被读入内存；返回的 DataFrame 与 load_results 读取 CSV 的结果一样按 (frame, face_id) 排序。
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, INDEX_FILE), encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.path = path
+        self.columns = list(self.index["columns"])
+        self.faces = [int(face_id) for face_id in self.index["faces"]]
+        self._arrays = {}
+
+    def __len__(self):
+        return self.index["rows"]
+
+    def column(self, name):
+        if name not in self._arrays:
+            spec = self.index["columns"][name]
+            self._arrays[name] = np.load(os.path.join(self.path, spec["file"]), mmap_mode="r")
+        return self._arrays[name]
+
+    def face_rows(self, face_id, start_frame=None, end_frame=None):
+        """某张人脸在 [start_frame, end_frame] 内的行区间（slice）；帧号二分查找只会读到少量页。"""
+        lo, hi = self.index["faces"][str(face_id)][:2]
+        frames = self.column("frame")[lo:hi]
+        start = lo + int(np.searchsorted(frames, start_frame, side="left")) if start_frame is not None else lo
+        end = lo + int(np.searchsorted(frames, end_frame, side="right")) if end_frame is not None else hi
+        return slice(start, end)
+
+    def read(self, columns=None, start_frame=None, end_frame=None, faces=None):
+        """读出指定列、帧范围和人脸的结果；不存在的列忽略，frame 与 face_id 始终包含。"""
+        wanted = self.columns if columns is None else [c for c in columns if c in self.index["columns"]]
+        wanted = ["frame", "face_id"] + [c for c in wanted if c not in ("frame", "face_id")]
+        slices = [self.face_rows(f, start_frame, end_frame) for f in (self.faces if faces is None else faces)
+                  if str(f) in self.index["faces"]]
+
+        def gather(name):
+            array = self.column(name)
+            return np.concatenate([array[s] for s in slices]) if slices else np.empty(0, dtype=array.dtype)
+
+        data = {name: gather(name) for name in wanted}
+        if len(slices) > 1:
+            order = np.lexsort((data["face_id"], data["frame"]))
+            data = {name: values[order] for name, values in data.items()}
+        return pd.DataFrame(data)
+
+
+if __name__ == "__main__":
+    # 把已有的结果文件转换为列式存储：python -m scripts.emotion_analysis.column_store outputs/name.csv outputs/name.colstore
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if len(sys.argv) != 3:
+        sys.exit("用法：python -m scripts.emotion_analysis.column_store <结果文件 .csv/.parquet> <输出目录 .colstore>")
+    convert_to_column_store(sys.argv[1], sys.argv[2])
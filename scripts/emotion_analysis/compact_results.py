@@ -0,0 +1,72 @@
+import re
+import logging
+import numpy as np
+import pandas as pd
+
+EMOTIONS = ["anger", "disgust", "fear", "happiness", "sadness", "surprise", "neutral"]
+
+# Py-Feat 输出列分组；frame 和 face_id 始终保留
+KEEP_GROUPS = {
+    "emotions": lambda col: col in EMOTIONS,
+    "aus": lambda col: re.match(r"^AU\d+", col) is not None,
+    "landmarks": lambda col: re.match(r"^[xy]_\d+$", col) is not None,
+    "pose": lambda col: col in ("Pitch", "Roll", "Yaw"),
+    "box": lambda col: col.startswith("FaceRect") or col == "FaceScore",
+    "identity": lambda col: col.startswith("Identity"),
+}
+ALWAYS_KEEP = ("frame", "face_id")
+
+
+def parse_keep(value):
+    """
+    解析 --keep 参数（逗号分隔的列分组，或 all），返回分组名集合；all 返回 None。
+    """
+    if value is None:
+        return None
+    groups = {v.strip().lower() for v in str(value).split(",") if v.strip()}
+    if not groups or "all" in groups:
+        return None
+    unknown = groups - set(KEEP_GROUPS)
+    if unknown:
+        raise ValueError(f"未知的列分组：{sorted(unknown)}，可选：{sorted(KEEP_GROUPS)} 或 all")
+    return groups
+
+
+def keep_columns(columns, groups):
+    """按分组筛选需要保留的列（保持原顺序）；groups 为 None 时保留全部列。"""
+    if groups is None:
+        return list(columns)
+    matchers = [KEEP_GROUPS[g] for g in groups]
+    return [c for c in columns if c in ALWAYS_KEEP or any(m(c) for m in matchers)]
+
+
+def project_features(features, groups):
+    """
+    对单帧检测结果做列投影并将浮点列降为 float32，在缓存到结果列表之前调用，
+    以减少长视频、多人脸时的内存占用。
+    """
+    cols = keep_columns(features.columns, groups)
+    if len(cols) != len(features.columns):
+        features = features[cols]
+    float_cols = features.select_dtypes(include=["float64"]).columns
+    if len(float_cols):
+        features = features.astype({c: np.float32 for c in float_cols})
+    return features
+
+
+def compact_dtypes(df):
+    """
+    合并后的整体类型压缩：frame / face_id 转为紧凑整数，浮点列转为 float32，
+    字符串列转为 category。
+    """
+    df = df.copy()
+    for col, dtype in (("frame", np.int32), ("face_id", np.int16)):
+        if col in df.columns and df[col].notna().all():
+            df[col] = df[col].astype(dtype)
+    float_cols = df.select_dtypes(include=["float64"]).columns
+    if len(float_cols):
+        df = df.astype({c: np.float32 for c in float_cols})
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        df[col] = df[col].astype("category")
+    logging.info(f"检测结果：{len(df)} 行 × {df.shape[1]} 列，内存约 {df.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MB")
+    return df
@@ -0,0 +1,72 @@
+import inspect
+import logging
+
+# 每类输出依赖的 Py-Feat 子模型；人脸检测与关键点始终启用（Py-Feat 用关键点做人脸对齐与裁剪）
+FEATURE_MODELS = {
+    "emotion": {"emotion_model"},
+    "aus": {"au_model"},
+    "landmarks": set(),
+    "pose": {"facepose_model"},
+    "identity": {"identity_model"},
+}
+REQUIRED_MODELS = {"face_model", "landmark_model"}
+OPTIONAL_MODELS = ("au_model", "emotion_model", "facepose_model", "identity_model")
+
+
+def parse_features(value):
+    """
+    解析 --features 参数（逗号分隔的输出类别，或 all），返回类别集合；all 返回 None。
+    """
+    if value is None:
+        return None
+    features = {v.strip().lower() for v in str(value).split(",") if v.strip()}
+    if not features or "all" in features:
+        return None
+    unknown = features - set(FEATURE_MODELS)
+    if unknown:
+        raise ValueError(f"未知的分析类别：{sorted(unknown)}，可选：{sorted(FEATURE_MODELS)} 或 all")
+    return features
+
+
+def enabled_models(features):
+    """返回给定分析类别需要运行的子模型集合；features 为 None 时返回全部子模型。"""
+    if features is None:
+        return REQUIRED_MODELS | set(OPTIONAL_MODELS)
+    needed = set(REQUIRED_MODELS)
+    for feature in features:
+        needed |= FEATURE_MODELS[feature]
+    return needed
+
+
+def detector_kwargs(features, supported=None):
+    """
+    生成 Detector 的构造参数：不需要的子模型设为 None，从而跳过其推理。
+    supported 为 Detector 构造函数接受的参数名集合，不支持的参数不会传入。
+    """
+    needed = enabled_models(parse_features(features))
+    kwargs = {}
+    for model in OPTIONAL_MODELS:
+        if model not in needed and (supported is None or model in supported):
+            kwargs[model] = None
+    return kwargs
+
+
+def build_detector(features="all", backend="torch", onnx_dir="outputs/onnx", **kwargs):
+    """
+    按分析类别创建 Py-Feat Detector，例如 features="emotion" 时跳过 AU、头部姿态和身份模型。
+    backend 为 onnx / onnx-int8 时，人脸检测、关键点与情绪子模型改由 ONNX Runtime 推理（模型缓存于 onnx_dir）。
+    其余关键字参数（如 device）原样传给 Detector，并优先于按类别生成的参数。
+    """
+    from feat import Detector
+
+    supported = set(inspect.signature(Detector.__init__).parameters)
+    detector_args = detector_kwargs(features, supported)
+    detector_args.update(kwargs)
+    skipped = [name for name, value in detector_args.items() if value is None]
+    if skipped:
+        logging.info(f"分析类别 {features}：跳过子模型 {', '.join(skipped)}")
+    detector = Detector(**detector_args)
+    if backend != "torch":
+        from .onnx_backend import enable_onnx
+        enable_onnx(detector, backend=backend, cache_dir=onnx_dir)
+    return detector
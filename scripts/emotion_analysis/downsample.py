@@ -0,0 +1,141 @@
+import logging
+import numpy as np
+
+
+def points_budget(max_points=None, pixel_width=None):
+    """
+    计算下采样后的目标点数。
+
+    - pixel_width: 图表绘图区的像素宽度；每个像素列最多能看到两个折线顶点，因此预算为 2 × 像素宽度
+    - max_points: 直接指定的最大点数
+    两者同时给出时取较小值；都未给出时返回 None（不下采样）。
+    """
+    budgets = []
+    if max_points:
+        budgets.append(int(max_points))
+    if pixel_width:
+        budgets.append(2 * int(pixel_width))
+    return min(budgets) if budgets else None
+
+
+def lttb_select(x, Y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 下采样，返回形状为 (n_out, k) 的行号矩阵，
+    第 j 列为第 j 条曲线保留的行（升序）。
+
+    x 为横轴（单调递增），Y 为 (n, k) 的多条曲线；每个桶内的计算对所有点和所有曲线向量化，
+    只对桶做一次 Python 循环。调用方需保证 3 <= n_out < n。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n = len(x)
+
+    Y = np.nan_to_num(Y)
+    n_cols = Y.shape[1]
+    cols = np.arange(n_cols)
+    # 首尾两点固定保留，中间 n_out - 2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty((n_out, n_cols), dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = np.zeros(n_cols, dtype=np.int64)
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        next_hi = edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = Y[hi:next_hi].mean(axis=0)
+
+        px = x[prev]
+        py = Y[prev, cols]
+        area = np.abs(
+            (px - avg_x)[None, :] * (Y[lo:hi] - py[None, :])
+            - (px[None, :] - x[lo:hi, None]) * (avg_y - py)[None, :]
+        )
+        prev = lo + np.argmax(area, axis=0)
+        selected[b + 1] = prev
+
+    return selected
+
+
+def minmax_select(Y, n_buckets):
+    """
+    按桶保留每条曲线的最小值与最大值所在行（含首尾两点），
+    返回形状为 (2 × n_buckets + 2, k) 的行号矩阵，每列升序。调用方需保证 2 × n_buckets < n。
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n = len(Y)
+
+    size = int(np.ceil(n / n_buckets))
+    n_pad = size * n_buckets - n
+    padded = np.vstack([Y, np.full((n_pad, Y.shape[1]), np.nan)]) if n_pad else Y
+    blocks = padded.reshape(n_buckets, size, Y.shape[1])
+    # 全 NaN 的桶（仅由填充组成或原数据缺失）退化为桶首行
+    filled_max = np.where(np.isnan(blocks), -np.inf, blocks)
+    filled_min = np.where(np.isnan(blocks), np.inf, blocks)
+    offsets = (np.arange(n_buckets) * size)[:, None]
+    n_cols = Y.shape[1]
+    idx = np.vstack([
+        offsets + filled_max.argmax(axis=1),
+        offsets + filled_min.argmin(axis=1),
+        np.zeros((1, n_cols), dtype=np.int64),
+        np.full((1, n_cols), n - 1, dtype=np.int64),
+    ])
+    # 填充行不会被选中（其值为 ±inf 的反方向），但全 NaN 桶可能落在填充区，截断到末行
+    return np.sort(np.minimum(idx, n - 1), axis=0)
+
+
+def downsample_columns(x, Y, max_points=None, pixel_width=None, method="lttb"):
+    """
+    对每条曲线分别做保形下采样，返回每列保留的行号数组列表；
+    数据量未超出预算时返回 None（表示无需下采样）。
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n = len(Y)
+    budget = points_budget(max_points, pixel_width)
+    if budget is None or n <= budget:
+        return None
+
+    if method == "minmax":
+        if budget < 4:
+            return None
+        selected = minmax_select(Y, (budget - 2) // 2)
+    else:
+        if method != "lttb":
+            logging.warning(f"未知的下采样方法 {method}，使用 lttb")
+        if budget < 3:
+            return None
+        selected = lttb_select(x, Y, budget)
+    return [np.unique(selected[:, j]) for j in range(Y.shape[1])]
+
+
+def downsample_df(df, x_col, value_cols, max_points=None, pixel_width=None, method="lttb"):
+    """
+    对 DataFrame 做保形下采样，保留情绪尖峰：各曲线分别选点后取行的并集，
+    适用于多条曲线必须共用同一组行的场景。
+
+    参数：
+    - df: 数据（单张人脸）
+    - x_col: 横轴列名（如 "frame" 或 "second"）
+    - value_cols: 需要保形的曲线列（情绪列）
+    - max_points / pixel_width: 点数预算，见 points_budget
+    - method: "lttb"（默认）或 "minmax"
+    """
+    if len(df) <= (points_budget(max_points, pixel_width) or len(df)):
+        return df
+
+    df = df.sort_values(x_col, kind="stable")
+    per_column = downsample_columns(df[x_col].to_numpy(), df[value_cols].to_numpy(dtype=np.float64),
+                                    max_points=max_points, pixel_width=pixel_width, method=method)
+    if per_column is None:
+        return df
+    idx = np.unique(np.concatenate(per_column))
+
+    logging.info(f"📉 {method} 下采样：{len(df)} → {len(idx)} 行")
+    return df.iloc[idx].reset_index(drop=True)
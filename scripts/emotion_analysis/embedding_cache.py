@@ -0,0 +1,234 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from sklearn.manifold import TSNE
+
+from .profiling import stage
+
+# 进程内嵌入结果缓存（LRU），键为输入矩阵与降维参数的哈希
+_EMBEDDING_CACHE = OrderedDict()
+_EMBEDDING_CACHE_SIZE = 64
+
+# 已拟合的降维模型（用于增量投影），键为调用方给出的 model_key
+_FITTED_REDUCERS = {}
+
+# 磁盘缓存目录的总大小上限（字节），超出后按最近使用时间删除最旧的结果与模型文件
+DISK_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# 磁盘缓存写出的文件名：降维结果 <sha1>.npy，已拟合模型 model_<sha1>.npz；淘汰时只删除这两类文件
+_CACHE_FILE = re.compile(r"^(model_)?[0-9a-f]{40}\.(npy|npz)$")
+
+# t-SNE 固定迭代次数，保证同样输入下耗时与结果可预期
+TSNE_MAX_ITER = 1000
+# t-SNE 增量投影时参与插值的近邻数量
+TSNE_PROJECT_NEIGHBORS = 10
+
+
+def make_cache_key(X, params):
+    """根据输入矩阵内容和降维参数计算缓存键（sha1 十六进制串）。"""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    h = hashlib.sha1()
+    h.update(str(X.shape).encode("utf-8"))
+    h.update(X.tobytes())
+    h.update(repr(sorted(params.items())).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _build_tsne(perplexity):
+    """构建 PCA 初始化、固定迭代次数的 t-SNE，兼容新旧版本 scikit-learn 的参数名。"""
+    try:
+        return TSNE(n_components=2, perplexity=perplexity, init="pca",
+                    max_iter=TSNE_MAX_ITER, random_state=42)
+    except TypeError:
+        # scikit-learn < 1.5 使用 n_iter
+        return TSNE(n_components=2, perplexity=perplexity, init="pca",
+                    n_iter=TSNE_MAX_ITER, random_state=42)
+
+
+def _build_reducer(method, params):
+    if method == "umap":
+        from umap import UMAP
+        return UMAP(n_components=2, n_neighbors=params["n_neighbors"], random_state=42)
+    return _build_tsne(params["perplexity"])
+
+
+def _project_tsne(X_fit, Y_fit, X_new):
+    """
+    t-SNE 本身不支持 transform：按原始情绪空间中的近邻做反距离加权插值，
+    将新样本放入已有嵌入中（与训练样本完全相同的点直接取其坐标）。
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    k = min(TSNE_PROJECT_NEIGHBORS, len(X_fit))
+    nn = NearestNeighbors(n_neighbors=k).fit(X_fit)
+    dist, idx = nn.kneighbors(X_new)
+    weights = 1.0 / np.maximum(dist, 1e-12)
+    exact = dist[:, 0] <= 1e-12
+    weights[exact] = 0.0
+    weights[exact, 0] = 1.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.einsum("nk,nkd->nd", weights, Y_fit[idx])
+
+
+def _disk_path(cache_dir, name, ext):
+    return os.path.join(cache_dir, f"{name}.{ext}")
+
+
+def _model_path(model_key, cache_dir):
+    digest = hashlib.sha1(repr(model_key).encode("utf-8")).hexdigest()
+    return _disk_path(cache_dir, f"model_{digest}", "npz")
+
+
+def _touch(path):
+    """命中时更新修改时间，淘汰按修改时间近似最近使用顺序。"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _evict_disk(cache_dir, max_bytes=DISK_CACHE_MAX_BYTES):
+    """磁盘缓存总大小超过 max_bytes 时，按修改时间从旧到新删除本模块写出的文件（其他文件不动）。"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if _CACHE_FILE.match(name):
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    logging.info(f"降维缓存超过 {max_bytes // 2 ** 20} MB，已删除 {removed} 个最旧的文件。")
+
+
+def _remember(key, X_reduced):
+    _EMBEDDING_CACHE[key] = X_reduced
+    _EMBEDDING_CACHE.move_to_end(key)
+    while len(_EMBEDDING_CACHE) > _EMBEDDING_CACHE_SIZE:
+        _EMBEDDING_CACHE.popitem(last=False)
+
+
+def _load_model(model_key, cache_dir):
+    """
+    读取已拟合的参照嵌入。磁盘上只保存数组（拟合样本 X_fit、嵌入 Y_fit）与参数，以 allow_pickle=False 读取，
+    不反序列化任何对象；UMAP 模型按保存的参数在 X_fit 上重新拟合（固定 random_state），再用于 transform。
+    """
+    if model_key in _FITTED_REDUCERS:
+        return _FITTED_REDUCERS[model_key]
+    if cache_dir:
+        path = _model_path(model_key, cache_dir)
+        if os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    model = {"fingerprint": str(data["fingerprint"]), "method": str(data["method"]),
+                             "params": json.loads(str(data["params"])),
+                             "X_fit": data["X_fit"], "Y_fit": data["Y_fit"]}
+                if model["method"] == "umap":
+                    with stage("umap_refit"):
+                        model["reducer"] = _build_reducer("umap", model["params"]).fit(model["X_fit"])
+                _touch(path)
+                _FITTED_REDUCERS[model_key] = model
+                return model
+            except Exception as e:
+                logging.warning(f"读取降维模型缓存失败，将重新拟合：{e}")
+    return None
+
+
+def _save_model(model_key, model, cache_dir):
+    """
+    记录 model_key 的参照嵌入。已有参照模型时不覆盖：增量投影始终落在同一个坐标系中，
+    之后的非增量拟合只缓存其降维结果，不替换参照模型（需要重新确定参照时删除缓存目录中的模型文件）。
+    """
+    if _load_model(model_key, cache_dir) is not None:
+        logging.info("已存在该数据来源 / 人脸 / 参数的参照嵌入，保留原模型，不覆盖。")
+        return
+    _FITTED_REDUCERS[model_key] = model
+    if cache_dir:
+        path = _model_path(model_key, cache_dir)
+        try:
+            with open(path, "wb") as f:
+                np.savez(f, fingerprint=model["fingerprint"], method=model["method"],
+                         params=json.dumps(model["params"], sort_keys=True),
+                         X_fit=model["X_fit"], Y_fit=model["Y_fit"])
+        except Exception as e:
+            logging.warning(f"降维模型缓存写入失败：{e}")
+
+
+def reduce_embedding(X, method, params, model_key=None, incremental=False, cache_dir=None):
+    """
+    计算二维嵌入，并按输入矩阵与参数的哈希缓存结果。
+
+    参数：
+    - X: 待降维的二维数组（样本 × 情绪）
+    - method: "tsne" 或 "umap"
+    - params: 降维参数字典（tsne 需 perplexity，umap 需 n_neighbors）
+    - model_key: 已拟合模型的标识（数据来源 + 人脸编号 + 降维方法与参数），用于增量投影；
+                 同一 model_key 只保存第一次拟合的模型作为参照，不会被之后的拟合覆盖
+    - incremental: 若为 True 且 model_key 已有拟合模型，则将新样本投影到已有嵌入中而不重新拟合
+    - cache_dir: 磁盘缓存目录；为 None 时只使用进程内缓存。目录中只写入 .npy / .npz 数组（不使用 pickle），
+                 总大小超过 DISK_CACHE_MAX_BYTES 时按最近使用时间淘汰最旧的文件（参照模型被淘汰后会重新拟合）
+    """
+    X = np.asarray(X, dtype=np.float64)
+    model = _load_model(model_key, cache_dir) if (incremental and model_key is not None) else None
+
+    key_params = dict(params, method=method)
+    if model is not None:
+        key_params["projected_onto"] = model["fingerprint"]
+    key = make_cache_key(X, key_params)
+
+    if key in _EMBEDDING_CACHE:
+        logging.info("♻️ 命中降维结果缓存（内存），跳过拟合。")
+        _EMBEDDING_CACHE.move_to_end(key)
+        return _EMBEDDING_CACHE[key]
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = _disk_path(cache_dir, key, "npy")
+        if os.path.exists(path):
+            logging.info(f"♻️ 命中降维结果缓存（磁盘）：{path}")
+            X_reduced = np.load(path, allow_pickle=False)
+            _touch(path)
+            _remember(key, X_reduced)
+            return X_reduced
+
+    if model is not None:
+        logging.info(f"➕ 使用已拟合的 {method} 嵌入投影新样本（{len(X)} 条），不重新拟合。")
+        with stage(f"{method}_project"):
+            if method == "umap":
+                X_reduced = model["reducer"].transform(X)
+            else:
+                X_reduced = _project_tsne(model["X_fit"], model["Y_fit"], X)
+    else:
+        reducer = _build_reducer(method, params)
+        with stage(f"{method}_fit"):
+            X_reduced = reducer.fit_transform(X)
+        if model_key is not None:
+            fitted = {"fingerprint": make_cache_key(X, dict(params, method=method)), "method": method,
+                      "params": dict(params), "X_fit": X, "Y_fit": np.asarray(X_reduced)}
+            if method == "umap":
+                fitted["reducer"] = reducer
+            _save_model(model_key, fitted, cache_dir)
+
+    X_reduced = np.asarray(X_reduced)
+    _remember(key, X_reduced)
+    if cache_dir:
+        np.save(_disk_path(cache_dir, key, "npy"), X_reduced)
+        _evict_disk(cache_dir)
+    return X_reduced
@@ -0,0 +1,230 @@
+import logging
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from .frame_resize import PIXEL_COLUMNS
+
+# 指纹边长：8 时为 64 位差值哈希（dHash）
+FINGERPRINT_SIZE = 8
+
+
+def crop_fingerprint(image, box, size=FINGERPRINT_SIZE):
+    """
+    人脸裁剪区域的感知哈希（dHash）：灰度缩小到 (size+1)×size 后比较相邻像素的明暗，得到 size*size 位整数。
+    对亮度整体变化、压缩噪声不敏感，表情或姿态变化会改变若干位。box 为 (x, y, w, h) 像素坐标，裁剪为空时返回 None。
+    """
+    x, y, w, h = (float(v) for v in box)
+    if not np.isfinite([x, y, w, h]).all():
+        return None
+    height, width = image.shape[:2]
+    x0, y0 = max(0, int(x)), max(0, int(y))
+    x1, y1 = min(width, int(round(x + w))), min(height, int(round(y + h)))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    crop = image[y0:y1, x0:x1]
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(crop, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FaceResultCache:
+    """
+    以人脸裁剪指纹为键的 LRU 结果缓存：指纹与某个条目的汉明距离不超过 max_distance 时视为同一张（几乎未变的）脸，
+    直接复用该条目保存的模型输出。
+
+    max_entries: 最多保留的条目数，超出时淘汰最久未使用的条目。
+    max_distance: 判定命中的最大汉明距离（64 位指纹中不同的位数）。
+    max_age: 条目从模型计算出来起最多被复用多少个时钟（调用方的计时单位，如已分析帧数）；
+             超过后视为过期并删除，强制重新推理，避免细微表情变化长期累积而被忽略。
+    """
+
+    def __init__(self, max_entries=256, max_distance=5, max_age=30):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self._entries = OrderedDict()  # 指纹 -> (结果, 计算时的时钟)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def _nearest(self, fingerprint):
+        if fingerprint in self._entries:
+            return fingerprint, 0
+        best, best_distance = None, self.max_distance + 1
+        for key in self._entries:
+            distance = hamming(key, fingerprint)
+            if distance < best_distance:
+                best, best_distance = key, distance
+        return best, best_distance
+
+    def lookup(self, fingerprint, now):
+        """查找相近的条目，命中时返回保存的结果，否则返回 None（未命中或已过期）。"""
+        if fingerprint is None:
+            self.misses += 1
+            return None
+        key, distance = self._nearest(fingerprint)
+        if key is None or distance > self.max_distance:
+            self.misses += 1
+            return None
+        value, created = self._entries[key]
+        if self.max_age is not None and now - created > self.max_age:
+            del self._entries[key]
+            self.stale += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def store(self, fingerprint, value, now):
+        if fingerprint is None:
+            return
+        self._entries[fingerprint] = (value, now)
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def face_cache_from_args(args):
+    """按命令行参数创建人脸结果缓存；未开启 --face_cache 时返回 None。"""
+    if not getattr(args, "face_cache", False):
+        return None
+    return FaceResultCache(max_entries=args.face_cache_size, max_distance=args.face_cache_distance,
+                           max_age=args.face_cache_max_age)
+
+
+class CachedDetector:
+    """
+    包装检测器（Py-Feat Detector 或同接口对象），在每个视频流上一次检测到的人脸位置裁剪当前帧并计算指纹：
+    所有人脸都命中缓存时直接返回缓存的检测结果（情绪、AU、关键点等），跳过整次模型推理；
+    否则正常检测，并把每张人脸的结果按其指纹写入缓存。
+
+    新出现的人脸在缓存命中期间不会被发现，最晚在条目过期（max_age 帧）后的下一次检测中出现。
+    时钟为已分析的帧数（所有视频流合计）。
+    """
+
+    def __init__(self, detector, cache):
+        self.detector = detector
+        self.cache = cache
+        self.clock = 0
+        self.skipped = 0   # 完全由缓存给出结果、跳过推理的帧数
+        self.detected = 0  # 实际运行模型的帧数
+        self._boxes = {}  # 视频流 -> 上一次模型检测到的人脸框列表
+
+    def __getattr__(self, name):
+        return getattr(self.detector, name)
+
+    def _fingerprints(self, image, boxes):
+        return [crop_fingerprint(image, box) for box in boxes]
+
+    def _from_cache(self, stream, image):
+        """当前帧在上次人脸位置的裁剪全部命中时返回缓存的结果行，否则返回 None。"""
+        boxes = self._boxes.get(stream)
+        if not boxes:
+            if boxes is not None:
+                self.cache.misses += 1
+            return None
+        rows = []
+        for fingerprint in self._fingerprints(image, boxes):
+            row = self.cache.lookup(fingerprint, self.clock)
+            if row is None:
+                return None
+            rows.append(row)
+        return rows
+
+    def _remember(self, stream, image, features):
+        boxes = []
+        if isinstance(features, pd.DataFrame) and all(c in features for c in PIXEL_COLUMNS):
+            for i in range(len(features)):
+                row = features.iloc[[i]]
+                box = row[list(PIXEL_COLUMNS)].to_numpy(np.float64)[0]
+                fingerprint = crop_fingerprint(image, box)
+                if fingerprint is None:
+                    continue
+                self.cache.store(fingerprint, pd.DataFrame(row).reset_index(drop=True), self.clock)
+                boxes.append(box)
+        self._boxes[stream] = boxes
+
+    def detect_image(self, inputs, streams=None, **kwargs):
+        """
+        与 detector.detect_image 相同的调用方式；streams 为各输入所属的视频流（默认单个输入为同一个流，
+        列表输入按位置区分），用于找到该流上一次的人脸位置。
+        """
+        single = isinstance(inputs, str)
+        paths = [inputs] if single else list(inputs)
+        if streams is None:
+            streams = [None] if single else list(range(len(paths)))
+
+        cached, images, misses = {}, {}, []
+        for path, stream in zip(paths, streams):
+            self.clock += 1
+            image = cv2.imread(path)
+            images[path] = image
+            rows = self._from_cache(stream, image) if image is not None else None
+            if rows is None:
+                misses.append((path, stream))
+            else:
+                result = pd.concat(rows, ignore_index=True)
+                if "input" in result:
+                    result["input"] = path
+                cached[path] = result
+        self.skipped += len(cached)
+        self.detected += len(misses)
+
+        detected = {}
+        if misses:
+            miss_paths = [p for p, _ in misses]
+            if single:
+                detected[inputs] = self.detector.detect_image(inputs, **kwargs)
+            else:
+                if "batch_size" in kwargs:
+                    kwargs["batch_size"] = len(miss_paths)
+                result = self.detector.detect_image(miss_paths, **kwargs)
+                for path in miss_paths:
+                    detected[path] = (result[result["input"] == path].reset_index(drop=True)
+                                      if "input" in result else result)
+            for path, stream in misses:
+                if images[path] is not None:
+                    self._remember(stream, images[path], detected[path])
+
+        if single:
+            return cached.get(inputs, detected.get(inputs))
+        parts = [cached[p] if p in cached else detected[p] for p in paths]
+        parts = [p for p in parts if isinstance(p, pd.DataFrame) and not p.empty]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    def stats(self):
+        frames = self.skipped + self.detected
+        return {**self.cache.stats(), "skipped_frames": self.skipped, "detected_frames": self.detected,
+                "skip_rate": round(self.skipped / frames, 4) if frames else None}
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"人脸结果缓存：{stats['skipped_frames']}/{stats['skipped_frames'] + stats['detected_frames']} 帧跳过推理，"
+                     f"人脸命中率 {stats['hit_rate']}（命中 {stats['hits']}，未命中 {stats['misses']}，过期 {stats['stale']}）")
+        return stats
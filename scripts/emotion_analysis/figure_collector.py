@@ -0,0 +1,57 @@
+import io
+import logging
+import matplotlib.pyplot as plt
+from .profiling import stage
+
+
+class FigureCollector:
+    """
+    在内存中收集绘图结果，供 PDF 报告直接嵌入，不再经过临时目录。
+
+    每个绘图函数在传入 figures=FigureCollector(...) 时，会把当前图表按指定格式渲染进
+    BytesIO 并关闭图表；generate_report 再按图表名称取出各人脸的缓冲区。
+    每次生成报告使用独立的收集器，多个任务并发运行时互不干扰。
+    """
+
+    FORMATS = ("png", "jpeg", "svg")
+
+    def __init__(self, fmt="png", dpi=None, jpeg_quality=85):
+        """
+        :param fmt: 图像格式，"png"（默认）、"jpeg"（有损压缩）或 "svg"（矢量，需要 svglib）
+        :param dpi: 位图格式的渲染分辨率（默认沿用 matplotlib 的 savefig.dpi）
+        :param jpeg_quality: JPEG 压缩质量（1-95）
+        """
+        if fmt not in self.FORMATS:
+            logging.warning(f"不支持的报告图像格式 {fmt}，使用 png。")
+            fmt = "png"
+        if fmt == "svg":
+            try:
+                import svglib  # noqa: F401
+            except ImportError:
+                logging.warning("未安装 svglib，无法在 PDF 中嵌入矢量图，改用 png。")
+                fmt = "png"
+        self.fmt = fmt
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self._figures = {}
+
+    def add(self, name, face_id=None, fig=None):
+        """将图表（默认当前图表）渲染到内存缓冲区并关闭它。"""
+        fig = fig if fig is not None else plt.gcf()
+        buf = io.BytesIO()
+        kwargs = {"format": self.fmt, "bbox_inches": "tight"}
+        if self.fmt != "svg" and self.dpi:
+            kwargs["dpi"] = self.dpi
+        if self.fmt == "jpeg":
+            kwargs["pil_kwargs"] = {"quality": self.jpeg_quality}
+        with stage("render_figure"):
+            fig.savefig(buf, **kwargs)
+        plt.close(fig)
+        buf.seek(0)
+        self._figures.setdefault(name, []).append((face_id, buf))
+        logging.info(f"✅ 图表已渲染到内存：{name}" + (f"（Face {face_id}）" if face_id else ""))
+
+    def get(self, name):
+        """返回 [(face_id, BytesIO), ...]，多人脸时按人脸编号升序。"""
+        items = self._figures.get(name, [])
+        return sorted(items, key=lambda item: int(item[0]) if item[0] else 0)
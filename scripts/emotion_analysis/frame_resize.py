@@ -0,0 +1,43 @@
+import re
+import cv2
+
+# 检测结果中以像素为单位的列：人脸框与关键点；头部姿态为角度、情绪/AU 为概率，与分辨率无关
+PIXEL_COLUMNS = ("FaceRectX", "FaceRectY", "FaceRectWidth", "FaceRectHeight")
+LANDMARK_PATTERN = re.compile(r"^[xy]_\d+$")
+
+
+def scaled_size(width, height, max_side):
+    """长边不超过 max_side 时的输出尺寸，返回 ((宽, 高), 缩放比例)。"""
+    longest = max(width, height)
+    if not max_side or longest <= max_side:
+        return (width, height), 1.0
+    scale = max_side / longest
+    return (max(1, round(width * scale)), max(1, round(height * scale))), scale
+
+
+def downscale_frame(frame, max_side):
+    """
+    将帧的长边缩放到不超过 max_side，返回 (缩放后的帧, 缩放比例)。
+    max_side 为空或帧本身足够小时原样返回，比例为 1.0。
+    """
+    h, w = frame.shape[:2]
+    size, scale = scaled_size(w, h, max_side)
+    if scale == 1.0:
+        return frame, 1.0
+    # INTER_AREA 缩小时抗混叠效果最好
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), scale
+
+
+def pixel_columns(columns):
+    """返回需要随分辨率换算的列（人脸框与关键点坐标）。"""
+    return [c for c in columns if c in PIXEL_COLUMNS or LANDMARK_PATTERN.match(c)]
+
+
+def rescale_features(features, scale):
+    """将缩放后帧上的检测结果换算回原始分辨率的像素坐标。"""
+    if scale == 1.0:
+        return features
+    cols = pixel_columns(features.columns)
+    if cols:
+        features[cols] = features[cols] / scale
+    return features
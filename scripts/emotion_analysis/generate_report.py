@@ -1,5 +1,3 @@
-import os
-import shutil
 import logging
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
@@ -13,7 +11,10 @@ from .plot_emotion_bar import plot_emotion_bar
 from .plot_emotion_heatmap import plot_emotion_heatmap
 from .plot_emotion_radar import plot_emotion_radar
 from .plot_emotion_clusters import plot_emotion_clusters
+from .figure_collector import FigureCollector
+from .profiling import stage, profiled
 from .parse_arguments import parse_arguments
+from .results_io import results_source
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,16 +22,22 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+# 报告使用的字体；SimHei 注册失败时退回 reportlab 内置字体，保证报告仍能生成（中文将无法显示）
+REPORT_FONT = "Helvetica"
+
 def register_chinese_font():
+    global REPORT_FONT
     font_path = "simhei.ttf"
     try:
         pdfmetrics.registerFont(TTFont('SimHei', font_path))
+        REPORT_FONT = "SimHei"
         logging.info("中文字体 SimHei 注册成功")
     except Exception as e:
         logging.error(f"中文字体注册失败: {e}")
 
 register_chinese_font()
 
+@profiled()
 def generate_report(df, args, output_path="outputs/emotion_report.pdf"):
     logging.info("开始生成情绪分析报告 PDF...")
 
@@ -41,63 +48,64 @@ def generate_report(df, args, output_path="outputs/emotion_report.pdf"):
     else:
         fps = 30
 
-    temp_dir = "temp_report_images"
-    os.makedirs(temp_dir, exist_ok=True)
+    figures = FigureCollector(fmt=getattr(args, "report_image_format", "png"),
+                              jpeg_quality=getattr(args, "report_jpeg_quality", 85))
 
-    plot_emotion_line(df=df, fps=fps, save_path=os.path.join(temp_dir, "emotion_line.png"))
-    plot_emotion_pie(df=df, start_frame=args.start_frame, end_frame=args.end_frame, save_path=os.path.join(temp_dir, "emotion_pie.png"))
-    plot_emotion_bar(df=df, start_frame=args.start_frame, end_frame=args.end_frame, save_path=os.path.join(temp_dir, "emotion_bar.png"))
-    plot_emotion_heatmap(df=df, fps=fps, save_path=os.path.join(temp_dir, "emotion_heatmap.png"))
-    plot_emotion_radar(df=df, fps=fps, start_frame=args.start_frame, end_frame=args.end_frame, save_path=os.path.join(temp_dir, "emotion_radar.png"))
-    plot_emotion_clusters(df=df, fps=fps, method=args.method, perplexity=args.perplexity, n_neighbors=args.n_neighbors, cluster_sampling_rate=args.cluster_sampling_rate, start_frame=args.start_frame, end_frame=args.end_frame, save_path=os.path.join(temp_dir, "emotion_clusters.png"))
+    plot_emotion_line(df=df, fps=fps, figures=figures)
+    plot_emotion_pie(df=df, start_frame=args.start_frame, end_frame=args.end_frame, figures=figures)
+    plot_emotion_bar(df=df, start_frame=args.start_frame, end_frame=args.end_frame, figures=figures)
+    plot_emotion_heatmap(df=df, fps=fps, figures=figures,
+                         n_bins=getattr(args, "heatmap_bins", None), bin_agg=getattr(args, "heatmap_agg", "mean"))
+    plot_emotion_radar(df=df, fps=fps, start_frame=args.start_frame, end_frame=args.end_frame, figures=figures)
+    plot_emotion_clusters(df=df, fps=fps, method=args.method, perplexity=args.perplexity, n_neighbors=args.n_neighbors, cluster_sampling_rate=args.cluster_sampling_rate, start_frame=args.start_frame, end_frame=args.end_frame, figures=figures,
+                          cache_dir=getattr(args, "embedding_cache_dir", None), incremental=getattr(args, "incremental_embedding", False),
+                          source=results_source(args))
 
     c = canvas.Canvas(output_path, pagesize=A4)
     width, height = A4
 
     def draw_title_page():
-        c.setFont("SimHei", 24)
+        c.setFont(REPORT_FONT, 24)
         c.drawCentredString(width / 2, height - 100, "面部表情情绪分析报告")
-        c.setFont("SimHei", 12)
+        c.setFont(REPORT_FONT, 12)
         c.drawCentredString(width / 2, height - 140, "基于 Py-Feat 分析生成")
         c.showPage()
 
-    def draw_image_page(image_path, title):
-        c.setFont("SimHei", 16)
+    def draw_image_page(buf, title):
+        c.setFont(REPORT_FONT, 16)
         c.drawCentredString(width / 2, height - 50, title)
-        img = ImageReader(image_path)
-        c.drawImage(img, 50, 100, width=width - 100, height=height - 150, preserveAspectRatio=True, mask='auto')
+        box_w, box_h = width - 100, height - 150
+        if figures.fmt == "svg":
+            # 矢量图：按比例缩放到绘图区并居中
+            from svglib.svglib import svg2rlg
+            from reportlab.graphics import renderPDF
+            drawing = svg2rlg(buf)
+            scale = min(box_w / drawing.width, box_h / drawing.height)
+            drawing.scale(scale, scale)
+            x = 50 + (box_w - drawing.width * scale) / 2
+            y = 100 + (box_h - drawing.height * scale) / 2
+            renderPDF.draw(drawing, c, x, y)
+        else:
+            img = ImageReader(buf)
+            c.drawImage(img, 50, 100, width=box_w, height=box_h, preserveAspectRatio=True, mask='auto')
         c.showPage()
 
-    def safe_draw_images(prefix, title):
-        base_path = os.path.join(temp_dir, prefix)
-        added = False
-        if os.path.exists(base_path):
-            draw_image_page(base_path, title)
-            added = True
-        else:
-            # 多人脸图检查（如 emotion_pie_face0.png ...）
-            i = 1
-            while True:
-                face_id_str = str(int(i))  # 统一为整数字符串
-                path_i = base_path.replace(".png", f"_face{face_id_str}.png")
-                if os.path.exists(path_i):
-                    draw_image_page(path_i, f"{title} - Face {face_id_str}")
-                    added = True
-                    i += 1
-                else:
-                    break
-        if not added:
-            logging.warning(f"❌ 报告中缺失图像: {title} -> {base_path}*")
+    def safe_draw_images(name, title):
+        items = figures.get(name)
+        for face_id, buf in items:
+            draw_image_page(buf, f"{title} - Face {face_id}" if face_id else title)
+        if not items:
+            logging.warning(f"❌ 报告中缺失图像: {title} -> {name}")
 
-    draw_title_page()
-    safe_draw_images("emotion_line.png", "情绪趋势折线图")
-    safe_draw_images("emotion_pie.png", "主导情绪饼图")
-    safe_draw_images("emotion_bar.png", "主导情绪柱状图")
-    safe_draw_images("emotion_heatmap.png", "情绪强度热力图")
-    safe_draw_images("emotion_radar.png", "情绪雷达图")
-    safe_draw_images("emotion_clusters.png", "情绪空间分布聚类图")
+    with stage("pdf_render"):
+        draw_title_page()
+        safe_draw_images("emotion_line", "情绪趋势折线图")
+        safe_draw_images("emotion_pie", "主导情绪饼图")
+        safe_draw_images("emotion_bar", "主导情绪柱状图")
+        safe_draw_images("emotion_heatmap", "情绪强度热力图")
+        safe_draw_images("emotion_radar", "情绪雷达图")
+        safe_draw_images("emotion_clusters", "情绪空间分布聚类图")
 
-    c.save()
+        c.save()
     print("✅ PDF 报告生成完毕！")
     logging.info(f"PDF 报告已保存至：{output_path}")
-    shutil.rmtree(temp_dir)
\ No newline at end of file
@@ -0,0 +1,260 @@
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .profiling import stage
+from .frame_resize import PIXEL_COLUMNS
+from .annotate_video import default_max_gap
+from .results_io import save_results
+from .video_decoder import open_decoder
+
+# 相邻采样帧的人脸框 IoU 不低于该值时视为同一条轨迹
+TRACK_IOU = 0.3
+# 每条轨迹用于提取特征向量的代表帧数
+TRACK_CROPS = 3
+# 裁剪人脸时向四周扩展的比例（检测框通常贴着五官，识别模型需要完整的脸部轮廓）
+CROP_MARGIN = 0.2
+# 需要的帧相距不超过该帧数时顺序解码，否则重新定位
+SEEK_GAP = 120
+DEFAULT_MODEL = "VGG-Face"
+
+
+def box_iou(a, b):
+    """两组 (x, y, w, h) 人脸框两两之间的 IoU，返回 len(a) × len(b) 矩阵。"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 0] + a[:, None, 2], b[None, :, 0] + b[None, :, 2])
+    y1 = np.minimum(a[:, None, 1] + a[:, None, 3], b[None, :, 1] + b[None, :, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+def build_tracks(df, iou_threshold=TRACK_IOU, max_gap=None):
+    """
+    把逐帧的人脸连成轨迹，返回与 df 同索引的 track_id（从 1 开始，人脸框缺失的行为 -1）。
+
+    按帧号顺序，每个人脸与最近 max_gap 帧内仍活跃的轨迹按 IoU 从高到低贪心匹配，
+    IoU 低于 iou_threshold 或没有可匹配轨迹时开始新的轨迹。max_gap 默认取采样间隔中位数的 2 倍。
+    """
+    track_ids = pd.Series(-1, index=df.index, dtype=np.int64)
+    boxes = df[list(PIXEL_COLUMNS)].to_numpy(np.float64)
+    valid = np.isfinite(boxes).all(axis=1) & (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+    if not valid.any():
+        return track_ids
+    if max_gap is None:
+        max_gap = default_max_gap(df[valid])
+
+    frames = df["frame"].to_numpy(np.int64)
+    order = np.flatnonzero(valid)
+    order = order[np.argsort(frames[order], kind="stable")]
+    active = {}  # track_id -> (最后出现的帧号, 人脸框)
+    next_id = 1
+    for frame_number in np.unique(frames[order]):
+        rows = order[frames[order] == frame_number]
+        candidates = [t for t, (last, _) in active.items() if 0 < frame_number - last <= max_gap]
+        assigned = {}
+        if candidates:
+            iou = box_iou(boxes[rows], np.array([active[t][1] for t in candidates]))
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                i, j = np.unravel_index(flat, iou.shape)
+                if iou[i, j] < iou_threshold:
+                    break
+                if i in assigned or candidates[j] in assigned.values():
+                    continue
+                assigned[i] = candidates[j]
+        for i, row in enumerate(rows):
+            if i not in assigned:
+                assigned[i] = next_id
+                next_id += 1
+            track_ids.iloc[row] = assigned[i]
+            active[assigned[i]] = (frame_number, boxes[row])
+    return track_ids
+
+
+def representative_rows(track, crops=TRACK_CROPS):
+    """轨迹按时间均分为 crops 段，每段取人脸框面积最大的一行（通常最清晰、最接近正脸）。"""
+    track = track.sort_values("frame")
+    area = (track["FaceRectWidth"] * track["FaceRectHeight"]).to_numpy()
+    picks = [chunk[np.argmax(area[chunk])] for chunk in np.array_split(np.arange(len(track)), min(crops, len(track)))]
+    return track.iloc[picks]
+
+
+def read_frames(video_path, frame_numbers, decoder="auto"):
+    """
+    取出指定帧号的画面，返回 ({帧号: BGR 图像}, 视频帧率)。
+    帧号升序排列后，相距不超过 SEEK_GAP 的帧顺序解码，相距较远时重新定位，长视频中只解码需要的片段。
+    """
+    wanted = sorted(set(int(f) for f in frame_numbers))
+    groups = [[wanted[0]]] if wanted else []
+    for f in wanted[1:]:
+        if f - groups[-1][-1] <= SEEK_GAP:
+            groups[-1].append(f)
+        else:
+            groups.append([f])
+
+    images = {}
+    video = open_decoder(video_path, decoder)
+    try:
+        for group in groups:
+            needed = set(group)
+            for frame_number, image in video.frames(start=group[0], end=group[-1]):
+                if frame_number in needed:
+                    images[frame_number] = image
+    finally:
+        video.close()
+    return images, video.fps
+
+
+def crop_face(image, box, margin=CROP_MARGIN):
+    """按人脸框（四周扩展 margin）裁剪，超出画面的部分截断；裁剪为空时返回 None。"""
+    x, y, w, h = (float(v) for v in box)
+    height, width = image.shape[:2]
+    x0, y0 = max(0, int(x - w * margin)), max(0, int(y - h * margin))
+    x1, y1 = min(width, int(round(x + w * (1 + margin)))), min(height, int(round(y + h * (1 + margin))))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return np.ascontiguousarray(image[y0:y1, x0:x1])
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def embed_crops(crops, model_name=DEFAULT_MODEL):
+    """人脸裁剪的特征向量（已归一化）：裁剪已是人脸，DeepFace 跳过检测直接提取特征。"""
+    from deepface import DeepFace
+
+    vectors = []
+    for crop in crops:
+        faces = DeepFace.represent(img_path=crop, model_name=model_name, detector_backend="skip",
+                                   enforce_detection=False)
+        vectors.append(faces[0]["embedding"])
+    return _normalize(vectors)
+
+
+def embed_reference(image_path, model_name=DEFAULT_MODEL):
+    """参考图片的特征向量（已归一化）；检测到多张人脸时取面积最大的一张。"""
+    from deepface import DeepFace
+
+    faces = DeepFace.represent(img_path=image_path, model_name=model_name, enforce_detection=False)
+    area = [f.get("facial_area", {}).get("w", 0) * f.get("facial_area", {}).get("h", 0) for f in faces]
+    return _normalize(faces[int(np.argmax(area))]["embedding"])
+
+
+def verification_threshold(model_name=DEFAULT_MODEL, distance_metric="cosine"):
+    """DeepFace.verify 对该模型 / 距离度量使用的判定阈值（不同版本的函数位置不同）。"""
+    try:
+        from deepface.modules.verification import find_threshold
+    except ImportError:
+        from deepface.commons.distance import findThreshold as find_threshold
+    return float(find_threshold(model_name, distance_metric))
+
+
+def merge_intervals(tracks, merge_gap):
+    """把匹配轨迹的时间段按帧号合并：重叠或间隔不超过 merge_gap 帧的视为同一次出现。"""
+    intervals = []
+    for row in tracks.sort_values("start_frame").itertuples():
+        if intervals and row.start_frame - intervals[-1]["end_frame"] <= merge_gap:
+            last = intervals[-1]
+            last["end_frame"] = max(last["end_frame"], row.end_frame)
+            last["tracks"].append(row.track_id)
+            last["distance"] = min(last["distance"], row.distance)
+        else:
+            intervals.append({"start_frame": row.start_frame, "end_frame": row.end_frame,
+                              "tracks": [row.track_id], "distance": row.distance})
+    for interval in intervals:
+        interval["tracks"] = ";".join(str(t) for t in interval["tracks"])
+    return pd.DataFrame(intervals, columns=["start_frame", "end_frame", "tracks", "distance"])
+
+
+def search_identity(video_path, df, reference_path, model_name=DEFAULT_MODEL, threshold=None, crops=TRACK_CROPS,
+                    iou_threshold=TRACK_IOU, max_gap=None, merge_gap=2.0, decoder="auto", fps=None):
+    """
+    在视频中查找参考图片中的人：返回 (轨迹表, 出现时间段表, 该人的逐帧检测结果)。
+
+    先按人脸框把 detect 阶段的结果连成轨迹，参考人脸只提取一次特征，每条轨迹只取 crops 个代表帧提取特征并取平均，
+    再一次性计算所有轨迹与参考人脸的余弦距离，距离不超过 threshold（默认为 DeepFace 对该模型的判定阈值）即为匹配。
+    特征提取次数约为 轨迹数 × crops，与每条轨迹包含多少个采样帧无关。
+    merge_gap 为合并相邻出现时间段的最大间隔（秒）；fps 默认取视频帧率，用于帧号与秒的换算。
+    """
+    if df.empty or not all(c in df for c in PIXEL_COLUMNS):
+        raise ValueError("检测结果中没有人脸框列（FaceRect*），请在 detect 时保留 box 分组（--keep 包含 box）。")
+    if threshold is None:
+        threshold = verification_threshold(model_name)
+
+    with stage("identity_tracks"):
+        df = df.copy()
+        df["track_id"] = build_tracks(df, iou_threshold, max_gap)
+        tracked = df[df["track_id"] > 0]
+        picks = {t: representative_rows(track, crops) for t, track in tracked.groupby("track_id")}
+    logging.info(f"🧵 共 {len(picks)} 条人脸轨迹，每条取 {crops} 个代表帧提取特征。")
+
+    with stage("identity_frames"):
+        images, video_fps = read_frames(video_path, pd.concat(picks.values())["frame"] if picks else [], decoder)
+        fps = fps or video_fps or 30
+
+    with stage("identity_embed"):
+        reference = embed_reference(reference_path, model_name)
+        crop_track, crop_images = [], []
+        for track_id, rows in picks.items():
+            for row in rows.itertuples():
+                image = images.get(int(row.frame))
+                crop = crop_face(image, [getattr(row, c) for c in PIXEL_COLUMNS]) if image is not None else None
+                if crop is not None:
+                    crop_track.append(track_id)
+                    crop_images.append(crop)
+        embeddings = embed_crops(crop_images, model_name) if crop_images else np.empty((0, len(reference)))
+
+    with stage("identity_match"):
+        crop_track = np.asarray(crop_track)
+        track_ids = np.unique(crop_track)
+        # 每条轨迹的特征为其代表帧特征的均值（再归一化），一次矩阵运算得到所有轨迹的余弦距离
+        track_embeddings = _normalize([embeddings[crop_track == t].mean(axis=0) for t in track_ids]) \
+            if len(track_ids) else np.empty((0, len(reference)))
+        distances = 1 - track_embeddings @ reference
+
+        spans = tracked.groupby("track_id")["frame"].agg(["min", "max", "size"])
+        tracks = pd.DataFrame({
+            "track_id": track_ids.astype(np.int64),
+            "start_frame": spans.loc[track_ids, "min"].to_numpy(np.int64),
+            "end_frame": spans.loc[track_ids, "max"].to_numpy(np.int64),
+            "faces": spans.loc[track_ids, "size"].to_numpy(np.int64),
+            "crops": [int((crop_track == t).sum()) for t in track_ids],
+            "distance": np.round(distances, 4),
+            "matched": distances <= threshold,
+        })
+        for col in ("start", "end"):
+            tracks[f"{col}_time"] = (tracks[f"{col}_frame"] / fps).round(2)
+
+        intervals = merge_intervals(tracks[tracks["matched"]], int(round(merge_gap * fps)))
+        intervals["start_time"] = (intervals["start_frame"] / fps).round(2)
+        intervals["end_time"] = (intervals["end_frame"] / fps).round(2)
+
+        # 该人的情绪时间线：只保留匹配轨迹的行，face_id 统一为 1（原编号保存在 source_face_id），可直接用于 plot / report
+        person = df[df["track_id"].isin(tracks.loc[tracks["matched"], "track_id"])].copy()
+        person["source_face_id"] = person["face_id"]
+        person["face_id"] = 1
+        person = person.sort_values("frame", kind="stable").reset_index(drop=True)
+
+    logging.info(f"🔍 阈值 {threshold:.3f}：{int(tracks['matched'].sum())}/{len(tracks)} 条轨迹匹配，"
+                 f"合并为 {len(intervals)} 个出现时间段。")
+    return tracks, intervals, person
+
+
+def save_identity_results(tracks, intervals, person, output_intervals, output_results=None):
+    """写出出现时间段表（output_intervals）、轨迹表（同名 .tracks.csv），以及可选的该人逐帧检测结果。"""
+    directory = os.path.dirname(output_intervals)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    intervals.to_csv(output_intervals, index=False)
+    tracks.to_csv(os.path.splitext(output_intervals)[0] + ".tracks.csv", index=False)
+    logging.info(f"出现时间段已保存到：{output_intervals}")
+    if output_results:
+        save_results(person, output_results)
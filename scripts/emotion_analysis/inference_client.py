@@ -0,0 +1,94 @@
+import json
+import socket
+import http.client
+from urllib.parse import urlparse, urlencode
+
+import cv2
+import numpy as np
+import pandas as pd
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过 Unix 套接字发送 HTTP 请求"""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def encode_image(image, quality=95):
+    """将图像编码为请求体：ndarray（BGR）编码为 JPEG，字符串视为文件路径，bytes 原样发送。"""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            return f.read()
+    ok, buf = cv2.imencode(".jpg", np.asarray(image), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("图像编码失败")
+    return buf.tobytes()
+
+
+class InferenceClient:
+    """
+    本地推理服务的客户端。
+
+        client = InferenceClient("http://127.0.0.1:8765")      # 或 InferenceClient(unix_socket="/tmp/emotion.sock")
+        faces = client.detect_frame(frame, multi_face=True)    # DataFrame，列与 Py-Feat 输出一致
+        analysis = client.analyze_image("deepface/pic/1.jpg")  # DeepFace 分析结果字典
+    """
+
+    def __init__(self, url="http://127.0.0.1:8765", unix_socket=None, timeout=300):
+        self.unix_socket = unix_socket
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 8765
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.unix_socket:
+            return UnixHTTPConnection(self.unix_socket, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method, path, body=None, content_type="application/octet-stream"):
+        conn = self._connection()
+        try:
+            headers = {"Content-Type": content_type} if body is not None else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            payload = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise RuntimeError(f"推理服务返回 {response.status}：{payload.get('error', payload)}")
+        return payload
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def detect_frame(self, image, multi_face=False):
+        """检测单帧（ndarray / 路径 / 编码字节），返回人脸检测结果 DataFrame。"""
+        query = urlencode({"multi_face": int(bool(multi_face))})
+        payload = self._request("POST", f"/detect/frame?{query}", encode_image(image), "image/jpeg")
+        return pd.DataFrame(payload["faces"])
+
+    def analyze_image(self, image, actions=None):
+        """用服务端常驻的 DeepFace 模型分析图像属性，actions 为空时使用服务端默认项。"""
+        path = "/analyze/image"
+        if actions:
+            path += "?" + urlencode({"actions": ",".join(actions)})
+        return self._request("POST", path, encode_image(image), "image/jpeg")
+
+    def detect_video(self, video_path, **options):
+        """
+        在服务端分析视频（路径需在服务端可访问）。options 限于 inference_server.VIDEO_OPTIONS
+        （采样率、multi_face、keep、帧 / 时间范围），结果写入服务端的 outputs/server/。
+        """
+        body = json.dumps({"video_path": video_path, **options}).encode("utf-8")
+        return self._request("POST", "/detect/video", body, "application/json")
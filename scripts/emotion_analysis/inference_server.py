@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import socketserver
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+from .micro_batcher import MicroBatcher
+from .process_video import VideoAnalysisError, process_video
+from .profiling import stage
+
+
+# /detect/video 可由请求指定的 process_video 参数及其类型；其余参数（输出路径、解码器、特征等）由服务端决定
+VIDEO_OPTIONS = {
+    "process_sampling_rate": int,
+    "multi_face": bool,
+    "keep": str,
+    "start_frame": int,
+    "end_frame": int,
+    "start_time": (int, float),
+    "end_time": (int, float),
+}
+# 视频检测结果的输出目录（服务端固定，请求不能指定）
+VIDEO_OUTPUT_DIR = os.path.join("outputs", "server")
+
+
+def video_options(options):
+    """
+    校验 /detect/video 的参数：只接受 VIDEO_OPTIONS 中的键，类型不符或出现其他键时抛出 ValueError（返回 400）。
+    值为 null 的参数视为未指定。
+    """
+    unknown = sorted(set(options) - set(VIDEO_OPTIONS))
+    if unknown:
+        raise ValueError(f"不支持的参数：{', '.join(unknown)}（可用参数：{', '.join(VIDEO_OPTIONS)}）")
+    checked = {}
+    for key, value in options.items():
+        if value is None:
+            continue
+        # JSON 的 true/false 在 Python 中是 int 的子类，数值参数不接受布尔值
+        if not isinstance(value, VIDEO_OPTIONS[key]) or (isinstance(value, bool) and VIDEO_OPTIONS[key] is not bool):
+            raise ValueError(f"参数 {key} 的类型无效：{value!r}")
+        checked[key] = value
+    if checked.get("process_sampling_rate", 1) < 1:
+        raise ValueError("process_sampling_rate 必须为正整数")
+    for first, last in (("start_frame", "end_frame"), ("start_time", "end_time")):
+        if checked.get(first, 0) < 0 or checked.get(last, 0) < 0:
+            raise ValueError(f"{first} / {last} 不能为负数")
+        if first in checked and last in checked and checked[last] < checked[first]:
+            raise ValueError(f"{last} 早于 {first}")
+    return checked
+
+
+class _LockedDetector:
+    """
+    逐次加锁的检测器代理：视频任务每检测一帧才持有一次检测器锁，
+    并发的单帧批次可以插在视频的帧之间执行，而不必等整段视频处理完。
+    """
+
+    def __init__(self, detector, lock):
+        self._detector = detector
+        self._lock = lock
+
+    def detect_image(self, *args, **kwargs):
+        with self._lock:
+            return self._detector.detect_image(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._detector, name)
+
+
+def deepface_analyze(image, actions):
+    """默认的图像属性分析：DeepFace.analyze（不强制检测人脸），多张人脸时取第一张。"""
+    from deepface import DeepFace
+
+    analysis = DeepFace.analyze(img_path=image, actions=list(actions), enforce_detection=False)
+    if isinstance(analysis, list):
+        analysis = analysis[0]
+    return analysis
+
+
+def to_records(df):
+    """DataFrame 转为可 JSON 序列化的记录列表（NaN 转为 None）。"""
+    if df is None or df.empty:
+        return []
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class InferenceService:
+    """
+    常驻模型的推理服务：启动时加载一次 Py-Feat 检测器与 DeepFace 模型，
+    单帧检测与图像分析请求经 MicroBatcher 合并为微批次，视频请求复用同一个检测器。
+
+    detector / analyzer 可注入（如基准测试中的桩实现），为 None 时分别创建
+    Py-Feat Detector（按 features）和 DeepFace 分析函数；deepface_actions 为空时不加载 DeepFace。
+    """
+
+    def __init__(self, detector=None, analyzer=None, features="all", deepface_actions=("emotion",),
+                 max_batch=8, max_latency_ms=20, backend="torch"):
+        self.detector = detector
+        self.analyzer = analyzer
+        self.features = features
+        self.backend = backend
+        self.deepface_actions = tuple(deepface_actions or ())
+        self.max_batch = max_batch
+        self.max_latency_ms = max_latency_ms
+        # Py-Feat 检测器不保证线程安全：帧批次与视频任务的每一帧串行使用
+        self._detector_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.load_s = {}
+        self.frame_batcher = None
+        self.image_batcher = None
+
+    def load(self):
+        """加载并预热模型，启动批处理线程。"""
+        if self.detector is None:
+            from .detector_profiles import build_detector
+
+            start = time.perf_counter()
+            self.detector = build_detector(self.features, backend=self.backend)
+            self.load_s["pyfeat"] = round(time.perf_counter() - start, 2)
+        if self.deepface_actions:
+            if self.analyzer is None:
+                self.analyzer = deepface_analyze
+            # 用空白图像跑一次，触发 DeepFace 模型加载
+            start = time.perf_counter()
+            try:
+                self.analyzer(np.zeros((224, 224, 3), dtype=np.uint8), self.deepface_actions)
+            except Exception as e:
+                logging.warning(f"DeepFace 预热失败：{e}")
+            self.load_s["deepface"] = round(time.perf_counter() - start, 2)
+        self.frame_batcher = MicroBatcher(self._detect_frames, self.max_batch, self.max_latency_ms, name="frame-batcher")
+        self.image_batcher = MicroBatcher(self._analyze_images, self.max_batch, self.max_latency_ms, name="image-batcher")
+        logging.info(f"✅ 模型已加载：{self.load_s}")
+        return self
+
+    def close(self):
+        for batcher in (self.frame_batcher, self.image_batcher):
+            if batcher is not None:
+                batcher.close()
+
+    def count(self, endpoint):
+        with self._counter_lock:
+            self.requests[endpoint] += 1
+
+    def _detect_frames(self, items):
+        """
+        单帧检测的批处理函数。items 为 (BGR 图像, multi_face) 列表。
+        同尺寸的帧写入临时文件后一次交给检测器（Py-Feat 批量检测要求尺寸一致），按 input 列拆回各请求。
+        """
+        results = [None] * len(items)
+        groups = defaultdict(list)
+        for i, (image, _) in enumerate(items):
+            groups[image.shape].append(i)
+
+        with tempfile.TemporaryDirectory(prefix="emotion_server_") as tmp_dir:
+            for indices in groups.values():
+                paths = []
+                for i in indices:
+                    path = os.path.join(tmp_dir, f"frame_{i}.jpg")
+                    cv2.imwrite(path, items[i][0])
+                    paths.append(path)
+                with self._detector_lock, stage("server_detect"):
+                    df = self.detector.detect_image(paths, batch_size=len(paths))
+                for i, path in zip(indices, paths):
+                    faces = df[df["input"] == path] if "input" in df.columns else df
+                    faces = faces.drop(columns=["input"], errors="ignore").reset_index(drop=True)
+                    if not items[i][1] and len(faces) > 1:
+                        # 单人脸模式：只保留置信度最高的人脸
+                        faces = faces.loc[[faces["FaceScore"].idxmax()]] if "FaceScore" in faces else faces.iloc[:1]
+                    results[i] = faces
+        return results
+
+    def _analyze_images(self, items):
+        """图像属性分析的批处理函数。items 为 (BGR 图像, actions) 列表；DeepFace 逐张分析，模型保持常驻。"""
+        results = []
+        with stage("server_analyze"):
+            for image, actions in items:
+                try:
+                    results.append(self.analyzer(image, actions))
+                except Exception as e:
+                    results.append({"error": str(e)})
+        return results
+
+    def detect_frame(self, image, multi_face=False):
+        return self.frame_batcher.submit((image, multi_face)).result()
+
+    def analyze_image(self, image, actions=None):
+        if not self.deepface_actions:
+            raise RuntimeError("服务未加载 DeepFace（--deepface_actions 为空）")
+        return self.image_batcher.submit((image, tuple(actions or self.deepface_actions))).result()
+
+    def detect_video(self, video_path, **options):
+        """
+        在服务进程内分析整段视频，复用常驻检测器；返回行数与结果文件路径。
+        options 只接受 VIDEO_OPTIONS 中的参数（否则抛出 ValueError）；结果写入 VIDEO_OUTPUT_DIR，
+        文件名由视频文件名与其绝对路径的哈希组成，不同目录下的同名视频互不覆盖。
+        视频文件不存在时抛出 FileNotFoundError。
+        """
+        options = video_options(options)
+        if not os.path.isfile(video_path):
+            raise FileNotFoundError(f"视频文件不存在：{video_path}")
+        digest = hashlib.sha1(os.path.abspath(video_path).encode("utf-8")).hexdigest()[:8]
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        output_csv = os.path.join(VIDEO_OUTPUT_DIR, f"{stem}_{digest}.csv")
+        # 检测器锁只在每帧检测时持有，视频任务不会阻塞 /detect/frame 的批次
+        # 无法打开视频、帧范围无效或未检测到人脸时抛出 VideoAnalysisError，由请求处理返回 400
+        df = process_video(video_path, options.pop("process_sampling_rate", 10), output_csv,
+                           detector=_LockedDetector(self.detector, self._detector_lock), **options)
+        return {"rows": len(df), "faces": int(df["face_id"].nunique()), "output_csv": output_csv}
+
+    def status(self):
+        with self._counter_lock:
+            requests = dict(self.requests)
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "device": str(getattr(self.detector, "device", "unknown")),
+            "deepface_actions": list(self.deepface_actions),
+            "load_s": self.load_s,
+            "max_batch": self.max_batch,
+            "max_latency_ms": self.max_latency_ms,
+            "requests": requests,
+            "frame_batches": self.frame_batcher.stats() if self.frame_batcher else None,
+            "image_batches": self.image_batcher.stats() if self.image_batcher else None,
+        }
+
+
+def decode_image(body):
+    """将请求体中的 JPEG/PNG 字节解码为 BGR 图像。"""
+    image = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("无法解码图像，请发送 JPEG 或 PNG 字节")
+    return image
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP 接口：
+      GET  /health          服务状态与批处理统计
+      POST /detect/frame    请求体为 JPEG/PNG 字节，?multi_face=1 返回全部人脸
+      POST /analyze/image   请求体为 JPEG/PNG 字节，?actions=emotion,age 指定 DeepFace 分析项
+      POST /detect/video    JSON：{"video_path": ..., 可选 process_sampling_rate、multi_face、keep、
+                            start_frame、end_frame、start_time、end_time}，结果写入服务端的 outputs/server/
+    参数无效、视频无法打开或没有检测到人脸时返回 400，视频文件不存在时返回 404，其他错误返回 500。
+    """
+
+    server_version = "EmotionInference/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix 套接字没有客户端地址
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, self.service.status())
+        else:
+            self._send_json(404, {"error": f"未知路径：{self.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        service = self.service
+        try:
+            if url.path == "/detect/frame":
+                service.count("detect_frame")
+                faces = service.detect_frame(decode_image(self._body()),
+                                             multi_face=query.get("multi_face", "0") in ("1", "true"))
+                self._send_json(200, {"faces": to_records(faces)})
+            elif url.path == "/analyze/image":
+                service.count("analyze_image")
+                actions = [a for a in query.get("actions", "").split(",") if a] or None
+                self._send_json(200, service.analyze_image(decode_image(self._body()), actions))
+            elif url.path == "/detect/video":
+                service.count("detect_video")
+                options = json.loads(self._body() or b"{}")
+                if not isinstance(options, dict):
+                    raise ValueError("请求体应为 JSON 对象")
+                video_path = options.pop("video_path", None)
+                if not video_path or not isinstance(video_path, str):
+                    raise ValueError("缺少 video_path")
+                self._send_json(200, service.detect_video(video_path, **options))
+            else:
+                self._send_json(404, {"error": f"未知路径：{url.path}"})
+        except FileNotFoundError as e:
+            self._send_json(404, {"error": str(e)})
+        except (ValueError, TypeError, VideoAnalysisError) as e:
+            # 请求参数无效、视频无法打开、帧范围无效或视频中没有人脸：属于输入问题，不是服务端故障
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            logging.error(f"请求 {url.path} 失败：{e}")
+            self._send_json(500, {"error": str(e)})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service, host="127.0.0.1", port=8765, unix_socket=None):
+    """创建 HTTP 服务器（TCP 或 Unix 套接字），service 需已调用 load()。"""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, InferenceHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), InferenceHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(args):
+    """serve 子命令：加载模型并持续提供服务，Ctrl+C 退出。"""
+    actions = [a.strip() for a in args.deepface_actions.split(",") if a.strip()]
+    service = InferenceService(features=args.features, deepface_actions=actions, max_batch=args.max_batch,
+                               max_latency_ms=args.max_latency_ms, backend=args.backend).load()
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    where = args.unix_socket or f"http://{args.host}:{server.server_address[1]}"
+    logging.info(f"🚀 推理服务已启动：{where}（微批次上限 {args.max_batch}，延迟预算 {args.max_latency_ms} ms）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("收到中断信号，正在关闭服务...")
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
@@ -1,5 +1,6 @@
+import os
+import sys
 import logging
-from .process_video import process_video
 from .plot_emotion_line import plot_emotion_line
 from .plot_emotion_pie import plot_emotion_pie
 from .plot_emotion_heatmap import plot_emotion_heatmap
@@ -8,39 +9,72 @@ from .plot_emotion_radar import plot_emotion_radar
 from .plot_emotion_clusters import plot_emotion_clusters
 from .parse_arguments import parse_arguments
 from .generate_report import generate_report
+from .results_io import load_results, results_source
+from .compact_results import EMOTIONS
+from .profiling import enable_profiling, dump_profile, stage
 
-def main():
-    args = parse_arguments()
+# 绘图与报告只用到这些列：AU、关键点等数百列不必读入内存（列式存储时其余列完全不会被读取）
+CHART_COLUMNS = ("frame", "face_id", "second", *EMOTIONS)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s"
-    )
+def run_detect(args):
+    """检测阶段：分析视频并写出检测结果文件"""
+    # 延迟导入：plot / report 阶段所在的机器无需安装 Py-Feat
+    from .process_video import process_video, VideoAnalysisError
+    from .face_cache import face_cache_from_args
 
-    df = process_video(
-        video_path=args.video_path,
-        process_sampling_rate=args.process_sampling_rate,
-        output_csv=args.output_csv,
-        multi_face=args.multi_face  # 支持多张人脸
-    )
+    try:
+        df = process_video(
+            video_path=args.video_path,
+            process_sampling_rate=args.process_sampling_rate,
+            output_csv=args.output_csv,
+            multi_face=args.multi_face,  # 支持多张人脸
+            keep=args.keep,
+            features=args.features,
+            max_side=args.max_side,
+            decoder=args.decoder,
+            decode_threads=args.decode_threads,
+            keyframes_only=args.keyframes_only,
+            backend=args.backend,
+            face_cache=face_cache_from_args(args),
+            incremental=args.incremental,
+            start_frame=args.start_frame,
+            end_frame=args.end_frame,
+            start_time=args.start_time,
+            end_time=args.end_time
+        )
+    except VideoAnalysisError as e:
+        logging.error(str(e))
+        sys.exit(1)
 
     logging.info("检测结果预览：")
     print(df.head())
+    return df
+
+def run_plot(df, args):
+    """绘图阶段：plot_dir 为 None 时弹窗展示图表，否则将图表保存到该目录"""
+    plot_dir = getattr(args, "plot_dir", None)
+    if plot_dir:
+        os.makedirs(plot_dir, exist_ok=True)
+
+    def chart_path(name):
+        return os.path.join(plot_dir, name) if plot_dir else None
 
     # 绘制情绪折线图
-    plot_emotion_line(df=df, fps=args.fps)
+    plot_emotion_line(df=df, fps=args.fps, save_path=chart_path("emotion_line.png"))
 
     # 绘制指定帧范围内情绪占比饼图
-    plot_emotion_pie(df=df, start_frame=args.start_frame, end_frame=args.end_frame)
+    plot_emotion_pie(df=df, start_frame=args.start_frame, end_frame=args.end_frame, save_path=chart_path("emotion_pie.png"))
 
     # 绘制情绪热力图（横轴显示帧数及秒数）
-    plot_emotion_heatmap(df=df, fps=args.fps)
+    plot_emotion_heatmap(df=df, fps=args.fps, n_bins=args.heatmap_bins, bin_agg=args.heatmap_agg,
+                         save_path=chart_path("emotion_heatmap.png"))
 
     # 绘制情绪雷达图
-    plot_emotion_radar(df=df, fps=args.fps, start_frame=args.start_frame, end_frame=args.end_frame)
+    plot_emotion_radar(df=df, fps=args.fps, start_frame=args.start_frame, end_frame=args.end_frame,
+                       save_path=chart_path("emotion_radar.png"))
 
     # 绘制可交互折线图
-    plot_emotion_dynamic(df=df, fps=args.fps, save_path="outputs/emotion_dynamic.html")
+    plot_emotion_dynamic(df=df, fps=args.fps, save_path=os.path.join(plot_dir or "outputs", "emotion_dynamic.html"))
 
     # 绘制情绪聚类图
     plot_emotion_clusters(
@@ -51,13 +85,164 @@ def main():
         method=args.method,
         n_neighbors=args.n_neighbors,
         perplexity=args.perplexity,
-        cluster_sampling_rate=args.cluster_sampling_rate
+        cluster_sampling_rate=args.cluster_sampling_rate,
+        cache_dir=args.embedding_cache_dir,
+        incremental=args.incremental_embedding,
+        source=results_source(args),
+        save_path=chart_path("emotion_clusters.png")
+    )
+
+def run_report(df, args):
+    """报告阶段：生成 PDF 报告"""
+    generate_report(df=df, args=args, output_path=args.output_pdf)
+
+def run_annotate(df, args):
+    """导出阶段：根据检测结果生成带标注的视频"""
+    from .annotate_video import export_annotated_video
+
+    return export_annotated_video(
+        video_path=args.video_path,
+        df=df,
+        output_path=args.output_video,
+        segments=args.segments,
+        workers=args.segment_workers,
+        decoder=args.decoder,
+        max_gap=args.max_gap,
+        top_aus=args.top_aus,
+        codec=args.codec,
+        start_frame=args.start_frame,
+        end_frame=args.end_frame
+    )
+
+def run_identify(df, args):
+    """身份查找阶段：按参考人脸匹配人脸轨迹，写出出现时间段"""
+    from .identity_search import search_identity, save_identity_results
+
+    tracks, intervals, person = search_identity(
+        video_path=args.video_path,
+        df=df,
+        reference_path=args.reference,
+        model_name=args.model_name,
+        threshold=args.threshold,
+        crops=args.crops,
+        iou_threshold=args.track_iou,
+        max_gap=args.max_gap,
+        merge_gap=args.merge_gap,
+        decoder=args.decoder
     )
+    save_identity_results(tracks, intervals, person, args.output_intervals, args.output_results)
 
-    # 生成报告
-    generate_report(df=df, args=args)
+    logging.info("出现时间段：")
+    print(intervals.to_string(index=False))
+    return intervals
+
+def run_command(args):
+    """按子命令执行对应阶段"""
+    if args.command == "detect":
+        run_detect(args)
+        print(f"\n🎉 检测完成，结果已保存至 {args.output_csv}。\n")
+        return
+
+    if args.command == "plot":
+        with stage("load_results"):
+            # 只读取图表用到的列和 --start_frame / --end_frame 范围内的行（列式存储只映射这部分数据）
+            df = load_results(args.results, columns=CHART_COLUMNS, start_frame=args.start_frame, end_frame=args.end_frame)
+        run_plot(df, args)
+        print("\n🎉 绘图完成。\n")
+        return
+
+    if args.command == "report":
+        with stage("load_results"):
+            # 只读取图表用到的列和 --start_frame / --end_frame 范围内的行（列式存储只映射这部分数据）
+            df = load_results(args.results, columns=CHART_COLUMNS, start_frame=args.start_frame, end_frame=args.end_frame)
+        run_report(df, args)
+        print(f"\n🎉 报告已生成：{args.output_pdf}\n")
+        return
+
+    if args.command == "annotate":
+        with stage("load_results"):
+            df = load_results(args.results)
+        run_annotate(df, args)
+        print(f"\n🎉 带标注视频已生成：{args.output_video}\n")
+        return
+
+    if args.command == "identify":
+        with stage("load_results"):
+            df = load_results(args.results)
+        run_identify(df, args)
+        print(f"\n🎉 身份查找完成，出现时间段已保存至 {args.output_intervals}。\n")
+        return
+
+    if args.command == "batch":
+        from .batch_runner import run_batch
+
+        entries, failed = run_batch(args)
+        print(f"\n🎉 批处理完成：{len(entries) - failed}/{len(entries)} 个视频成功，汇总索引位于 {args.output_root}。\n")
+        return
+
+    if args.command == "serve":
+        from .inference_server import serve
+
+        serve(args)
+        return
+
+    # run：完整流程
+    df = run_detect(args)
+    run_plot(df, args)
+    run_report(df, args)
     print("\n🎉 分析完成，图表已展示，报告已生成。程序退出。\n")
 
+def run_profiled(args):
+    """
+    --profile 模式：启用阶段计时，并可选地用 cProfile / pyinstrument 做函数级剖析，
+    结束后写出 JSON 汇总（剖析结果与 JSON 同名，扩展名分别为 .prof / .html）。
+    """
+    enable_profiling()
+    base = os.path.splitext(args.profile_json)[0]
+    profiler = None
+
+    if args.profiler == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif args.profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        except ImportError:
+            logging.warning("未安装 pyinstrument，仅输出阶段耗时汇总。")
+
+    try:
+        with stage(args.command):
+            run_command(args)
+    finally:
+        if profiler is not None:
+            os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+            if args.profiler == "cprofile":
+                profiler.disable()
+                profiler.dump_stats(base + ".prof")
+                logging.info(f"cProfile 结果已保存至：{base}.prof")
+            else:
+                profiler.stop()
+                with open(base + ".html", "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                logging.info(f"pyinstrument 结果已保存至：{base}.html")
+        dump_profile(args.profile_json)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    if args.profile:
+        run_profiled(args)
+    else:
+        run_command(args)
+
 if __name__ == "__main__":
     main()
 
@@ -67,4 +252,28 @@ if __name__ == "__main__":
 #单个人脸
 # python -m scripts.emotion_analysis.main videos/name.mp4 --process_sampling_rate 10 --fps 30
 #多张人脸
-# python -m scripts.emotion_analysis.main videos/test6.mp4 --process_sampling_rate 12 --fps 24 --multi_face
\ No newline at end of file
+# python -m scripts.emotion_analysis.main videos/test6.mp4 --process_sampling_rate 12 --fps 24 --multi_face
+#分阶段运行（检测与绘图/报告可在不同机器上执行，通过结果文件衔接）
+# python -m scripts.emotion_analysis.main detect videos/name.mp4 --output_csv outputs/name.csv --multi_face
+# python -m scripts.emotion_analysis.main plot --results outputs/name.csv --fps 30 --plot_dir outputs/charts
+# python -m scripts.emotion_analysis.main report --results outputs/name.csv --fps 30 --output_pdf outputs/name.pdf
+#批处理（目录或清单文件，每个视频输出到 outputs/batch/<视频名>/）
+# python -m scripts.emotion_analysis.main batch videos/ --workers 4 --output_root outputs/batch
+#导出带标注的视频（人脸框、主情绪、AU，采样帧之间插值；长视频自动分段并行渲染）
+# python -m scripts.emotion_analysis.main annotate videos/name.mp4 --results outputs/name.csv --output_video outputs/name_annotated.mp4
+#推理服务（模型常驻，客户端见 inference_client.InferenceClient）
+# python -m scripts.emotion_analysis.main serve --port 8765 --max_batch 8 --max_latency_ms 20
+#画面基本静止的视频（如网络研讨会），人脸几乎不变时复用缓存结果
+# python -m scripts.emotion_analysis.main detect videos/webinar.mp4 --face_cache --face_cache_max_age 30
+#先粗后细：先按 30 帧间隔快速浏览，再按 10 帧间隔补齐（已分析过的帧不再重复计算）
+# python -m scripts.emotion_analysis.main detect videos/name.mp4 --output_csv outputs/name.csv --process_sampling_rate 30
+# python -m scripts.emotion_analysis.main detect videos/name.mp4 --output_csv outputs/name.csv --process_sampling_rate 10 --incremental
+#只分析一段（定位到起始位置解码，帧号仍为视频中的绝对帧号）
+# python -m scripts.emotion_analysis.main detect videos/name.mp4 --start_time 600 --end_time 720
+#查找某人在视频中出现的时间段（每条人脸轨迹只提取几个代表帧的特征），并导出其情绪时间线用于绘图
+# python -m scripts.emotion_analysis.main identify videos/name.mp4 --results outputs/name.csv --reference pic/person.jpg --output_results outputs/person.csv
+# python -m scripts.emotion_analysis.main plot --results outputs/person.csv --fps 30 --plot_dir outputs/person_charts
+#超长的多人脸录像：结果保存为列式存储（每列一个可内存映射的 .npy），绘图 / 报告只读取用到的列
+# python -m scripts.emotion_analysis.main detect videos/long.mp4 --multi_face --output_csv outputs/long.colstore
+# python -m scripts.emotion_analysis.column_store outputs/long.csv outputs/long.colstore
+# python -m scripts.emotion_analysis.main report --results outputs/long.colstore --fps 30
@@ -0,0 +1,98 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    请求微批处理：把并发提交的请求合并成小批次，交给 handler 一次处理。
+
+    后台线程取到第一个请求后，最多再等待 max_latency_ms 毫秒收集后续请求，
+    凑满 max_batch 个或超出延迟预算即执行 handler(items)，handler 需按顺序返回等长的结果列表。
+
+        batcher = MicroBatcher(detect_batch, max_batch=8, max_latency_ms=20)
+        result = batcher.submit(frame).result()
+    """
+
+    def __init__(self, handler, max_batch=8, max_latency_ms=20, name="micro-batcher"):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.max_latency = max(0.0, max_latency_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.wait_s = 0.0
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """提交一个请求，返回 Future；handler 抛出的异常会传递给同一批次的所有 Future。"""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if nxt is _STOP:
+                # 处理完当前批次后再退出
+                self._queue.put(_STOP)
+                break
+            batch.append(nxt)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = self._collect(first)
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+            try:
+                results = self.handler(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"批处理结果数量 {len(results)} 与请求数量 {len(items)} 不一致")
+            except Exception as e:
+                logging.error(f"批处理失败（{len(items)} 个请求）：{e}")
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.items += len(items)
+                self.largest_batch = max(self.largest_batch, len(items))
+                self.wait_s += sum(started - submitted for _, _, submitted in batch)
+
+    def stats(self):
+        """批次数、请求数、平均/最大批大小与平均排队时间。"""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else None,
+                "largest_batch": self.largest_batch,
+                "mean_wait_ms": round(self.wait_s / self.items * 1000, 2) if self.items else None,
+            }
+
+    def close(self):
+        """处理完已提交的请求后停止后台线程。"""
+        self._queue.put(_STOP)
+        self._thread.join()
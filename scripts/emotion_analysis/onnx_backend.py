@@ -0,0 +1,253 @@
+import os
+import time
+import hashlib
+import inspect
+import logging
+
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# enable_onnx(models=...) 中的子模型名称 -> Detector 属性名中的关键字（--backend onnx 时转换全部三个子模型）
+ONNX_TARGETS = {
+    "emotion": ("emotion",),
+    "face": ("face_detector", "face_model"),
+    "landmark": ("landmark",),
+}
+# onnx-int8 只量化情绪模型；人脸检测与关键点的卷积网络动态量化后精度下降明显，保持 fp32
+INT8_MODELS = ("emotion",)
+
+
+def _flatten(output):
+    """把模块输出展平为张量列表，返回 (张量列表, 是否为单个张量)；不支持的结构抛出 TypeError。"""
+    import torch
+
+    if torch.is_tensor(output):
+        return [output], True
+    if isinstance(output, (list, tuple)) and all(torch.is_tensor(o) for o in output):
+        return list(output), False
+    raise TypeError(f"不支持导出的输出类型：{type(output).__name__}")
+
+
+def _dynamic_axes(tensors, prefix):
+    """批维度设为动态；4 维图像输入的高、宽也设为动态（人脸检测输入随帧尺寸变化）。"""
+    axes = {}
+    for i, t in enumerate(tensors):
+        dims = {0: "batch"}
+        if t.dim() == 4:
+            dims.update({2: "height", 3: "width"})
+        axes[f"{prefix}_{i}"] = dims
+    return axes
+
+
+def _create_session(path, threads=0):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+def quantize_int8(path, output_path):
+    """ONNX Runtime 动态量化：权重转为 int8，激活在运行时量化。"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def _make_wrapper_class():
+    import torch
+
+    class OnnxModule(torch.nn.Module):
+        """
+        替换 Py-Feat 中 PyTorch 子模型的包装：首次调用时用真实输入导出 ONNX（可选 int8 动态量化），
+        并记录与 PyTorch 输出的差异；之后由 ONNX Runtime 推理，返回与原模块结构相同的张量。
+        导出或推理失败时永久退回原 PyTorch 模块。
+        """
+
+        def __init__(self, name, module, path, quantize=False, threads=0):
+            super().__init__()
+            self.torch_module = module
+            self.model_name = name
+            self.onnx_path = path
+            self.quantize = quantize
+            self.threads = threads
+            self.session = None
+            self.failed = False
+            self.single_output = True
+            self.parity = None
+            self.calls = 0
+            self.seconds = 0.0
+
+        def __getattr__(self, name):
+            try:
+                return super().__getattr__(name)
+            except AttributeError:
+                module = self.__dict__.get("_modules", {}).get("torch_module")
+                if module is None:
+                    raise
+                return getattr(module, name)
+
+        def _export(self, args, reference):
+            outputs, self.single_output = _flatten(reference)
+            fp32_path = self.onnx_path
+            if not os.path.exists(fp32_path):
+                os.makedirs(os.path.dirname(fp32_path) or ".", exist_ok=True)
+                input_names = [f"input_{i}" for i in range(len(args))]
+                output_names = [f"output_{i}" for i in range(len(outputs))]
+                axes = _dynamic_axes(args, "input")
+                axes.update(_dynamic_axes(outputs, "output"))
+                options = {}
+                # 新版 PyTorch 默认使用 dynamo 导出（依赖 onnxscript），这里固定使用 TorchScript 导出
+                if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+                    options["dynamo"] = False
+                with torch.no_grad():
+                    torch.onnx.export(self.torch_module.eval(), tuple(args), fp32_path, input_names=input_names,
+                                      output_names=output_names, dynamic_axes=axes, opset_version=17, **options)
+                logging.info(f"已导出 ONNX 模型：{fp32_path}")
+            path = fp32_path
+            if self.quantize:
+                path = fp32_path.replace(".onnx", ".int8.onnx")
+                if not os.path.exists(path):
+                    quantize_int8(fp32_path, path)
+                    logging.info(f"已生成 int8 量化模型：{path}")
+            self.session = _create_session(path, self.threads)
+
+        def _run(self, args):
+            feeds = {f"input_{i}": a.detach().cpu().numpy() for i, a in enumerate(args)}
+            outputs = [torch.from_numpy(o) for o in self.session.run(None, feeds)]
+            return outputs[0] if self.single_output else tuple(outputs)
+
+        def forward(self, *args, **kwargs):
+            if self.failed or kwargs or not all(torch.is_tensor(a) for a in args):
+                return self.torch_module(*args, **kwargs)
+
+            if self.session is None:
+                with torch.no_grad():
+                    reference = self.torch_module(*args)
+                try:
+                    self._export(args, reference)
+                    self.parity = parity_stats(_flatten(reference)[0], _flatten(self._run(args))[0])
+                    logging.info(f"ONNX 子模型 {self.model_name} 与 PyTorch 输出差异：{self.parity}")
+                except Exception as e:
+                    logging.warning(f"子模型 {self.model_name} 无法使用 ONNX Runtime，继续使用 PyTorch：{e}")
+                    self.failed = True
+                return reference
+
+            start = time.perf_counter()
+            try:
+                output = self._run(args)
+            except Exception as e:
+                logging.warning(f"ONNX Runtime 推理失败（{self.model_name}），退回 PyTorch：{e}")
+                self.failed = True
+                return self.torch_module(*args)
+            self.calls += 1
+            self.seconds += time.perf_counter() - start
+            return output
+
+    return OnnxModule
+
+
+def parity_stats(reference, candidate):
+    """逐个输出比较 PyTorch 与 ONNX Runtime 结果：最大/平均绝对误差与余弦相似度（取所有输出中最差的值）。"""
+    max_abs, mean_abs, cosine = 0.0, 0.0, 1.0
+    for r, c in zip(reference, candidate):
+        r = r.detach().cpu().numpy().astype(np.float64).ravel()
+        c = c.detach().cpu().numpy().astype(np.float64).ravel()
+        if r.shape != c.shape:
+            return {"shape_mismatch": True}
+        if not r.size:
+            continue
+        diff = np.abs(r - c)
+        max_abs = max(max_abs, float(diff.max()))
+        mean_abs = max(mean_abs, float(diff.mean()))
+        denom = np.linalg.norm(r) * np.linalg.norm(c)
+        if denom > 0:
+            cosine = min(cosine, float(r @ c / denom))
+    return {"max_abs_diff": round(max_abs, 6), "mean_abs_diff": round(mean_abs, 6), "min_cosine": round(cosine, 6)}
+
+
+def weights_fingerprint(module):
+    """模型参数的摘要，用作 ONNX 缓存文件名的一部分：权重变化（换模型或升级 Py-Feat）时自动重新导出。"""
+    digest = hashlib.sha1()
+    for key, tensor in module.state_dict().items():
+        digest.update(key.encode())
+        digest.update(tensor.detach().cpu().numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+def _targets(names):
+    keywords = []
+    for name in names:
+        if name not in ONNX_TARGETS:
+            raise ValueError(f"未知的 ONNX 子模型：{name}，可选：{', '.join(ONNX_TARGETS)}")
+        keywords.extend(ONNX_TARGETS[name])
+    return keywords
+
+
+def _find_modules(detector, keywords):
+    """在 Detector 及其子对象的属性中查找名称包含关键字的 PyTorch 模块，返回 [(名称, 所属对象, 属性名, 模块)]。"""
+    import torch
+
+    found = []
+    for attr, value in list(vars(detector).items()):
+        if not any(k in attr for k in keywords):
+            continue
+        if isinstance(value, torch.nn.Module):
+            found.append((attr, detector, attr, value))
+        elif hasattr(value, "__dict__"):
+            # Py-Feat 常把网络包在普通对象里（如 emotion_model.model）
+            for sub, module in list(vars(value).items()):
+                if isinstance(module, torch.nn.Module):
+                    found.append((f"{attr}.{sub}", value, sub, module))
+    return found
+
+
+def enable_onnx(detector, backend="onnx", models=("emotion", "face", "landmark"), cache_dir="outputs/onnx", threads=0):
+    """
+    把 Detector 中指定子模型替换为 ONNX Runtime 推理（backend 为 onnx 或 onnx-int8，后者对情绪模型做 int8 动态量化），
+    返回被替换的子模型名称。
+    首次推理时按真实输入导出模型并缓存到 cache_dir（文件名含权重摘要），之后直接加载缓存；需要安装 onnx 与 onnxruntime。
+    """
+    if backend == "torch":
+        return []
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的推理后端：{backend}，可选：{', '.join(BACKENDS)}")
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        logging.warning("未安装 onnxruntime，继续使用 PyTorch 推理。")
+        return []
+
+    OnnxModule = _make_wrapper_class()
+    int8_keywords = _targets(INT8_MODELS) if backend == "onnx-int8" else []
+    wrapped = []
+    for name, owner, attr, module in _find_modules(detector, _targets(models)):
+        if isinstance(module, OnnxModule):
+            continue
+        path = os.path.join(cache_dir, f"{name.replace('.', '_')}_{type(module).__name__}_{weights_fingerprint(module)}.onnx")
+        setattr(owner, attr, OnnxModule(name, module, path, quantize=any(k in name for k in int8_keywords), threads=threads))
+        wrapped.append(name)
+    if wrapped:
+        logging.info(f"使用 ONNX Runtime（{backend}）推理子模型：{', '.join(wrapped)}")
+    else:
+        logging.warning("未找到可替换为 ONNX 的子模型，继续使用 PyTorch 推理。")
+    return wrapped
+
+
+def onnx_report(detector):
+    """汇总各 ONNX 子模型的状态、与 PyTorch 的输出差异和推理耗时。"""
+    report = {}
+    for obj in [detector] + [v for v in vars(detector).values() if hasattr(v, "__dict__")]:
+        for value in vars(obj).values():
+            if type(value).__name__ == "OnnxModule":
+                report[value.model_name] = {
+                    "status": "torch_fallback" if value.failed else ("onnx" if value.session else "not_run"),
+                    "int8": value.quantize,
+                    "parity": value.parity,
+                    "calls": value.calls,
+                    "mean_ms": round(value.seconds / value.calls * 1000, 3) if value.calls else None,
+                }
+    return report
@@ -1,18 +1,212 @@
+import sys
 import argparse
 
-def parse_arguments():
-    """解析命令行参数"""
-    parser = argparse.ArgumentParser(description="基于 Py-Feat 的视频面部表情分析工具（生成报告）")
+# 子命令：run 为完整流程（兼容旧的直接传入视频路径的用法），其余三个阶段通过结果文件衔接
+SUBCOMMANDS = ("run", "detect", "plot", "report", "annotate", "identify", "batch", "serve")
+
+def _add_detect_arguments(parser):
+    """检测阶段参数"""
     parser.add_argument("video_path", help="待分析视频文件的路径")
+    parser.add_argument("--output_csv", default="outputs/facial_expression_analysis.csv", help="检测结果文件路径（.csv、.parquet，或 .colstore 列式存储目录）")
+    _add_detect_options(parser)
+
+def _add_detect_options(parser):
+    """检测参数（单个视频与批处理通用）"""
     parser.add_argument("--process_sampling_rate", type=int, default=10, help="每隔多少帧进行一次情绪检测（默认 10 帧）")
-    parser.add_argument("--output_csv", default="outputs/facial_expression_analysis.csv", help="CSV 文件名称")
-    parser.add_argument("--start_frame", type=int, default=None, help="图表分析的起始帧")
-    parser.add_argument("--end_frame", type=int, default=None, help="图表分析的结束帧")
+    parser.add_argument("--multi_face", action="store_true", help="是否启用多张人脸分析模式（默认关闭，仅分析每帧中置信度最高的人脸）")
+    parser.add_argument("--features", type=str, default="all",
+                        help="需要的分析类别，逗号分隔：emotion、aus、landmarks、pose、identity，或 all（默认）；只做情绪分析时用 emotion 可跳过未用到的子模型")
+    parser.add_argument("--max_side", type=int, default=None,
+                        help="检测前将帧的长边缩放到不超过该像素数（如 1280），人脸框与关键点会换算回原始坐标；默认不缩放")
+    parser.add_argument("--start_time", type=float, default=None,
+                        help="检测的起始时间（秒），按视频帧率换算为帧号；同时给出 --start_frame 时以 --start_frame 为准")
+    parser.add_argument("--end_time", type=float, default=None,
+                        help="检测的结束时间（秒），按视频帧率换算为帧号；同时给出 --end_frame 时以 --end_frame 为准")
+    parser.add_argument("--decoder", type=str, default="auto", choices=["auto", "pyav", "opencv"],
+                        help="视频解码后端：auto（默认，优先 PyAV 多线程解码，未安装时使用 OpenCV）、pyav 或 opencv")
+    parser.add_argument("--decode_threads", type=int, default=0, help="PyAV 解码线程数（默认 0，自动按 CPU 核数）")
+    parser.add_argument("--keyframes_only", action="store_true", help="只解码并分析关键帧（需要 PyAV），忽略 process_sampling_rate")
+    _add_backend_argument(parser)
+    parser.add_argument("--face_cache", action="store_true",
+                        help="人脸裁剪与之前分析过的几乎相同（感知哈希相近）时复用缓存的检测结果，跳过模型推理；适合画面基本静止的视频")
+    parser.add_argument("--face_cache_distance", type=int, default=5,
+                        help="判定为同一人脸裁剪的最大汉明距离（64 位感知哈希，默认 5）")
+    parser.add_argument("--face_cache_max_age", type=int, default=30,
+                        help="缓存结果最多被复用多少个分析帧，之后强制重新推理（默认 30）")
+    parser.add_argument("--face_cache_size", type=int, default=256, help="人脸结果缓存的最大条目数（默认 256）")
+    parser.add_argument("--incremental", action="store_true",
+                        help="复用结果文件中已分析过的帧（按旁边的 .frames.json 帧清单），只分析缺少的帧并按帧号合并；"
+                             "例如先用 --process_sampling_rate 30 快速浏览，再用 10 补齐")
+    parser.add_argument("--keep", type=str, default="all",
+                        help="结果中保留的列分组，逗号分隔：emotions、aus、landmarks、pose、box、identity，或 all（默认）；绘图只需 emotions")
+
+def _add_backend_argument(parser):
+    parser.add_argument("--backend", type=str, default="torch", choices=["torch", "onnx", "onnx-int8"],
+                        help="推理后端：torch（默认）、onnx 或 onnx-int8（ONNX Runtime CPU 推理，int8 为动态量化，需要 onnx 与 onnxruntime）")
+
+def _add_results_argument(parser):
+    """plot / report 阶段读取的检测结果文件"""
+    parser.add_argument("--results", default="outputs/facial_expression_analysis.csv", help="detect 阶段输出的检测结果文件（.csv、.parquet 或 .colstore）")
+
+def _add_range_arguments(parser):
+    """帧范围参数（检测与绘图共用）"""
+    parser.add_argument("--start_frame", type=int, default=None,
+                        help="分析的起始帧（含）：检测时直接定位到该帧开始解码，图表只统计该帧之后的数据")
+    parser.add_argument("--end_frame", type=int, default=None,
+                        help="分析的结束帧（含）：检测时解码到该帧即停止，图表只统计该帧之前的数据")
+
+def _add_chart_arguments(parser):
+    """绘图阶段参数"""
     parser.add_argument("--fps", type=float, default=30, help="视频帧率（用于帧与秒的转换），默认为30")
     parser.add_argument("--method", type=str, default="tsne", choices=["tsne", "umap"], help="降维方法：tsne或umap（默认tsne）")
     parser.add_argument("--cluster_sampling_rate", type=int, default=5, help="用于聚类图绘制阶段的帧采样率")
     parser.add_argument("--perplexity", type=float, default=30.0, help="t-SNE的perplexity参数（默认30）")
     parser.add_argument("--n_neighbors", type=int, default=15, help="UMAP 降维中使用的邻居数量，默认为自动推导")
+    parser.add_argument("--heatmap_bins", type=int, default=None, help="热力图时间桶数量（默认按图宽像素自动确定）")
+    parser.add_argument("--heatmap_agg", type=str, default="mean", choices=["mean", "max"], help="热力图桶内聚合方式：mean 或 max（默认 mean）")
+    parser.add_argument("--embedding_cache_dir", type=str, default=None, help="聚类图降维结果的磁盘缓存目录（默认仅进程内缓存）；应为可信的专用目录：其中的 .npy/.npz 会被读取，"
+                             "总大小超过 256 MB 时删除最旧的缓存文件")
+    parser.add_argument("--incremental_embedding", action="store_true", help="将新的帧范围投影到已拟合的降维嵌入中，而不重新拟合")
+
+def _add_plot_output_argument(parser, default):
+    parser.add_argument("--plot_dir", type=str, default=default, help="图表输出目录；不指定时弹窗展示图表")
+
+def _add_report_arguments(parser):
+    """报告阶段参数"""
     parser.add_argument("--output_pdf", type=str, default="outputs/emotion_report.pdf", help="输出 PDF 报告的路径（默认 outputs/emotion_report.pdf）")
-    parser.add_argument("--multi_face", action="store_true", help="是否启用多张人脸分析模式（默认关闭，仅分析每帧中置信度最高的人脸）")
-    return parser.parse_args()
\ No newline at end of file
+    parser.add_argument("--report_image_format", type=str, default="png", choices=["png", "jpeg", "svg"], help="PDF 报告中图表的格式：png、jpeg（压缩）或 svg（矢量，需要 svglib），默认 png")
+    parser.add_argument("--report_jpeg_quality", type=int, default=85, help="report_image_format 为 jpeg 时的压缩质量（1-95，默认 85）")
+
+def _add_annotate_options(parser):
+    """带标注视频导出参数（annotate 子命令与批处理通用）"""
+    parser.add_argument("--segments", type=int, default=0,
+                        help="把视频切成多少段并行渲染、编码后再拼接（需要 PyAV）；0 为按视频长度自动分段（默认），1 为不分段")
+    parser.add_argument("--segment_workers", type=int, default=None, help="并行渲染分段的进程数（默认与段数相同，不超过 CPU 核数）")
+    parser.add_argument("--top_aus", type=int, default=3, help="每张人脸旁显示激活最高的 AU 个数（默认 3，0 为不显示）")
+    parser.add_argument("--max_gap", type=int, default=None,
+                        help="相邻采样帧相距不超过该帧数时插值，否则视为人脸消失（默认为采样间隔的 2 倍）")
+    parser.add_argument("--codec", type=str, default="mp4v", help="输出视频的 FourCC 编码（默认 mp4v）")
+
+def _add_annotate_arguments(parser):
+    """annotate 子命令参数"""
+    parser.add_argument("video_path", help="原始视频文件的路径")
+    parser.add_argument("--output_video", default="outputs/annotated.mp4", help="带标注视频的输出路径（默认 outputs/annotated.mp4）")
+    parser.add_argument("--decoder", type=str, default="auto", choices=["auto", "pyav", "opencv"],
+                        help="视频解码后端：auto（默认）、pyav 或 opencv")
+    _add_annotate_options(parser)
+
+def _add_identify_arguments(parser):
+    """identify 子命令参数"""
+    parser.add_argument("video_path", help="原始视频文件的路径（用于截取人脸）")
+    parser.add_argument("--reference", required=True, help="参考人脸图片的路径（要查找的人）")
+    parser.add_argument("--model_name", type=str, default="VGG-Face", help="DeepFace 人脸识别模型（默认 VGG-Face，与 DeepFace.verify 一致）")
+    parser.add_argument("--threshold", type=float, default=None, help="判定为同一人的最大余弦距离（默认使用 DeepFace 对该模型的阈值）")
+    parser.add_argument("--crops", type=int, default=3, help="每条人脸轨迹用于提取特征的代表帧数（默认 3）")
+    parser.add_argument("--track_iou", type=float, default=0.3, help="相邻采样帧人脸框 IoU 不低于该值时连成同一条轨迹（默认 0.3）")
+    parser.add_argument("--max_gap", type=int, default=None, help="轨迹允许中断的最大帧数（默认为采样间隔的 2 倍）")
+    parser.add_argument("--merge_gap", type=float, default=2.0, help="间隔不超过该秒数的出现时间段合并为一段（默认 2 秒）")
+    parser.add_argument("--decoder", type=str, default="auto", choices=["auto", "pyav", "opencv"],
+                        help="视频解码后端：auto（默认）、pyav 或 opencv")
+    parser.add_argument("--output_intervals", default="outputs/identity_intervals.csv",
+                        help="出现时间段表的输出路径，轨迹表写在同名 .tracks.csv（默认 outputs/identity_intervals.csv）")
+    parser.add_argument("--output_results", default=None,
+                        help="只含该人的逐帧检测结果的输出路径（.csv 或 .parquet），可作为 plot / report 的 --results；默认不输出")
+
+def _add_batch_arguments(parser):
+    """批处理参数"""
+    parser.add_argument("inputs", help="视频目录（递归查找视频文件），或清单文件（每行一个路径，或含 video_path 列的 .csv）")
+    parser.add_argument("--output_root", type=str, default="outputs/batch", help="批处理输出根目录，每个视频一个子目录，并写出 index.csv / index.json 汇总（默认 outputs/batch）")
+    parser.add_argument("--workers", type=int, default=1, help="并行工作进程数，每个进程只加载一次检测器（默认 1）")
+    parser.add_argument("--stages", type=str, default="detect,plot,report", help="每个视频执行的阶段，逗号分隔：detect、plot、report、annotate（默认 detect,plot,report）")
+    parser.add_argument("--results_format", type=str, default="csv", choices=["csv", "parquet", "colstore"], help="每个视频检测结果文件的格式（默认 csv；colstore 为按列内存映射的目录）")
+
+def _add_serve_arguments(parser):
+    """推理服务参数"""
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="HTTP 监听地址（默认 127.0.0.1，仅本机可访问）")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP 监听端口（默认 8765）")
+    parser.add_argument("--unix_socket", type=str, default=None, help="改为监听 Unix 套接字路径（指定后忽略 host/port）")
+    parser.add_argument("--features", type=str, default="all", help="Py-Feat 检测器的分析类别（同 detect 的 --features）")
+    _add_backend_argument(parser)
+    parser.add_argument("--deepface_actions", type=str, default="emotion",
+                        help="常驻的 DeepFace 分析项，逗号分隔：emotion、age、gender、race（默认 emotion；为空则不加载 DeepFace）")
+    parser.add_argument("--max_batch", type=int, default=8, help="微批次最多合并的请求数（默认 8）")
+    parser.add_argument("--max_latency_ms", type=float, default=20, help="微批次收集请求的延迟预算（毫秒，默认 20）")
+
+def _add_profile_arguments(parser):
+    """性能分析参数（所有子命令通用）"""
+    parser.add_argument("--profile", action="store_true", help="记录各阶段的墙钟/CPU 时间、调用次数和内存变化，并输出 JSON 汇总")
+    parser.add_argument("--profile_json", type=str, default="outputs/profile.json", help="阶段耗时汇总 JSON 路径（默认 outputs/profile.json）")
+    parser.add_argument("--profiler", type=str, default="none", choices=["none", "cprofile", "pyinstrument"],
+                        help="配合 --profile 额外输出函数级剖析：cprofile（.prof）或 pyinstrument（.html，需要安装 pyinstrument）")
+
+def parse_arguments(argv=None):
+    """
+    解析命令行参数。
+
+    支持子命令 run / detect / plot / report / annotate / identify / batch / serve；未给出子命令时按 run 处理，
+    因此旧用法 `main videos/xxx.mp4 --fps 30` 保持不变。
+    """
+    parser = argparse.ArgumentParser(description="基于 Py-Feat 的视频面部表情分析工具（生成报告）")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="完整流程：检测 + 绘图 + 生成报告（默认）")
+    _add_detect_arguments(run_parser)
+    _add_range_arguments(run_parser)
+    _add_chart_arguments(run_parser)
+    _add_plot_output_argument(run_parser, default=None)
+    _add_report_arguments(run_parser)
+    _add_profile_arguments(run_parser)
+
+    detect_parser = subparsers.add_parser("detect", help="仅检测：分析视频并写出检测结果文件")
+    _add_detect_arguments(detect_parser)
+    _add_range_arguments(detect_parser)
+    _add_profile_arguments(detect_parser)
+
+    plot_parser = subparsers.add_parser("plot", help="仅绘图：从检测结果文件生成图表")
+    _add_results_argument(plot_parser)
+    _add_range_arguments(plot_parser)
+    _add_chart_arguments(plot_parser)
+    _add_plot_output_argument(plot_parser, default="outputs/charts")
+    _add_profile_arguments(plot_parser)
+
+    report_parser = subparsers.add_parser("report", help="仅生成报告：从检测结果文件生成 PDF 报告")
+    _add_results_argument(report_parser)
+    _add_range_arguments(report_parser)
+    _add_chart_arguments(report_parser)
+    _add_report_arguments(report_parser)
+    _add_profile_arguments(report_parser)
+
+    annotate_parser = subparsers.add_parser("annotate", help="导出带标注的视频：在每一帧绘制人脸框、主情绪与 AU（采样帧之间插值）")
+    _add_results_argument(annotate_parser)
+    _add_annotate_arguments(annotate_parser)
+    _add_range_arguments(annotate_parser)
+    _add_profile_arguments(annotate_parser)
+
+    identify_parser = subparsers.add_parser("identify", help="按参考人脸在视频中查找某人：输出其出现的时间段，可筛选出其情绪时间线")
+    _add_results_argument(identify_parser)
+    _add_identify_arguments(identify_parser)
+    _add_profile_arguments(identify_parser)
+
+    batch_parser = subparsers.add_parser("batch", help="批处理：用进程池分析多个视频，每个视频输出到独立目录")
+    _add_batch_arguments(batch_parser)
+    _add_detect_options(batch_parser)
+    _add_range_arguments(batch_parser)
+    _add_chart_arguments(batch_parser)
+    _add_report_arguments(batch_parser)
+    _add_annotate_options(batch_parser)
+    _add_profile_arguments(batch_parser)
+
+    serve_parser = subparsers.add_parser("serve", help="推理服务：常驻 Py-Feat / DeepFace 模型，通过 HTTP 或 Unix 套接字接收请求")
+    _add_serve_arguments(serve_parser)
+    _add_profile_arguments(serve_parser)
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] not in SUBCOMMANDS and argv[0] not in ("-h", "--help"):
+        argv = ["run"] + list(argv)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        parser.exit(2)
+    return args
@@ -1,8 +1,10 @@
 # 文件：plot_emotion_bar.py
 import logging
 import matplotlib.pyplot as plt
+from .profiling import profiled
 
-def plot_emotion_bar(df, start_frame=None, end_frame=None, save_path=None):
+@profiled()
+def plot_emotion_bar(df, start_frame=None, end_frame=None, save_path=None, figures=None):
     """
     绘制指定帧范围内主导情绪占比的柱状图，支持多张人脸分图输出。
     """
@@ -76,7 +78,9 @@ def plot_emotion_bar(df, start_frame=None, end_frame=None, save_path=None):
         plt.ylabel("出现次数")
         plt.grid(axis='y', linestyle='--', alpha=0.7)
 
-        if save_path:
+        if figures is not None:
+            figures.add("emotion_bar", fid_str if fid is not None else None)
+        elif save_path:
             specific_path = save_path.replace(".png", f"_face{fid_str}.png") if fid is not None else save_path
             plt.savefig(specific_path, bbox_inches='tight')
             logging.info(f"✅ 情绪柱状图已保存至 {specific_path}")
@@ -1,10 +1,26 @@
 import logging
 import matplotlib.pyplot as plt
-from sklearn.manifold import TSNE
 from .parse_arguments import parse_arguments
+from .embedding_cache import reduce_embedding
+from .profiling import profiled
 logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
 
-def plot_emotion_clusters(df, fps, start_frame=None, end_frame=None, method=None, perplexity=None, n_neighbors=None, cluster_sampling_rate=None, save_path=None):
+@profiled()
+def plot_emotion_clusters(df, fps, start_frame=None, end_frame=None, method=None, perplexity=None, n_neighbors=None, cluster_sampling_rate=None, save_path=None,
+                          cache_dir=None, incremental=False, figures=None, source=None):
+    """
+    绘制情绪空间降维聚类图（t-SNE / UMAP），支持多张人脸分图输出。
+
+    降维结果按“采样后的情绪矩阵 + 降维参数”的哈希缓存，相同数据重复绘图时不再拟合。
+
+    参数（新增）：
+    - cache_dir: 降维结果与模型的磁盘缓存目录，为 None 时仅使用进程内缓存
+    - incremental: 若为 True，且该人脸已用同一降维方法拟合过嵌入，则将新帧范围投影到已有嵌入中，
+                   不重新拟合（UMAP 使用 transform，t-SNE 使用近邻插值）
+    - figures: FigureCollector，给出时将图表渲染到内存（供 PDF 报告使用），不再写文件
+    - source: 数据来源标识（如检测结果文件路径），与人脸编号、降维参数一起组成已拟合模型的键，
+              避免共用缓存目录时把一个视频的人脸投影到另一个视频的嵌入中
+    """
     if fps is None or not isinstance(fps, (int, float)) or fps <= 0:
         logging.warning("无效的 fps 参数，使用默认值 30")
         fps = 30
@@ -107,7 +123,7 @@ def plot_emotion_clusters(df, fps, start_frame=None, end_frame=None, method=None
             if n_samples <= 5:
                 logging.warning(f"⚠️ 样本数过小（n={n_samples}），跳过降维可视化")
                 continue
-            reducer = TSNE(n_components=2, perplexity=perplexity, random_state=42)
+            reduce_method, reduce_params = "tsne", {"perplexity": perplexity}
 
         elif method == "umap" and UMAP is not None:
             logging.info(f"使用umap进行降维")
@@ -121,13 +137,22 @@ def plot_emotion_clusters(df, fps, start_frame=None, end_frame=None, method=None
             if n_samples <= 5:
                 logging.warning(f"⚠️ 样本数过小（n={n_samples}），跳过降维可视化")
                 continue
-            reducer = UMAP(n_components=2, n_neighbors=n_neighbors, random_state=42)
+            reduce_method, reduce_params = "umap", {"n_neighbors": n_neighbors}
 
         else:
             logging.warning("无效的 method 参数或未安装 UMAP，默认使用 t-SNE")
-            reducer = TSNE(n_components=2, perplexity=perplexity, random_state=42)
+            if perplexity is None or perplexity >= n_samples:
+                perplexity = min(30, max(5, n_samples // 3))
+            reduce_method, reduce_params = "tsne", {"perplexity": perplexity}
 
-        X_reduced = reducer.fit_transform(X)
+        X_reduced = reduce_embedding(
+            X,
+            method=reduce_method,
+            params=reduce_params,
+            model_key=(source, fid_str, reduce_method, tuple(sorted(reduce_params.items())), tuple(available_emotions)),
+            incremental=incremental,
+            cache_dir=cache_dir
+        )
 
         plt.figure(figsize=(8, 6))
         for emotion in available_emotions:
@@ -151,7 +176,9 @@ def plot_emotion_clusters(df, fps, start_frame=None, end_frame=None, method=None
         plt.ylabel("Dimension 2")
         plt.legend(loc="best", fontsize=10)
 
-        if save_path:
+        if figures is not None:
+            figures.add("emotion_clusters", fid_str if fid is not None else None)
+        elif save_path:
             specific_path = save_path.replace(".png", f"_face{fid_str}.png") if fid is not None else save_path
             plt.savefig(specific_path, bbox_inches='tight')
             logging.info(f"✅ 聚类图已保存至 {specific_path}")
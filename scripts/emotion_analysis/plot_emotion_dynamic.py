@@ -1,16 +1,27 @@
 import logging
 import numpy as np
 import plotly.graph_objects as go
+from .downsample import downsample_columns
+from .profiling import profiled
 
-def plot_emotion_dynamic(df, fps, save_path=None):
+@profiled()
+def plot_emotion_dynamic(df, fps, save_path=None, max_points=5400, pixel_width=None, downsample_method="lttb"):
     """
-    绘制情绪随时间变化图，支持多张人脸数据，每张人脸生成一个 HTML 图表。
+    绘制情绪随时间变化的交互式看板：所有人脸写入同一个 HTML，
+    通过下拉框切换人脸，同一时间只显示一张人脸的曲线。
+
+    曲线使用 WebGL（Scattergl）渲染，数值以 float32 / int32 数组传入
+    （plotly >= 6 会将其编码为 base64 类型化数组，而非逐个数字的 JSON 列表），
+    长视频、多人脸时文件体积和浏览器加载时间都大幅下降。
 
     参数：
       df  : 包含视频帧和情绪数据的 DataFrame，必须包含 'frame' 列；
             若存在 'second' 列则直接使用，否则按 fps 计算秒数。
       fps : 帧率；若无效（None、非数字或非正数）则使用默认值 30。
-      save_path : 保存 HTML 路径；如包含多张人脸，将在文件名中追加 face_id。
+      save_path : 保存 HTML 路径；为 None 时直接展示。
+      max_points : 每张人脸的最大绘图点数，超过时做保形下采样（None 表示不下采样）。
+      pixel_width : 图表像素宽度预算，给出时每条曲线最多保留 2 × pixel_width 个点。
+      downsample_method : "lttb"（默认）或 "minmax"。
     """
     if fps is None or not isinstance(fps, (int, float)) or fps <= 0:
         logging.warning("无效的 fps 参数，使用默认值 30")
@@ -32,88 +43,138 @@ def plot_emotion_dynamic(df, fps, save_path=None):
         "disgust": "green",
         "neutral": "gray"
     }
+    emotion_cols = [e for e in emotion_colors if e in df.columns]
+    if not emotion_cols:
+        logging.warning("未在数据中找到情绪列，无法绘制动态折线图。")
+        return
 
     face_ids = df["face_id"].unique() if "face_id" in df.columns else [None]
 
+    fig = go.Figure()
+    # 每张人脸对应的 (trace 起止下标, 下拉框标签, 该人脸的坐标轴刻度)
+    face_views = []
+    num_ticks = 10
+
     for fid in face_ids:
         if fid is not None:
-            df_sub = df[df["face_id"] == fid].copy()
-            fid_str = str(int(fid))
-            suffix = f"_face{fid_str}"
+            df_sub = df[df["face_id"] == fid]
+            label = f"Face {int(fid)}"
         else:
-            df_sub = df.copy()
-            suffix = ""
-
-        fig = go.Figure()
-
-        for emotion, color in emotion_colors.items():
-            if emotion in df_sub.columns:
-                customdata = np.stack((df_sub["frame"],), axis=-1)
-                fig.add_trace(go.Scatter(
-                    x=df_sub["second"],
-                    y=df_sub[emotion],
-                    mode='lines',
-                    name=emotion,
-                    line=dict(color=color, width=2),
-                    customdata=customdata,
-                    hovertemplate=(
-                        f"情绪: {emotion}<br>" +
-                        "秒: %{x:.2f}<br>" +
-                        "帧: %{customdata[0]}<br>" +
-                        "强度: %{y:.2f}<extra></extra>"
-                    )
-                ))
-
-        second_min = df_sub["second"].min()
-        second_max = df_sub["second"].max()
-        num_ticks = 10
-        sec_ticks = np.linspace(second_min, second_max, num_ticks)
+            df_sub = df
+            label = "Face"
+
+        if df_sub.empty:
+            continue
+
+        df_sub = df_sub.sort_values("second", kind="stable")
+        seconds = df_sub["second"].to_numpy(dtype=np.float32)
+        frames = df_sub["frame"].to_numpy(dtype=np.int32)
+        values = df_sub[emotion_cols].to_numpy(dtype=np.float32)
+        # 每条曲线各自保形下采样（各 trace 拥有独立的 x），避免取并集后点数膨胀
+        keep = downsample_columns(seconds, values, max_points=max_points,
+                                  pixel_width=pixel_width, method=downsample_method)
+        first_trace = len(fig.data)
+        visible = not face_views
+
+        for j, emotion in enumerate(emotion_cols):
+            idx = keep[j] if keep is not None else slice(None)
+            fig.add_trace(go.Scattergl(
+                x=seconds[idx],
+                y=values[idx, j],
+                mode='lines',
+                name=emotion,
+                legendgroup=emotion,
+                visible=visible,
+                line=dict(color=emotion_colors[emotion], width=2),
+                customdata=frames[idx],
+                hovertemplate=(
+                    f"{label}<br>" +
+                    f"情绪: {emotion}<br>" +
+                    "秒: %{x:.2f}<br>" +
+                    "帧: %{customdata}<br>" +
+                    "强度: %{y:.2f}<extra></extra>"
+                )
+            ))
+
+        sec_ticks = np.linspace(float(seconds.min()), float(seconds.max()), num_ticks)
+        face_views.append((first_trace, len(fig.data), label, sec_ticks))
+
+    if not face_views:
+        logging.warning("无可绘制的人脸数据，跳过动态折线图。")
+        return
+
+    def axis_update(sec_ticks):
         frame_ticks = sec_ticks * fps
+        return {
+            "xaxis.tickvals": sec_ticks.tolist(),
+            "xaxis.ticktext": [f"{s:.2f}" for s in sec_ticks],
+            "xaxis2.tickvals": sec_ticks.tolist(),
+            "xaxis2.ticktext": [str(int(f)) for f in frame_ticks],
+        }
 
-        fig.update_layout(
-            title=f"情绪随时间（秒 & 帧）变化{suffix}",
-            xaxis=dict(
-                title='秒',
-                tickvals=sec_ticks,
-                ticktext=[f"{s:.2f}" for s in sec_ticks],
-                rangeslider=dict(visible=True),
-                type='linear',
-                showgrid=True,
-                zeroline=True,
-                zerolinecolor='LightPink'
-            ),
-            xaxis2=dict(
-                title='帧',
-                tickvals=sec_ticks,
-                ticktext=[str(int(f)) for f in frame_ticks],
-                overlaying='x',
-                side='top',
-                showgrid=False,
-                zeroline=False,
-                showline=True,
-                linecolor='black',
-                ticks='outside'
-            ),
-            yaxis=dict(
-                title='情绪强度',
-                showgrid=True,
-                zeroline=True,
-                zerolinecolor='LightPink'
-            ),
-            legend=dict(
-                title="情绪",
-                orientation="h",
-                x=0.5,
-                xanchor="center",
-                y=-0.2
-            ),
-            hovermode="x unified",
-            template='plotly_white'
-        )
-
-        if save_path:
-            final_path = save_path.replace(".html", f"{suffix}.html") if fid is not None else save_path
-            fig.write_html(final_path, include_plotlyjs='cdn')
-            logging.info(f"动态情绪折线图已保存为 HTML：{final_path}")
-        else:
-            fig.show()
\ No newline at end of file
+    n_traces = len(fig.data)
+    buttons = []
+    for start, end, label, sec_ticks in face_views:
+        visible = [start <= i < end for i in range(n_traces)]
+        layout_update = {"title.text": f"情绪随时间（秒 & 帧）变化 - {label}"}
+        layout_update.update(axis_update(sec_ticks))
+        buttons.append(dict(label=label, method="update", args=[{"visible": visible}, layout_update]))
+
+    _, _, first_label, first_ticks = face_views[0]
+    initial_axes = axis_update(first_ticks)
+
+    fig.update_layout(
+        title=f"情绪随时间（秒 & 帧）变化 - {first_label}",
+        xaxis=dict(
+            title='秒',
+            tickvals=initial_axes["xaxis.tickvals"],
+            ticktext=initial_axes["xaxis.ticktext"],
+            rangeslider=dict(visible=True),
+            type='linear',
+            showgrid=True,
+            zeroline=True,
+            zerolinecolor='LightPink'
+        ),
+        xaxis2=dict(
+            title='帧',
+            tickvals=initial_axes["xaxis2.tickvals"],
+            ticktext=initial_axes["xaxis2.ticktext"],
+            overlaying='x',
+            side='top',
+            showgrid=False,
+            zeroline=False,
+            showline=True,
+            linecolor='black',
+            ticks='outside'
+        ),
+        yaxis=dict(
+            title='情绪强度',
+            showgrid=True,
+            zeroline=True,
+            zerolinecolor='LightPink'
+        ),
+        legend=dict(
+            title="情绪",
+            orientation="h",
+            x=0.5,
+            xanchor="center",
+            y=-0.2
+        ),
+        updatemenus=[dict(
+            buttons=buttons,
+            direction="down",
+            showactive=True,
+            x=0.0,
+            xanchor="left",
+            y=1.15,
+            yanchor="top"
+        )] if len(buttons) > 1 else [],
+        hovermode="x unified",
+        template='plotly_white'
+    )
+
+    if save_path:
+        fig.write_html(save_path, include_plotlyjs='cdn')
+        logging.info(f"动态情绪看板已保存为 HTML（{len(face_views)} 张人脸）：{save_path}")
+    else:
+        fig.show()
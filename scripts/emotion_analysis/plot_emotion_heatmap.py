@@ -1,8 +1,41 @@
 import logging
 import numpy as np
 import matplotlib.pyplot as plt
+from .profiling import profiled
 
-def plot_emotion_heatmap(df, fps, save_path=None):
+def bin_emotion_matrix(frames, values, n_bins, agg="mean"):
+    """
+    将按帧排列的情绪强度聚合到固定数量的时间桶中。
+
+    参数：
+    - frames: 升序排列的帧号数组，长度 n
+    - values: (n, k) 情绪强度矩阵
+    - n_bins: 时间桶数量
+    - agg: 桶内聚合方式，"mean" 或 "max"
+
+    返回：
+    - binned: (n_bins, k) 聚合后的矩阵，无数据的桶为 NaN
+    - edges: 长度 n_bins + 1 的桶边界（帧）
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    edges = np.linspace(frames[0], frames[-1], n_bins + 1)
+    # 每个桶在（已排序的）行中的起始位置；最后一个桶包含右端点
+    starts = np.searchsorted(frames, edges[:-1], side="left")
+    ends = np.append(starts[1:], len(frames))
+    counts = ends - starts
+    non_empty = counts > 0
+
+    binned = np.full((n_bins, values.shape[1]), np.nan)
+    if agg == "max":
+        reduced = np.maximum.reduceat(values, starts[non_empty], axis=0)
+    else:
+        reduced = np.add.reduceat(values, starts[non_empty], axis=0) / counts[non_empty, None]
+    binned[non_empty] = reduced
+    return binned, edges
+
+@profiled()
+def plot_emotion_heatmap(df, fps, save_path=None, n_bins=None, bin_agg="mean", figures=None):
     # 若传入的 fps 无效，则使用默认值30
     if not fps or fps <= 0:
         logging.warning("fps 参数，使用默认值 30。")
@@ -15,7 +48,13 @@ def plot_emotion_heatmap(df, fps, save_path=None):
     - df: DataFrame，包含 "frame" 和情绪列（可选含 "face_id"）
     - fps: 视频帧率
     - save_path: 图片保存路径，若为 None 则直接展示
+    - n_bins: 时间桶数量；默认按图宽像素数自动确定，使渲染开销只取决于输出分辨率而非视频长度
+    - bin_agg: 桶内聚合方式，"mean"（默认）或 "max"（保留短时峰值）
+    - figures: FigureCollector，给出时将图表渲染到内存（供 PDF 报告使用），不再写文件
     """
+    if bin_agg not in ("mean", "max"):
+        logging.warning(f"未知的聚合方式 {bin_agg}，使用 mean。")
+        bin_agg = "mean"
 
     emotion_colors = {
         "anger": "red",
@@ -49,15 +88,26 @@ def plot_emotion_heatmap(df, fps, save_path=None):
         if df_sub.empty:
             continue
 
-        heatmap_data = df_sub[available_emotions].to_numpy().T
+        df_sub = df_sub.sort_values("frame", kind="stable")
         frame_min = df_sub["frame"].min()
         frame_max = df_sub["frame"].max()
-        extent = [frame_min, frame_max, 0, len(available_emotions)]
 
         plt.rcParams['font.sans-serif'] = ['SimHei']
         plt.rcParams['axes.unicode_minus'] = False
 
-        fig, ax = plt.subplots(figsize=(15, 5))
+        figsize = (15, 5)
+        bins = n_bins if n_bins else int(figsize[0] * plt.rcParams["figure.dpi"])
+        if len(df_sub) > bins and frame_max > frame_min:
+            binned, edges = bin_emotion_matrix(df_sub["frame"].to_numpy(), df_sub[available_emotions].to_numpy(),
+                                               bins, agg=bin_agg)
+            heatmap_data = np.ma.masked_invalid(binned.T)
+            logging.info(f"热力图按时间分桶：{len(df_sub)} 行 → {bins} 个桶（{bin_agg}），"
+                         f"桶宽 {edges[1] - edges[0]:.1f} 帧 / {(edges[1] - edges[0]) / fps:.2f} 秒")
+        else:
+            heatmap_data = df_sub[available_emotions].to_numpy().T
+        extent = [frame_min, frame_max, 0, len(available_emotions)]
+
+        fig, ax = plt.subplots(figsize=figsize)
         im = ax.imshow(heatmap_data, aspect="auto", cmap="YlOrRd",
                        interpolation="nearest", extent=extent, origin='lower')
         cbar = plt.colorbar(im, ax=ax)
@@ -79,7 +129,9 @@ def plot_emotion_heatmap(df, fps, save_path=None):
         secax.set_xlabel("秒", fontsize=12)
 
         plt.tight_layout()
-        if save_path:
+        if figures is not None:
+            figures.add("emotion_heatmap", fid_str if fid is not None else None)
+        elif save_path:
             specific_path = save_path.replace(".png", f"_face{fid_str}.png") if fid is not None else save_path
             plt.savefig(specific_path, bbox_inches='tight')
             logging.info(f"✅ 热力图已保存至 {specific_path}")
@@ -1,8 +1,11 @@
 import logging
 import numpy as np
 import matplotlib.pyplot as plt
+from .downsample import downsample_columns
+from .profiling import profiled
 
-def plot_emotion_line(df, fps, max_points=5400, save_path=None):
+@profiled()
+def plot_emotion_line(df, fps, max_points=5400, save_path=None, pixel_width=None, downsample_method="lttb", figures=None):
     # 若传入的 fps 无效，则使用默认值30
     if not fps or fps <= 0:
         logging.warning("fps 参数，使用默认值 30。")
@@ -14,7 +17,11 @@ def plot_emotion_line(df, fps, max_points=5400, save_path=None):
     参数：
     - df: DataFrame，包含 "frame"、"face_id" 列和多个情绪列
     - max_points: 最大绘图点数，用于长视频数据下采样
+    - pixel_width: 绘图区像素宽度预算，给出时每条曲线最多保留 2 × pixel_width 个点
+      （max_points 同样按每条曲线计）
+    - downsample_method: 下采样方法，"lttb"（默认，保留形状与尖峰）或 "minmax"（每桶保留极值）
     - save_path: 保存路径，若为 None 则不保存图像
+    - figures: FigureCollector，给出时将图表渲染到内存（供 PDF 报告使用），不再写文件
     """
 
     emotions = [
@@ -58,15 +65,21 @@ def plot_emotion_line(df, fps, max_points=5400, save_path=None):
             title_suffix = ""
 
 
-        if len(sub_df) > max_points:
-            ds_rate = len(sub_df) // max_points
-            sub_df = sub_df.iloc[::ds_rate].reset_index(drop=True)
+        # 每条情绪曲线各自保形下采样，保留短时尖峰
+        sub_df = sub_df.sort_values("frame", kind="stable")
+        frames = sub_df["frame"].to_numpy()
+        keep = downsample_columns(frames, sub_df[available_emotions].to_numpy(dtype=float),
+                                  max_points=max_points, pixel_width=pixel_width, method=downsample_method)
 
         fig, ax = plt.subplots(figsize=(15, 6))
 
-        for emotion in available_emotions:
+        for j, emotion in enumerate(available_emotions):
             color = emotion_colors.get(emotion, None)
-            ax.plot(sub_df["frame"], sub_df[emotion], label=emotion, linewidth=1.5, color=color)
+            values = sub_df[emotion].to_numpy()
+            if keep is not None:
+                ax.plot(frames[keep[j]], values[keep[j]], label=emotion, linewidth=1.5, color=color)
+            else:
+                ax.plot(frames, values, label=emotion, linewidth=1.5, color=color)
 
         x_max = sub_df["frame"].max()
         ax.set_xlim(0, x_max * 1.2)
@@ -84,7 +97,9 @@ def plot_emotion_line(df, fps, max_points=5400, save_path=None):
         ax.grid(True, linestyle="--", alpha=0.7)
 
         try:
-            if save_path:
+            if figures is not None:
+                figures.add("emotion_line", fid_str if fid is not None else None, fig)
+            elif save_path:
                 face_specific_path = save_path.replace(".png", f"_face{fid_str}.png") if fid is not None else save_path
                 plt.savefig(face_specific_path, bbox_inches='tight')
                 logging.info(f"✅ 情绪折线图已保存至：{face_specific_path}")
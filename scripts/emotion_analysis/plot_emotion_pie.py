@@ -1,7 +1,9 @@
 import logging
 import matplotlib.pyplot as plt
+from .profiling import profiled
 
-def plot_emotion_pie(df, start_frame=None, end_frame=None, save_path=None):
+@profiled()
+def plot_emotion_pie(df, start_frame=None, end_frame=None, save_path=None, figures=None):
     """
     绘制指定帧范围内的主导情绪占比饼状图，自动对齐至检测过的帧。
     若包含 face_id，则为每张人脸分别绘图。
@@ -11,6 +13,7 @@ def plot_emotion_pie(df, start_frame=None, end_frame=None, save_path=None):
     - start_frame: 分析起始帧（用户指定范围，可自动对齐）
     - end_frame: 分析结束帧（用户指定范围，可自动对齐）
     - save_path: 图片保存路径，若为 None 则直接显示
+    - figures: FigureCollector，给出时将图表渲染到内存（供 PDF 报告使用），不再写文件
     """
     emotions = ["anger", "happiness", "sadness", "surprise", "fear", "disgust", "neutral"]
     emotion_colors = {
@@ -84,7 +87,9 @@ def plot_emotion_pie(df, start_frame=None, end_frame=None, save_path=None):
         plt.title(f"指定帧范围内主导情绪占比{title_suffix}", fontsize=14)
         plt.axis("equal")
 
-        if save_path:
+        if figures is not None:
+            figures.add("emotion_pie", fid_str if fid is not None else None)
+        elif save_path:
             specific_path = save_path.replace(".png", f"_face{fid_str}.png") if fid is not None else save_path
             plt.savefig(specific_path, bbox_inches='tight')
             logging.info(f"✅ 情绪饼状图已保存至 {specific_path}")
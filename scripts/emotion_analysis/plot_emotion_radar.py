@@ -1,8 +1,10 @@
 import logging
 import matplotlib.pyplot as plt
 import numpy as np
+from .profiling import profiled
 
-def plot_emotion_radar(df, fps, start_frame=None, end_frame=None, save_path=None):
+@profiled()
+def plot_emotion_radar(df, fps, start_frame=None, end_frame=None, save_path=None, figures=None):
     # 若传入的 fps 无效，则使用默认值30
     if not fps or fps <= 0:
         logging.warning("fps 参数，使用默认值 30。")
@@ -17,6 +19,7 @@ def plot_emotion_radar(df, fps, start_frame=None, end_frame=None, save_path=None
     - start_frame: 起始帧（可选，默认全范围）
     - end_frame: 结束帧（可选，默认全范围）
     - save_path: 如指定则保存图像，否则直接展示
+    - figures: FigureCollector，给出时将图表渲染到内存（供 PDF 报告使用），不再写文件
     """
 
     emotions = ["anger", "happiness", "sadness", "surprise", "fear", "disgust", "neutral"]
@@ -101,7 +104,9 @@ def plot_emotion_radar(df, fps, start_frame=None, end_frame=None, save_path=None
             title += f"（{start_time}s - {end_time}s）"
         plt.title(f"情绪平均强度雷达图{title_suffix}\n{title}", fontsize=14)
 
-        if save_path:
+        if figures is not None:
+            figures.add("emotion_radar", fid_str if fid is not None else None)
+        elif save_path:
             specific_path = save_path.replace(".png", f"_face{fid_str}.png") if fid is not None else save_path
             plt.savefig(specific_path, bbox_inches='tight')
             logging.info(f"✅ 雷达图已保存至 {specific_path}")
@@ -1,86 +1,223 @@
 import cv2
 import os
-import sys
 import logging
 import tempfile
+from dataclasses import dataclass
+from typing import Optional
 import pandas as pd
-from feat import Detector
+from .results_io import save_results, save_manifest, load_analysed, merge_results
+from .profiling import stage, profiled
+from .detector_profiles import build_detector
+from .face_cache import CachedDetector
+from .video_decoder import open_decoder
+from .frame_resize import downscale_frame, rescale_features
+from .compact_results import parse_keep, project_features, compact_dtypes
 
-def process_video(video_path, process_sampling_rate, output_csv, multi_face=False):
+class VideoAnalysisError(RuntimeError):
+    """视频分析无法完成：无法打开视频、帧范围无效，或整段视频没有检测到人脸。"""
+
+
+class NoFacesDetectedError(VideoAnalysisError):
+    """分析的帧中没有检测到任何人脸（增量分析时也没有已有结果）。"""
+
+
+@dataclass(frozen=True, eq=False)
+class FrameResult:
     """
-    读取视频，按照采样率处理每一帧，利用 Py-Feat 检测面部表情，
-    将检测结果存储到 DataFrame 中，并保存为 CSV 文件。
-    支持多张人脸分析（可选）。
+    analyze_frames 逐帧产出的记录。
+
+    frame: 视频中的绝对帧号（从 1 开始）
+    seconds: 帧对应的时间（秒）；视频帧率未知时为 None
+    faces: 该帧的检测结果（每张人脸一行，已含 frame / face_id，已按 keep 投影）；未检测到人脸或出错时为空表
+    error: 检测出错时的错误信息，否则为 None；出错的帧不计入已分析帧
     """
-    logging.info("初始化检测器...")
-    detector = Detector()
-    
-    # 输出当前使用的设备信息
-    device = detector.device
-    logging.info(f"当前使用的设备: {device}")
+    frame: int
+    seconds: Optional[float]
+    faces: pd.DataFrame
+    error: Optional[str] = None
+
+    @property
+    def has_faces(self):
+        return not self.faces.empty
+
 
+def frame_range(fps, start_frame=None, end_frame=None, start_time=None, end_time=None):
+    """把以秒给出的范围换算为帧号（从 1 开始，含两端）；帧号参数优先。视频帧率未知时忽略时间参数。"""
+    if (start_time is not None or end_time is not None) and not fps:
+        logging.warning("无法获取视频帧率，忽略 --start_time / --end_time。")
+        return start_frame, end_frame
+    if start_frame is None and start_time is not None:
+        start_frame = int(start_time * fps) + 1
+    if end_frame is None and end_time is not None:
+        end_frame = int(end_time * fps)
+    if start_frame is not None and end_frame is not None and end_frame < start_frame:
+        raise ValueError(f"结束帧 {end_frame} 早于起始帧 {start_frame}")
+    return start_frame, end_frame
+
+def analyze_frames(video_path, process_sampling_rate=10, multi_face=False, detector=None, keep="all",
+                   features="all", max_side=None, decoder="auto", decode_threads=0, keyframes_only=False,
+                   backend="torch", face_cache=None, skip=(), start_frame=None, end_frame=None,
+                   start_time=None, end_time=None, cancel=None):
+    """
+    逐帧分析视频的生成器：每分析完一帧立即产出一条 FrameResult，无需等待整段视频处理完毕。
+
+    生成器是惰性的，视频和检测器在第一次取值时才打开；无法打开视频或帧范围无效时抛出 VideoAnalysisError。
+    取消方式：
+    - 调用方停止迭代（break 或 close()）即可，解码器与临时文件会被释放；
+    - cancel 为 threading.Event（或任何提供 is_set() 的对象），在其他线程中 set() 后，处理完当前帧即停止。
+    skip 为不需要分析的帧号（如增量分析时已分析过的帧）；其余参数与 process_video 相同。
+    """
+    keep_groups = parse_keep(keep)
+    # 先打开视频、检查帧范围，出错时不必等待模型加载
     logging.info(f"正在打开视频文件：{video_path}")
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        logging.error("无法打开视频，请检查文件路径或格式是否正确。")
-        sys.exit(1)
+    try:
+        video = open_decoder(video_path, backend=decoder, threads=decode_threads)
+    except OSError as e:
+        raise VideoAnalysisError(f"无法打开视频，请检查文件路径或格式是否正确：{e}") from e
+
+    try:
+        try:
+            start_frame, end_frame = frame_range(video.fps, start_frame, end_frame, start_time, end_time)
+        except ValueError as e:
+            raise VideoAnalysisError(f"帧范围无效：{e}") from e
+        if start_frame or end_frame:
+            logging.info(f"只分析帧范围：{start_frame or 1} - {end_frame or '结尾'}")
+
+        if detector is None:
+            logging.info("初始化检测器...")
+            detector = build_detector(features, backend=backend)
+        if face_cache is not None:
+            detector = CachedDetector(detector, face_cache)
+
+        # 输出当前使用的设备信息
+        device = detector.device
+        logging.info(f"当前使用的设备: {device}")
+
+        # 解码器只产出需要分析的帧（按采样率，或 keyframes_only 时的关键帧；跳过 skip 中的帧），帧号从 1 开始
+        frames = video.frames(process_sampling_rate, keyframes_only=keyframes_only, skip=skip,
+                              start=start_frame, end=end_frame)
+
+        while cancel is None or not cancel.is_set():
+            with stage("decode"):
+                item = next(frames, None)
+            if item is None:
+                break  # 视频读取结束
+
+            frame_count, frame = item
+            seconds = frame_count / video.fps if video.fps else None
+            yield _analyze_frame(detector, frame_count, seconds, frame, multi_face, max_side, keep_groups)
+        else:
+            logging.info("分析已取消。")
+
+        logging.info("视频处理完成。")
+    finally:
+        video.close()
+        if isinstance(detector, CachedDetector):
+            detector.log_stats()
+
+
+def _analyze_frame(detector, frame_count, seconds, frame, multi_face, max_side, keep_groups):
+    """检测一帧，返回 FrameResult；检测出错时记录错误信息而不中断整个视频。"""
+    # 创建一个临时文件来保存当前帧
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_file:
+        temp_path = tmp_file.name
+    try:
+        # 高分辨率视频先缩小再检测，检测耗时随像素数增长
+        with stage("resize"):
+            small, scale = downscale_frame(frame, max_side)
+
+        # 将当前帧写入临时文件
+        with stage("write_temp_frame"):
+            cv2.imwrite(temp_path, small)
+
+        with stage("detect"):
+            # 多人脸处理时返回多个人脸特征，否则只保留置信度最高的人脸
+            features = detector.detect_image(temp_path, return_multiple=True) if multi_face \
+                else detector.detect_image(temp_path)
+        if not isinstance(features, pd.DataFrame) or features.empty:
+            logging.warning(f"帧 {frame_count} 未检测到人脸。")
+            return FrameResult(frame_count, seconds, pd.DataFrame())
+
+        features = rescale_features(features, scale).reset_index(drop=True)
+        features["frame"] = frame_count
+        if multi_face:
+            features["face_id"] = range(1, len(features) + 1)  # 同一帧内的人脸编号，从1开始
+            logging.info(f"帧 {frame_count}：检测到 {len(features)} 张人脸")
+        else:
+            features["face_id"] = 1  # 默认人脸编号
+            logging.info(f"成功处理帧：{frame_count}")
+        return FrameResult(frame_count, seconds, project_features(features, keep_groups))
+    except Exception as e:
+        logging.error(f"处理帧 {frame_count} 时出错：{e}")
+        return FrameResult(frame_count, seconds, pd.DataFrame(), error=str(e) or type(e).__name__)
+    finally:
+        # 检测完毕后，删除临时文件
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@profiled()
+def process_video(video_path, process_sampling_rate, output_csv, multi_face=False, detector=None, keep="all",
+                  features="all", max_side=None, decoder="auto", decode_threads=0, keyframes_only=False,
+                  backend="torch", face_cache=None, incremental=False, start_frame=None, end_frame=None,
+                  start_time=None, end_time=None, cancel=None):
+    """
+    读取视频，按照采样率处理每一帧，利用 Py-Feat 检测面部表情，
+    将检测结果存储到 DataFrame 中，并保存为 CSV 文件。
+    支持多张人脸分析（可选）。逐帧分析由 analyze_frames 完成，这里汇总其产出的记录。
+
+    detector: 可传入已初始化的检测器（需提供 detect_image 和 device），
+              如基准测试中的桩检测器；为 None 时创建默认的 Py-Feat Detector。
+    keep: 保留的列分组，逗号分隔（emotions、aus、landmarks、pose、box、identity）或 all（默认）；
+          frame 与 face_id 始终保留。保留的浮点列在缓存前即降为 float32。
+    features: 需要的分析类别，逗号分隔（emotion、aus、landmarks、pose、identity）或 all（默认）；
+              仅在 detector 为 None 时生效，未用到的 Py-Feat 子模型不会运行（如 emotion 跳过 AU/姿态/身份）。
+    max_side: 检测前将帧的长边缩放到不超过该像素数（默认不缩放）；人脸框与关键点会换算回原始分辨率坐标。
+    decoder: 解码后端 auto（默认，优先 PyAV 多线程解码，不可用时退回 OpenCV）、pyav 或 opencv。
+    decode_threads: PyAV 解码线程数，0 表示自动。
+    keyframes_only: 只解码并分析关键帧（需要 PyAV），此时忽略 process_sampling_rate。
+    backend: 推理后端 torch（默认）、onnx 或 onnx-int8（ONNX Runtime，int8 为动态量化）；仅在 detector 为 None 时生效。
+    face_cache: FaceResultCache 实例；人脸裁剪与之前分析过的几乎相同时复用缓存的检测结果，跳过模型推理（默认不使用）。
+    incremental: 复用 output_csv 中已有的结果（按其旁边的 .frames.json 帧清单），只分析缺少的帧并按帧号合并，
+                 例如先用较大的采样间隔快速浏览，再用较小的间隔补齐；视频或分析参数不同时重新分析。
+    start_frame / end_frame: 只分析该帧号范围（含两端，从 1 开始）：解码器直接定位到起始帧，超过结束帧即停止，
+                             结果中的 frame 仍为视频中的绝对帧号。
+    start_time / end_time: 以秒给出的范围，按视频帧率换算为帧号；同时给出帧号时以帧号为准。
+    cancel: threading.Event 等提供 is_set() 的对象；set() 后停止分析，已分析的帧照常保存（之后可用 incremental 继续）。
+
+    无法打开视频、帧范围无效或没有检测到任何人脸时抛出 VideoAnalysisError（NoFacesDetectedError）。
+    """
+    # 影响检测结果的参数（包括人脸结果缓存：相近的人脸会复用之前的结果）：与已有结果不一致时不能合并
+    cache_settings = None if face_cache is None else {
+        "max_entries": face_cache.max_entries, "max_distance": face_cache.max_distance, "max_age": face_cache.max_age}
+    settings = {"multi_face": multi_face, "keep": keep, "features": features, "max_side": max_side, "backend": backend,
+                "face_cache": cache_settings}
+    existing, done = None, set()
+    if incremental:
+        existing, done = load_analysed(output_csv, video_path, settings)
+        if done:
+            logging.info(f"增量分析：{output_csv} 中已有 {len(done)} 帧的结果，只分析缺少的帧")
 
-    frame_count = 0
     results = []
+    analysed = set()
+    for record in analyze_frames(video_path, process_sampling_rate, multi_face=multi_face, detector=detector,
+                                 keep=keep, features=features, max_side=max_side, decoder=decoder,
+                                 decode_threads=decode_threads, keyframes_only=keyframes_only, backend=backend,
+                                 face_cache=face_cache, skip=done, start_frame=start_frame, end_frame=end_frame,
+                                 start_time=start_time, end_time=end_time, cancel=cancel):
+        if record.error is None:
+            analysed.add(record.frame)
+        if record.has_faces:
+            results.append(record.faces)
+
+    if not results and existing is None:
+        raise NoFacesDetectedError("没有获得任何检测结果，请确认视频内容是否包含人脸。")
+    if incremental:
+        logging.info(f"增量分析：新分析 {len(analysed)} 帧，复用 {len(done)} 帧")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break  # 视频读取结束
-
-        frame_count += 1
-        # 只在指定采样率的帧上进行分析
-        if frame_count % process_sampling_rate == 0:
-            try:
-                # 创建一个临时文件来保存当前帧
-                with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_file:
-                    temp_path = tmp_file.name
-
-                # 将当前帧写入临时文件
-                cv2.imwrite(temp_path, frame)
-
-                if multi_face:
-                    # 多人脸处理：返回多个人脸特征
-                    features = detector.detect_image(temp_path, return_multiple=True)
-                    if isinstance(features, pd.DataFrame) and not features.empty:
-                        for i in range(len(features)):
-                            features.at[i, "frame"] = frame_count
-                            features.at[i, "face_id"] = i+1  # 同一帧内的人脸编号，从1开始
-                        results.append(features)
-                        logging.info(f"帧 {frame_count}：检测到 {len(features)} 张人脸")
-                    else:
-                        logging.warning(f"帧 {frame_count} 未检测到人脸。")
-                else:
-                    # 单人脸处理
-                    features = detector.detect_image(temp_path)
-                    if isinstance(features, pd.DataFrame) and not features.empty:
-                        features["frame"] = frame_count
-                        features["face_id"] = 1  # 默认人脸编号
-                        results.append(features)
-                        logging.info(f"成功处理帧：{frame_count}")
-                    else:
-                        logging.warning(f"帧 {frame_count} 未检测到人脸。")
-
-                # 检测完毕后，删除临时文件
-                os.remove(temp_path)
-
-            except Exception as e:
-                logging.error(f"处理帧 {frame_count} 时出错：{e}")
-
-    cap.release()
-    logging.info("视频处理完成。")
-
-    if not results:
-        logging.error("没有获得任何检测结果，请确认视频内容是否包含人脸。")
-        sys.exit(1)
-
-    # 合并所有帧的检测结果
-    df = pd.concat(results, ignore_index=True)
-    df.to_csv(output_csv, index=False)
-    logging.info(f"检测结果已保存到：{output_csv}")
+    # 合并所有帧的检测结果（增量分析时与已有结果按帧号合并）
+    with stage("assemble"):
+        df = compact_dtypes(merge_results(existing, results))
+    with stage("write_results"):
+        save_results(df, output_csv)
+        save_manifest(output_csv, video_path, settings, done | analysed)
     return df
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import logging
+import threading
+import functools
+
+try:
+    import psutil
+    _PROCESS = psutil.Process()
+except ImportError:
+    psutil = None
+    _PROCESS = None
+
+# 是否启用阶段计时；未启用时 stage() 只做一次布尔判断，几乎没有开销
+_ENABLED = False
+# 阶段名 -> 统计数据
+_STATS = {}
+_LOCK = threading.Lock()
+# 每个线程当前所处的阶段栈，用于生成层级名称（如 process_video/detect）
+_LOCAL = threading.local()
+
+
+def current_rss():
+    """当前进程常驻内存（字节）；优先用 psutil，其次读取 /proc，都不可用时返回 None。"""
+    if _PROCESS is not None:
+        return _PROCESS.memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def enable_profiling(enabled=True):
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def is_profiling():
+    return _ENABLED
+
+
+def reset_profiling():
+    with _LOCK:
+        _STATS.clear()
+
+
+def _stack():
+    if not hasattr(_LOCAL, "stack"):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+
+class stage:
+    """
+    阶段计时上下文：记录墙钟时间、CPU 时间（进程级）、调用次数和 RSS 变化量。
+
+        with stage("decode"):
+            ret, frame = cap.read()
+
+    嵌套使用时名称按层级拼接，例如在 process_video 内的 detect 记为 "process_video/detect"。
+    """
+
+    __slots__ = ("name", "_active", "_path", "_wall", "_cpu", "_rss")
+
+    def __init__(self, name):
+        self.name = name
+        self._active = False
+
+    def __enter__(self):
+        if not _ENABLED:
+            return self
+        self._active = True
+        stack = _stack()
+        stack.append(self.name)
+        self._path = "/".join(stack)
+        self._rss = current_rss()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._active:
+            return False
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        rss = current_rss()
+        mem_delta = (rss - self._rss) if (rss is not None and self._rss is not None) else 0
+        _stack().pop()
+        self._active = False
+        with _LOCK:
+            s = _STATS.setdefault(self._path, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                               "mem_delta_mb": 0.0, "max_mem_delta_mb": None})
+            s["calls"] += 1
+            s["wall_s"] += wall
+            s["cpu_s"] += cpu
+            delta_mb = mem_delta / (1024 * 1024)
+            s["mem_delta_mb"] += delta_mb
+            s["max_mem_delta_mb"] = delta_mb if s["max_mem_delta_mb"] is None else max(s["max_mem_delta_mb"], delta_mb)
+        return False
+
+
+def profiled(name=None):
+    """函数装饰器：将整个函数调用记为一个阶段（默认以函数名命名）。"""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profile_summary():
+    """返回各阶段统计的副本，按累计墙钟时间降序排列。"""
+    with _LOCK:
+        items = sorted(_STATS.items(), key=lambda kv: kv[1]["wall_s"], reverse=True)
+        return {
+            name: {
+                "calls": s["calls"],
+                "wall_s": round(s["wall_s"], 4),
+                "cpu_s": round(s["cpu_s"], 4),
+                "mean_wall_ms": round(s["wall_s"] / s["calls"] * 1000, 3) if s["calls"] else 0.0,
+                "mem_delta_mb": round(s["mem_delta_mb"], 2),
+                "max_mem_delta_mb": round(s["max_mem_delta_mb"], 2),
+            }
+            for name, s in items
+        }
+
+
+def dump_profile(path):
+    """将阶段统计写出为 JSON 文件并在日志中打印前几项。"""
+    summary = profile_summary()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"stages": summary}, f, ensure_ascii=False, indent=2)
+    logging.info(f"⏱ 阶段耗时统计已保存至：{path}")
+    for name, s in list(summary.items())[:10]:
+        logging.info(f"⏱ {name}: {s['wall_s']}s（{s['calls']} 次，CPU {s['cpu_s']}s，内存变化 {s['mem_delta_mb']} MB）")
+    return summary
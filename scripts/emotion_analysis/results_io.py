@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import logging
+import pandas as pd
+
+from .column_store import STORE_SUFFIX, ColumnStore, is_column_store, write_column_store
+
+
+def save_results(df, path):
+    """
+    保存检测结果。按扩展名选择格式：.parquet 使用 Parquet（需要 pyarrow，保留列类型），
+    .colstore 为按列内存映射的目录（见 column_store），其余按 CSV 写出。
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith(STORE_SUFFIX):
+        write_column_store(df, path)
+        return
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    logging.info(f"检测结果已保存到：{path}")
+
+
+def load_results(path, columns=None, start_frame=None, end_frame=None):
+    """
+    读取 detect 阶段写出的检测结果文件（.csv、.parquet 或 .colstore）。
+
+    columns 给出时只读取这些列（不存在的列忽略，frame / face_id 始终读取）；start_frame / end_frame 给出时只保留该帧范围。
+    列式存储只把用到的列和帧范围从磁盘映射进内存，CSV / Parquet 则在读取后再筛选帧范围。
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"检测结果文件不存在：{path}，请先运行 detect 子命令。")
+    wanted = None if columns is None else {"frame", "face_id", *columns}
+    if is_column_store(path):
+        df = ColumnStore(path).read(columns, start_frame, end_frame)
+    else:
+        if path.endswith(".parquet"):
+            if wanted is not None:
+                import pyarrow.parquet as pq
+                wanted = [c for c in pq.read_schema(path).names if c in wanted]
+            df = pd.read_parquet(path, columns=wanted)
+        else:
+            df = pd.read_csv(path, usecols=None if wanted is None else (lambda c: c in wanted))
+        if start_frame is not None:
+            df = df[df["frame"] >= start_frame]
+        if end_frame is not None:
+            df = df[df["frame"] <= end_frame]
+        df = df.reset_index(drop=True)
+    logging.info(f"已读取检测结果：{path}（{len(df)} 行）")
+    return df
+
+
+def results_source(args):
+    """
+    检测结果的来源标识（结果文件的绝对路径）：plot / report 子命令取 --results，完整流程取 --output_csv。
+    供聚类图区分不同视频的已拟合嵌入。
+    """
+    path = getattr(args, "results", None) or getattr(args, "output_csv", None)
+    return os.path.abspath(path) if path else None
+
+
+# ---------------- 增量分析：按帧号索引的结果存储 ----------------
+
+def manifest_path(path):
+    """结果文件旁的帧清单：记录已分析过的帧号（包括未检测到人脸的帧）与影响结果的参数。"""
+    return path + ".frames.json"
+
+
+# 视频指纹读取文件开头与结尾各这么多字节
+IDENTITY_BYTES = 1 << 20
+
+
+def _video_identity(video_path):
+    """
+    视频的标识：文件名、字节数，以及开头与结尾各 1 MB 的 sha1。
+    重新编码或剪辑后即使文件名和大小恰好相同，文件头（编码参数、时长）或结尾也会不同；只读 2 MB，长视频也很快。
+    """
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha1()
+    with open(video_path, "rb") as f:
+        digest.update(f.read(IDENTITY_BYTES))
+        if size > IDENTITY_BYTES:
+            f.seek(max(IDENTITY_BYTES, size - IDENTITY_BYTES))
+            digest.update(f.read(IDENTITY_BYTES))
+    return {"video": os.path.basename(video_path), "size": size, "sha1_head_tail": digest.hexdigest()}
+
+
+def save_manifest(path, video_path, settings, frames):
+    with open(manifest_path(path), "w", encoding="utf-8") as f:
+        json.dump({**_video_identity(video_path), "settings": settings, "frames": sorted(int(n) for n in frames)},
+                  f, ensure_ascii=False)
+
+
+def load_analysed(path, video_path, settings):
+    """
+    读取已有的检测结果与帧清单，返回 (结果 DataFrame 或 None, 已分析帧号集合)。
+    清单对应的视频或参数与本次不同时不复用旧结果（返回 (None, 空集合)）；
+    只有结果文件、没有清单时（旧版本写出的结果），以结果中出现过的帧作为已分析帧。
+    """
+    if not os.path.exists(path):
+        return None, set()
+    manifest = manifest_path(path)
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            saved = json.load(f)
+        identity = _video_identity(video_path)
+        if {k: saved.get(k) for k in identity} != identity:
+            logging.warning(f"{path} 来自另一个视频，不复用已有结果，重新分析。")
+            return None, set()
+        if saved.get("settings") != settings:
+            logging.warning(f"{path} 的分析参数与本次不同（{saved.get('settings')}），不复用已有结果，重新分析。")
+            return None, set()
+        df = load_results(path)
+        return df, set(saved.get("frames", []))
+    df = load_results(path)
+    logging.warning(f"{path} 没有帧清单，以结果中的帧作为已分析帧（未检测到人脸的帧会重新分析）。")
+    return df, set(df["frame"].astype(int))
+
+
+def merge_results(existing, new):
+    """把新分析的帧合并进已有结果，按 (frame, face_id) 排序；同一帧同一人脸以新结果为准。"""
+    parts = [df for df in [existing, *new] if df is not None and not df.empty]
+    df = pd.concat(parts, ignore_index=True)
+    df = df.drop_duplicates(subset=["frame", "face_id"], keep="last")
+    return df.sort_values(["frame", "face_id"], kind="stable").reset_index(drop=True)
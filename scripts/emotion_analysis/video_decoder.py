@@ -0,0 +1,155 @@
+import logging
+import cv2
+
+DECODERS = ("auto", "pyav", "opencv")
+PIXEL_FORMATS = {"bgr": "bgr24", "rgb": "rgb24"}
+
+
+class OpenCVDecoder:
+    """
+    基于 cv2.VideoCapture 的解码器（单线程）。
+    未采样的帧只 grab 不 retrieve，省去这些帧的像素格式转换。
+    """
+
+    name = "opencv"
+
+    def __init__(self, video_path, pixel_format="bgr"):
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise OSError(f"无法打开视频：{video_path}")
+        self.pixel_format = pixel_format
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or None
+
+    def frames(self, sampling_rate=1, keyframes_only=False, skip=(), start=None, end=None):
+        """
+        逐帧解码，产出 (帧号, 图像)；帧号从 1 开始，只产出帧号为 sampling_rate 整数倍的帧。
+        skip 中的帧号（如增量分析时已分析过的帧）不产出。
+        start / end 为要分析的帧号范围（含两端）：先定位到 start，超过 end 即停止解码；帧号仍为视频中的绝对帧号。
+        """
+        if keyframes_only:
+            logging.warning("OpenCV 解码器不支持只解码关键帧，将按采样率解码。")
+        frame_count = self._seek(start) if start and start > 1 else 0
+        while self.cap.grab():
+            frame_count += 1
+            if end is not None and frame_count > end:
+                break
+            if frame_count % sampling_rate or frame_count in skip or (start and frame_count < start):
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            if self.pixel_format == "rgb":
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            yield frame_count, frame
+
+    def _seek(self, start):
+        """定位到第 start 帧之前，返回已跳过的帧数；后端不支持定位时退回从头逐帧 grab。"""
+        if self.cap.set(cv2.CAP_PROP_POS_FRAMES, start - 1):
+            position = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if position == start - 1:
+                return position
+        logging.warning("OpenCV 无法精确定位，从视频开头逐帧跳过。")
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return 0
+
+    def close(self):
+        self.cap.release()
+
+
+class PyAVDecoder:
+    """
+    基于 PyAV（FFmpeg）的多线程解码器。
+
+    像素格式转换由 FFmpeg 在解码时完成（直接输出 BGR 或 RGB），
+    keyframes_only 时让解码器跳过所有非关键帧，只解码关键帧。
+    """
+
+    name = "pyav"
+
+    def __init__(self, video_path, pixel_format="bgr", threads=0):
+        import av
+
+        try:
+            self.container = av.open(video_path)
+        except Exception as e:
+            raise OSError(f"无法打开视频：{video_path}（{e}）") from e
+        if not self.container.streams.video:
+            self.container.close()
+            raise OSError(f"视频中没有视频流：{video_path}")
+        self.stream = self.container.streams.video[0]
+        # 帧级 + 片级多线程解码；threads 为 0 时由 FFmpeg 按 CPU 核数决定
+        self.stream.thread_type = "AUTO"
+        if threads:
+            self.stream.codec_context.thread_count = threads
+        self.format = PIXEL_FORMATS[pixel_format]
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else None
+
+    def _frame_number(self, frame, fallback):
+        """由时间戳推算帧号（从 1 开始），跳帧解码时保持与逐帧计数一致。"""
+        if frame.pts is None or not self.fps:
+            return fallback
+        start = self.stream.start_time or 0
+        return int(round(float((frame.pts - start) * self.stream.time_base) * self.fps)) + 1
+
+    def frames(self, sampling_rate=1, keyframes_only=False, skip=(), start=None, end=None):
+        """
+        解码并产出 (帧号, 图像)。默认只产出帧号为 sampling_rate 整数倍的帧（其余帧解码但不转换像素格式）；
+        keyframes_only 时只解码关键帧，并产出全部关键帧（此时分析间隔由视频的 GOP 决定）。
+        skip 中的帧号同样只解码、不转换也不产出。
+        start / end 为要分析的帧号范围（含两端）：定位到 start 之前最近的关键帧开始解码，超过 end 即停止；
+        定位后帧号由时间戳推算，仍为视频中的绝对帧号。
+        """
+        if keyframes_only:
+            self.stream.codec_context.skip_frame = "NONKEY"
+        seeked = bool(start and start > 1 and self._seek(start))
+        for index, frame in enumerate(self.container.decode(self.stream), start=1):
+            number = self._frame_number(frame, index) if keyframes_only or seeked else index
+            if end is not None and number > end:
+                break
+            if start and number < start:
+                continue
+            if (keyframes_only or number % sampling_rate == 0) and number not in skip:
+                yield number, frame.to_ndarray(format=self.format)
+
+    def _seek(self, start):
+        """定位到第 start 帧之前最近的关键帧；无法定位（缺少帧率或时间戳）时返回 False，从头解码。"""
+        if not self.fps or not self.stream.time_base:
+            return False
+        seconds = (start - 1) / self.fps
+        target = int(seconds / self.stream.time_base) + (self.stream.start_time or 0)
+        try:
+            self.container.seek(target, stream=self.stream, backward=True, any_frame=False)
+        except Exception as e:
+            logging.warning(f"PyAV 定位失败，从视频开头解码：{e}")
+            return False
+        return True
+
+    def close(self):
+        self.container.close()
+
+
+def open_decoder(video_path, backend="auto", pixel_format="bgr", threads=0):
+    """
+    按后端名创建解码器：pyav、opencv，或 auto（默认，优先 PyAV，未安装或打开失败时退回 OpenCV）。
+    无法打开视频时抛出 OSError。
+    """
+    if backend not in DECODERS:
+        raise ValueError(f"未知的解码器：{backend}，可选：{', '.join(DECODERS)}")
+    if pixel_format not in PIXEL_FORMATS:
+        raise ValueError(f"未知的像素格式：{pixel_format}，可选：{', '.join(PIXEL_FORMATS)}")
+
+    if backend in ("auto", "pyav"):
+        try:
+            decoder = PyAVDecoder(video_path, pixel_format=pixel_format, threads=threads)
+            logging.info("使用 PyAV 解码器（多线程）")
+            return decoder
+        except ImportError:
+            if backend == "pyav":
+                raise
+            logging.info("未安装 PyAV，使用 OpenCV 解码器")
+        except OSError as e:
+            if backend == "pyav":
+                raise
+            logging.warning(f"PyAV 打开视频失败，退回 OpenCV 解码器：{e}")
+    return OpenCVDecoder(video_path, pixel_format=pixel_format)
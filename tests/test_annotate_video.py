@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from scripts.emotion_analysis.annotate_video import interpolate_annotations, export_annotated_video
+
+
+def _face(frame, face_id, x, happiness):
+    return {"frame": frame, "face_id": face_id, "FaceRectX": x, "FaceRectY": 50.0, "FaceRectWidth": 40.0,
+            "FaceRectHeight": 40.0, "happiness": happiness, "neutral": 1 - happiness}
+
+
+def test_multi_face_interpolates_per_track_when_detection_order_swaps():
+    # 左边的人（x=10）一直高兴，右边的人（x=200）一直平静；第 20 帧两人的检测顺序互换
+    df = pd.DataFrame([
+        _face(10, 1, 10.0, 0.9), _face(10, 2, 200.0, 0.1),
+        _face(20, 1, 200.0, 0.1), _face(20, 2, 10.0, 0.9),
+    ])
+    annotations = interpolate_annotations(df, start=10, end=20, max_gap=20)
+
+    faces = annotations[15]
+    assert len(faces) == 2
+    xs = sorted(float(box[0]) for box, _, _, _ in faces)
+    # 按 face_id 插值会得到 x=105 的两个框；按轨迹插值时两个框留在原位
+    assert xs == [10.0, 200.0]
+    labels = {float(box[0]): label for box, label, _, _ in faces}
+    assert labels == {10.0: "happiness", 200.0: "neutral"}
+
+
+def test_export_without_face_boxes_raises(tmp_path):
+    df = pd.DataFrame({"frame": [10, 20], "face_id": [1, 1], "happiness": [0.5, 0.6]})
+    with pytest.raises(ValueError, match="box"):
+        export_annotated_video(str(tmp_path / "missing.mp4"), df, str(tmp_path / "out.mp4"))